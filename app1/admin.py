@@ -1,8 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User, Group
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import ServiceCategory, ServiceProvider, Service, Booking, Review, SystemSetting
+from .models import ServiceCategory, ServiceProvider, Service, Booking, Review, SystemSetting, DailyStats, RequestEvent, ArchivedRecord, Notification
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
@@ -15,7 +16,7 @@ class ServiceProviderInline(admin.StackedInline):
     verbose_name_plural = 'Service Provider Details'
     fk_name = 'user'
     extra = 0
-    fields = ('company_name', 'phone_number', 'address', 'is_approved', 'is_active')
+    fields = ('company_name', 'phone_number', 'address', 'latitude', 'longitude', 'is_approved', 'is_active')
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'is_service_provider', 'is_active')
@@ -32,10 +33,10 @@ admin.site.register(User, CustomUserAdmin)
 
 @admin.register(ServiceCategory)
 class ServiceCategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'is_active', 'created_at')
+    list_display = ('name', 'slug', 'pending_timeout', 'is_active', 'created_at')
     list_filter = ('is_active',)
-    search_fields = ('name', 'description')
-    prepopulated_fields = {'description': ('name',)}
+    search_fields = ('name', 'slug', 'description')
+    prepopulated_fields = {'slug': ('name',), 'description': ('name',)}
     ordering = ('name',)
 
 @admin.register(ServiceProvider)
@@ -45,11 +46,17 @@ class ServiceProviderAdmin(admin.ModelAdmin):
     search_fields = ('company_name', 'user__email', 'user__first_name', 'user__last_name')
     list_editable = ('is_approved', 'is_active')
     raw_id_fields = ('user',)
+    actions = ['approve_selected']
     
     def user_email(self, obj):
         return obj.user.email
     user_email.short_description = 'Email'
     user_email.admin_order_field = 'user__email'
+    
+    @admin.action(description='Approve selected providers and activate their accounts')
+    def approve_selected(self, request, queryset):
+        approved = queryset.approve()
+        self.message_user(request, f'{len(approved)} provider(s) approved.')
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
@@ -106,6 +113,69 @@ class SystemSettingAdmin(admin.ModelAdmin):
         return obj.value[:50] + '...' if len(obj.value) > 50 else obj.value
     value_preview.short_description = 'Value'
 
+@admin.register(DailyStats)
+class DailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('date', 'new_users', 'new_providers', 'new_requests', 'total_requests', 'snapshot_at')
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        # Rows are written by the rollup_daily_stats command only
+        return False
+
+@admin.register(RequestEvent)
+class RequestEventAdmin(admin.ModelAdmin):
+    list_display = ('service_request_id', 'from_status', 'to_status', 'provider_id', 'category_id', 'created_at')
+    list_filter = ('to_status',)
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        # The log is append-only
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedRecord)
+class ArchivedRecordAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'original_id', 'status', 'created_at', 'archived_at')
+    list_filter = ('kind', 'status')
+    search_fields = ('original_id',)
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        # Rows are written by the archive_requests command only
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('event', 'channel', 'recipient', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'channel', 'event')
+    search_fields = ('recipient',)
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+    actions = ['retry_now']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Send again on the next run')
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now(), claim=''
+        )
+        self.message_user(request, f'{updated} notification(s) queued again.')
+
 # Custom admin site header and title
 admin.site.site_header = 'Roadside Assistance Admin'
 admin.site.site_title = 'Roadside Assistance Administration'
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class App1Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app1'
+
+    def ready(self):
+        # Importing the module also registers its model signal receivers
+        from .signals import ensure_admin_user
+
+        post_migrate.connect(ensure_admin_user, sender=self)
@@ -0,0 +1,75 @@
+"""Process-local registry of active service categories, keyed by slug.
+
+Categories change only when an admin edits one, but they are looked up on
+every service page. The registry loads them all once and serves lookups from
+memory. Saving or deleting a category bumps a version number kept in the
+default cache (see ``signals``). Each process compares its loaded version
+with the cached one and reloads when they differ. With a shared cache
+backend that also covers the other workers.
+
+Bulk writes (``bulk_create``, ``update()``) send no signals, so code that
+changes categories that way must call ``invalidate()`` itself.
+
+The returned instances are shared between requests and must not be modified.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import ServiceCategory
+from .routers import use_primary
+
+VERSION_KEY = 'service-categories:version'
+
+_lock = threading.Lock()
+_loaded_version = None
+_by_slug = {}
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        _start_new_version()
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _start_new_version():
+    # A fresh value rather than 1, so that after the key is evicted no
+    # process mistakes its old registry for the current one
+    cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def _categories():
+    global _loaded_version, _by_slug
+    version = current_version()
+    if version != _loaded_version:
+        with _lock:
+            if version != _loaded_version:
+                # Kept until the next version bump, so never loaded from a lagging replica
+                with use_primary():
+                    _by_slug = {
+                        category.slug: category
+                        for category in ServiceCategory.objects.filter(is_active=True).order_by('name')
+                    }
+                _loaded_version = version
+    return _by_slug
+
+
+def get_by_slug(slug):
+    """The active category with ``slug``, or ``None``."""
+    return _categories().get(slug)
+
+
+def active_categories():
+    """Every active category, by name."""
+    return list(_categories().values())
+
+
+def invalidate():
+    """Make every process reload the registry on its next lookup."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        _start_new_version()
@@ -0,0 +1,131 @@
+"""Maintenance of the per-provider ``ProviderStats`` counters.
+
+Writers call these helpers inside the transaction that changes the underlying
+row, so the counters move with ``F()`` expressions and never need a
+``COUNT`` on the read path.
+"""
+from collections import Counter
+
+from django.db.models import Count, F
+
+from .models import Booking, ProviderStats, Service, ServiceProvider, ServiceRequest
+
+# Which counter each status contributes to
+REQUEST_COUNTERS = {
+    'pending': 'pending_requests',
+    'accepted': 'active_requests',
+    'in_progress': 'active_requests',
+}
+BOOKING_COUNTERS = {
+    'pending': 'active_bookings',
+    'confirmed': 'active_bookings',
+    'in_progress': 'active_bookings',
+}
+
+COUNTER_FIELDS = ['pending_requests', 'active_requests', 'active_bookings', 'total_services', 'service_categories']
+
+
+def status_deltas(counters, old_status, new_status):
+    """Counter changes caused by moving a row from ``old_status`` to ``new_status``.
+
+    Either status may be ``None`` for a row being created or deleted.
+    """
+    deltas = Counter()
+    if old_status in counters:
+        deltas[counters[old_status]] -= 1
+    if new_status in counters:
+        deltas[counters[new_status]] += 1
+    return {field: delta for field, delta in deltas.items() if delta}
+
+
+def apply_deltas(provider_id, deltas, rebuild_missing=True):
+    """Add ``deltas`` to a provider's counters, building the row if it is missing.
+
+    Deletes pass ``rebuild_missing=False``: in a cascade the stats row may
+    already be gone along with the provider, and must not come back.
+    """
+    if provider_id is None or not deltas:
+        return
+    updated = ProviderStats.objects.filter(provider_id=provider_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated and rebuild_missing:
+        # Providers created with bulk_create have no stats row yet. Counting
+        # now already includes the change being applied.
+        rebuild([provider_id])
+
+
+def request_status_changed(provider_id, old_status, new_status):
+    apply_deltas(provider_id, status_deltas(REQUEST_COUNTERS, old_status, new_status))
+
+
+def booking_status_changed(provider_id, old_status, new_status):
+    apply_deltas(provider_id, status_deltas(BOOKING_COUNTERS, old_status, new_status))
+
+
+def compute(provider_ids):
+    """Count every counter from scratch for ``provider_ids``.
+
+    Returns ``{provider_id: {field: value}}``, using one grouped query per
+    source table.
+    """
+    provider_ids = list(provider_ids)
+    counts = {provider_id: dict.fromkeys(COUNTER_FIELDS, 0) for provider_id in provider_ids}
+
+    def collect(rows, field):
+        for provider_id, value in rows:
+            if provider_id in counts:
+                counts[provider_id][field] = value
+
+    requests = ServiceRequest.objects.filter(provider_id__in=provider_ids).order_by().values('provider_id')
+    for status_field in set(REQUEST_COUNTERS.values()):
+        statuses = [status for status, field in REQUEST_COUNTERS.items() if field == status_field]
+        collect(
+            requests.filter(status__in=statuses).annotate(count=Count('id')).values_list('provider_id', 'count'),
+            status_field,
+        )
+
+    collect(
+        Booking.objects.filter(service__provider_id__in=provider_ids, status__in=list(BOOKING_COUNTERS))
+        .order_by().values('service__provider_id').annotate(count=Count('id'))
+        .values_list('service__provider_id', 'count'),
+        'active_bookings',
+    )
+    collect(
+        Service.objects.filter(provider_id__in=provider_ids)
+        .order_by().values('provider_id').annotate(count=Count('id'))
+        .values_list('provider_id', 'count'),
+        'total_services',
+    )
+    collect(
+        ServiceProvider.objects.filter(id__in=provider_ids)
+        .annotate(count=Count('service_categories')).values_list('id', 'count'),
+        'service_categories',
+    )
+    return counts
+
+
+def store(counts):
+    """Upsert ``{provider_id: {field: value}}`` into ProviderStats."""
+    ProviderStats.objects.bulk_create(
+        [ProviderStats(provider_id=provider_id, **values) for provider_id, values in counts.items()],
+        update_conflicts=True,
+        unique_fields=['provider'],
+        update_fields=COUNTER_FIELDS + ['updated_at'],
+    )
+
+
+def rebuild(provider_ids):
+    """Recount and store the counters of ``provider_ids``."""
+    counts = compute(provider_ids)
+    store(counts)
+    return counts
+
+
+def stats_for(provider):
+    """A provider's stats row, built on first use."""
+    try:
+        return provider.stats
+    except ProviderStats.DoesNotExist:
+        rebuild([provider.id])
+        return ProviderStats.objects.get(provider=provider)
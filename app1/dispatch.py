@@ -0,0 +1,200 @@
+"""Automatic dispatch of service requests to ranked nearby providers.
+
+A dispatched request is created without a provider and offered to a batch of
+candidates ranked by the geohash index (see ``geo.nearest``). The first
+provider to accept wins through a single conditional ``UPDATE``; every other
+open offer on the request is withdrawn in the same transaction. Providers
+hear about offers and withdrawals through the live feed (see ``live``), and
+about offers also through the notification outbox, in case they are not
+watching the feed.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import counters, live, notifications
+from .models import RequestEvent, RequestOffer, ServiceProvider, ServiceRequest
+
+
+def rank_candidates(service_request, limit=None):
+    """Best providers for a request that have not been offered it yet."""
+    limit = limit or settings.DISPATCH_BATCH_SIZE
+    already_offered = RequestOffer.objects.filter(service_request=service_request).values('provider_id')
+    providers = (
+        ServiceProvider.objects.available(service_request.service_category)
+        .exclude(id__in=already_offered)
+        .select_related('user')
+    )
+
+    if service_request.latitude is None or service_request.longitude is None:
+        # Without coordinates there is nothing to rank on, so go in signup order
+        return list(providers.order_by('id')[:limit])
+
+    ranked = providers.nearest(service_request.latitude, service_request.longitude, k=limit)
+    if len(ranked) < limit:
+        # Providers who never gave a location cannot be ranked, but can still help
+        ranked += providers.filter(geohash='').order_by('id')[:limit - len(ranked)]
+    return ranked
+
+
+def offer_next_batch(service_request, limit=None):
+    """Offer a request to the next batch of ranked providers.
+
+    Returns the list of created offers, which is empty once every eligible
+    provider has already seen the request.
+    """
+    candidates = rank_candidates(service_request, limit)
+    start = RequestOffer.objects.filter(service_request=service_request).count()
+    offers = [
+        RequestOffer(
+            service_request=service_request,
+            provider=provider,
+            rank=start + position,
+            distance_km=getattr(provider, 'distance_km', None),
+        )
+        for position, provider in enumerate(candidates)
+    ]
+    RequestOffer.objects.bulk_create(offers, ignore_conflicts=True)
+    notifications.enqueue(notifications.request_offered(service_request, candidates))
+    live.publish_to_providers(
+        [offer.provider_id for offer in offers], live.request_message('offer', service_request)
+    )
+    return offers
+
+
+def create_dispatched_request(customer, category, **fields):
+    """Create a provider-less request and offer it to the first batch."""
+    with transaction.atomic():
+        service_request = ServiceRequest.objects.create(
+            customer=customer,
+            service_category=category,
+            status='pending',
+            is_dispatched=True,
+            **fields
+        )
+        RequestEvent.for_change(service_request, None, 'pending').save()
+        offers = offer_next_batch(service_request)
+    return service_request, offers
+
+
+def accept(service_request_id, provider):
+    """Give a dispatched request to ``provider`` if nobody else took it first.
+
+    Returns ``True`` when ``provider`` won the request.
+    """
+    with transaction.atomic():
+        won = ServiceRequest.objects.filter(
+            id=service_request_id,
+            provider__isnull=True,
+            status='pending',
+            offers__provider=provider,
+            offers__status='offered',
+        ).update(provider=provider, status='accepted', version=F('version') + 1, updated_at=timezone.now())
+        if not won:
+            return False
+
+        now = timezone.now()
+        RequestOffer.objects.filter(
+            service_request_id=service_request_id, provider=provider
+        ).update(status='accepted', updated_at=now)
+        open_offers = RequestOffer.objects.filter(service_request_id=service_request_id, status='offered')
+        losers = list(open_offers.exclude(provider=provider).values_list('provider_id', flat=True))
+        open_offers.update(status='withdrawn', updated_at=now)
+        # Unassigned requests count towards nobody until they are won
+        counters.request_status_changed(provider.id, None, 'accepted')
+        category_id, email, phone = ServiceRequest.objects.filter(id=service_request_id).values_list(
+            'service_category_id', 'customer__email', 'customer_phone'
+        ).get()
+        RequestEvent.objects.create(
+            service_request_id=service_request_id,
+            provider_id=provider.id,
+            category_id=category_id,
+            from_status='pending',
+            to_status='accepted',
+        )
+        notifications.enqueue(notifications.status_changed(service_request_id, 'accepted', email, phone))
+        live.publish_to_providers(losers, {'event': 'withdrawn', 'id': service_request_id})
+        live.request_status_changed(service_request_id, 'accepted')
+    return True
+
+
+class _NobodyLeft(Exception):
+    pass
+
+
+def redispatch(service_request):
+    """Offer a request nobody answered to the next batch of providers.
+
+    A request sent to one provider is taken back from it and becomes a
+    dispatched request; a dispatched one has its open offers withdrawn.
+    Returns ``True`` once the new offers are out, or ``False``, with nothing
+    changed, when the request moved on meanwhile or every eligible provider
+    has already seen it.
+    """
+    previous_provider_id = service_request.provider_id
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            updated = ServiceRequest.objects.filter(
+                id=service_request.id, status='pending', version=service_request.version
+            ).update(
+                provider=None,
+                is_dispatched=True,
+                version=F('version') + 1,
+                redispatch_count=F('redispatch_count') + 1,
+                updated_at=now,
+            )
+            if not updated:
+                return False
+
+            open_offers = RequestOffer.objects.filter(service_request=service_request, status='offered')
+            withdrawn = list(open_offers.values_list('provider_id', flat=True))
+            open_offers.update(status='withdrawn', updated_at=now)
+            if previous_provider_id is not None:
+                # Recorded as an offer so the ranking skips the provider who sat on it
+                withdrawn.append(previous_provider_id)
+                RequestOffer.objects.create(
+                    service_request=service_request,
+                    provider_id=previous_provider_id,
+                    rank=RequestOffer.objects.filter(service_request=service_request).count(),
+                    status='withdrawn',
+                )
+                counters.request_status_changed(previous_provider_id, 'pending', None)
+
+            if not offer_next_batch(service_request):
+                raise _NobodyLeft
+            live.publish_to_providers(withdrawn, {'event': 'withdrawn', 'id': service_request.id})
+    except _NobodyLeft:
+        return False
+
+    service_request.provider = None
+    service_request.is_dispatched = True
+    service_request.version += 1
+    service_request.redispatch_count += 1
+    service_request.updated_at = now
+    return True
+
+
+def decline(service_request_id, provider):
+    """Decline an offer, moving on to the next batch once all have declined.
+
+    Returns ``True`` if ``provider`` had an open offer for the request.
+    """
+    with transaction.atomic():
+        declined = RequestOffer.objects.filter(
+            service_request_id=service_request_id, provider=provider, status='offered'
+        ).update(status='declined', updated_at=timezone.now())
+        if not declined:
+            return False
+
+        still_open = RequestOffer.objects.filter(
+            service_request_id=service_request_id, status='offered'
+        ).exists()
+        if not still_open:
+            service_request = ServiceRequest.objects.filter(
+                id=service_request_id, provider__isnull=True, status='pending'
+            ).select_related('service_category').first()
+            if service_request is not None:
+                offer_next_batch(service_request)
+    return True
@@ -0,0 +1,106 @@
+"""Age out service requests nobody answers.
+
+A request still pending after its category's ``pending_timeout`` (or
+``settings.PENDING_REQUEST_TIMEOUT`` minutes) is offered to the next batch
+of providers (see ``dispatch.redispatch``), up to
+``settings.REDISPATCH_ROUNDS`` times. After that, or once every eligible
+provider has seen it, it expires. Its customer is told through the live
+feed either way. Requests whose category was deleted use the site default
+and simply expire, since there is nothing to match providers on.
+
+The clock restarts at every round, so staleness is measured from
+``updated_at``. The ``(status, service_category, updated_at)`` index finds
+a category's stale requests without scanning the table. Each batch is one
+transaction of at most ``batch_size`` requests.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import counters, dispatch, live, notifications
+from .models import RequestEvent, RequestOffer, ServiceCategory, ServiceRequest
+
+REDISPATCHED = 'redispatched'
+EXPIRED = 'expired'
+
+
+def timeout(category):
+    """How long requests in ``category`` (``None``: no category) may stay pending."""
+    minutes = (category and category.pending_timeout) or settings.PENDING_REQUEST_TIMEOUT
+    return timedelta(minutes=minutes)
+
+
+def expire(service_request):
+    """Move a pending request to ``expired``. Returns ``False`` if it changed meanwhile."""
+    with transaction.atomic():
+        if not service_request.transition_to('expired'):
+            return False
+        counters.request_status_changed(service_request.provider_id, 'pending', 'expired')
+        RequestEvent.for_change(service_request, 'pending', 'expired').save()
+        notifications.enqueue(notifications.status_changed(
+            service_request.id, 'expired', service_request.customer.email, service_request.customer_phone
+        ))
+
+        open_offers = RequestOffer.objects.filter(service_request=service_request, status='offered')
+        withdrawn = list(open_offers.values_list('provider_id', flat=True))
+        open_offers.update(status='withdrawn', updated_at=timezone.now())
+        live.publish_to_providers(withdrawn, {'event': 'withdrawn', 'id': service_request.id})
+        live.publish_to_providers([service_request.provider_id], live.request_message('request', service_request))
+        live.request_status_changed(service_request.id, 'expired')
+    return True
+
+
+def process_batch(category, batch_size, after=None, now=None):
+    """Re-offer or expire up to ``batch_size`` stale requests of ``category``, oldest first.
+
+    ``after`` is the ``(updated_at, id)`` of the last request the previous
+    batch looked at. Returns ``(outcomes, after)``, where ``outcomes`` maps
+    each handled request id to ``REDISPATCHED`` or ``EXPIRED`` and ``after``
+    is ``None`` once the category has no stale requests left.
+    """
+    cutoff = (now or timezone.now()) - timeout(category)
+    stale = ServiceRequest.objects.filter(status='pending', service_category=category, updated_at__lt=cutoff)
+    if after is not None:
+        updated_at, request_id = after
+        stale = stale.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=request_id))
+
+    outcomes = {}
+    with transaction.atomic():
+        batch = list(stale.select_related('service_category', 'customer').order_by('updated_at', 'id')[:batch_size])
+        if not batch:
+            return outcomes, None
+        # Read before the requests change, to carry on where this batch stopped
+        after = (batch[-1].updated_at, batch[-1].id)
+        for service_request in batch:
+            if (
+                category is not None
+                and service_request.redispatch_count < settings.REDISPATCH_ROUNDS
+                and dispatch.redispatch(service_request)
+            ):
+                outcomes[service_request.id] = REDISPATCHED
+            elif expire(service_request):
+                outcomes[service_request.id] = EXPIRED
+    return outcomes, after
+
+
+def run(batch_size=100, now=None):
+    """One pass over every category. Returns ``{category: {REDISPATCHED: n, EXPIRED: n}}``.
+
+    Requests without a category are counted under ``None``.
+    """
+    totals = {}
+    # Inactive categories too: their open requests still need an answer
+    for category in [*ServiceCategory.objects.order_by('id'), None]:
+        counts = {REDISPATCHED: 0, EXPIRED: 0}
+        after = None
+        while True:
+            outcomes, after = process_batch(category, batch_size, after, now)
+            if after is None:
+                break
+            for outcome in outcomes.values():
+                counts[outcome] += 1
+        totals[category] = counts
+    return totals
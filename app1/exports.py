@@ -0,0 +1,116 @@
+"""Streaming CSV and JSON Lines exports of service requests and bookings.
+
+Rows are fetched as plain tuples with ``values_list`` (the provider,
+category and customer columns come from joins in the same query) and in
+chunks with ``iterator()``, then encoded one line at a time. Memory use
+stays flat whatever the size of the export.
+
+The date range applies to ``created_at`` and is served by the
+``(status, created_at)`` and ``created_at`` indexes on both tables.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import Booking, ServiceRequest
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# kind: (model, [(column name, lookup)])
+EXPORTS = {
+    'requests': (ServiceRequest, [
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+        ('status', 'status'),
+        ('is_dispatched', 'is_dispatched'),
+        ('category', 'service_category__name'),
+        ('provider_id', 'provider_id'),
+        ('provider', 'provider__company_name'),
+        ('customer_id', 'customer_id'),
+        ('customer_username', 'customer__username'),
+        ('customer_email', 'customer__email'),
+        ('customer_name', 'customer_name'),
+        ('customer_phone', 'customer_phone'),
+        ('customer_location', 'customer_location'),
+        ('latitude', 'latitude'),
+        ('longitude', 'longitude'),
+        ('description', 'description'),
+    ]),
+    'bookings': (Booking, [
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+        ('status', 'status'),
+        ('booking_date', 'booking_date'),
+        ('service', 'service__title'),
+        ('price', 'service__price'),
+        ('category', 'service__category__name'),
+        ('provider_id', 'service__provider_id'),
+        ('provider', 'service__provider__company_name'),
+        ('customer_id', 'customer_id'),
+        ('customer_username', 'customer__username'),
+        ('customer_email', 'customer__email'),
+        ('notes', 'notes'),
+    ]),
+}
+
+CHUNK_SIZE = 2000
+
+
+def statuses(kind):
+    model, _ = EXPORTS[kind]
+    return [value for value, _ in model.STATUS_CHOICES]
+
+
+def day_start(day):
+    """The first instant of ``day`` in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rows(kind, since=None, until=None, status=None, using=DEFAULT_DB_ALIAS, chunk_size=CHUNK_SIZE):
+    """Yield the header, then one tuple per row created between ``since`` and ``until`` (dates, inclusive)."""
+    model, columns = EXPORTS[kind]
+    queryset = model.objects.using(using).order_by('created_at', 'id')
+    if since:
+        queryset = queryset.filter(created_at__gte=day_start(since))
+    if until:
+        queryset = queryset.filter(created_at__lt=day_start(until + timedelta(days=1)))
+    if status:
+        queryset = queryset.filter(status__in=status)
+
+    yield tuple(name for name, _ in columns)
+    yield from queryset.values_list(*(lookup for _, lookup in columns)).iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """A file-like object whose ``write`` hands the line back to ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(rows):
+    header = None
+    for row in rows:
+        if header is None:
+            header = row
+            continue
+        yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def lines(rows, format):
+    return csv_lines(rows) if format == 'csv' else jsonl_lines(rows)
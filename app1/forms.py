@@ -20,7 +20,7 @@ class ProviderRegistrationForm(forms.ModelForm):
     
     class Meta:
         model = ServiceProvider
-        fields = ['company_name', 'phone_number', 'address', 'service_categories']
+        fields = ['company_name', 'phone_number', 'address', 'latitude', 'longitude', 'service_categories']
         
     def clean_username(self):
         username = self.cleaned_data.get('username')
@@ -41,6 +41,16 @@ class ProviderRegistrationForm(forms.ModelForm):
         
         if password1 and password2 and password1 != password2:
             self.add_error('password2', "Passwords don't match")
+
+        # Coordinates are optional, but only useful as a pair
+        latitude = cleaned_data.get('latitude')
+        longitude = cleaned_data.get('longitude')
+        if (latitude is None) != (longitude is None):
+            self.add_error('longitude' if longitude is None else 'latitude', "Enter both latitude and longitude.")
+        if latitude is not None and not -90 <= latitude <= 90:
+            self.add_error('latitude', "Latitude must be between -90 and 90.")
+        if longitude is not None and not -180 <= longitude <= 180:
+            self.add_error('longitude', "Longitude must be between -180 and 180.")
             
         return cleaned_data
         
@@ -0,0 +1,182 @@
+"""Geohash helpers used to find the service providers nearest to a customer.
+
+Providers store their coordinates together with a geohash of them. Geohashes
+sharing a prefix lie in the same grid cell, so "every provider in this cell"
+is an indexed range scan on the ``geohash`` column instead of a full table
+scan followed by a Python-side distance sort.
+"""
+import math
+
+from django.db.models import Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+BASE32_INDEX = {char: index for index, char in enumerate(BASE32)}
+
+# Precision stored on each row (~5m x 5m cells)
+GEOHASH_PRECISION = 9
+
+# Finest cell size a nearest-neighbour search starts from (~1.2km x 0.6km)
+SEARCH_START_PRECISION = 6
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Return the geohash of a point."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits = bits << 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+def bounding_box(geohash):
+    """Return ``(lat_min, lat_max, lng_min, lng_max)`` of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = BASE32_INDEX[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lng_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+def neighbours(geohash):
+    """Return the (up to) eight cells surrounding a geohash cell."""
+    lat_min, lat_max, lng_min, lng_max = bounding_box(geohash)
+    height = lat_max - lat_min
+    width = lng_max - lng_min
+    centre_lat = (lat_min + lat_max) / 2
+    centre_lng = (lng_min + lng_max) / 2
+
+    cells = set()
+    for d_lat in (-1, 0, 1):
+        lat = centre_lat + d_lat * height
+        if lat < -90 or lat > 90:
+            continue
+        for d_lng in (-1, 0, 1):
+            if d_lat == 0 and d_lng == 0:
+                continue
+            # Wrap around the antimeridian
+            lng = (centre_lng + d_lng * width + 180) % 360 - 180
+            cells.add(encode(lat, lng, len(geohash)))
+    cells.discard(geohash)
+    return cells
+
+
+def covered_radius_km(geohash):
+    """Distance from any point of a cell that its 3x3 block is sure to cover.
+
+    A point inside the centre cell is at least one cell height/width away from
+    the edge of the block, so anything closer than that lies in the block.
+    """
+    lat_min, lat_max, lng_min, lng_max = bounding_box(geohash)
+    widest_lat = min(max(abs(lat_min), abs(lat_max)) + (lat_max - lat_min), 90.0)
+    height_km = (lat_max - lat_min) * KM_PER_DEGREE
+    width_km = (lng_max - lng_min) * KM_PER_DEGREE * math.cos(math.radians(widest_lat))
+    return min(height_km, width_km)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def cells_filter(cells, field='geohash'):
+    """Q object matching rows whose geohash falls inside any of ``cells``.
+
+    Written as ``>= prefix AND < prefix~`` ranges (``~`` sorts after every
+    base32 character) so every backend can answer it from a plain B-tree index.
+    """
+    query = Q()
+    for cell in cells:
+        query |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '~'})
+    return query
+
+
+def nearest(queryset, latitude, longitude, k=10, max_distance_km=None):
+    """Return the ``k`` rows of ``queryset`` nearest to a point.
+
+    ``queryset`` must be over a model with ``latitude``, ``longitude`` and
+    ``geohash`` fields. The search starts from a small 3x3 block of cells
+    around the point and only widens it while fewer than ``k`` rows are
+    provably the nearest ones, so dense areas never touch far-away rows.
+    Each returned object gets a ``distance_km`` attribute.
+    """
+    centre = encode(latitude, longitude, GEOHASH_PRECISION)
+    queryset = queryset.exclude(geohash='')
+    found = []
+
+    for precision in range(SEARCH_START_PRECISION, 0, -1):
+        cell = centre[:precision]
+        candidates = list(queryset.filter(cells_filter({cell} | neighbours(cell))))
+        for candidate in candidates:
+            candidate.distance_km = haversine_km(
+                latitude, longitude, candidate.latitude, candidate.longitude
+            )
+        candidates.sort(key=lambda candidate: candidate.distance_km)
+        if max_distance_km is not None:
+            candidates = [c for c in candidates if c.distance_km <= max_distance_km]
+        found = candidates[:k]
+
+        radius = covered_radius_km(cell)
+        if max_distance_km is not None and max_distance_km <= radius:
+            break
+        if len(found) == k and found[-1].distance_km <= radius:
+            break
+
+    return found
+
+
+def parse_coordinates(latitude, longitude):
+    """Turn raw latitude/longitude strings into a float pair, or ``None``."""
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return latitude, longitude
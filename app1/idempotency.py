@@ -0,0 +1,116 @@
+"""Keep repeated form submissions from creating duplicate service requests.
+
+Every request form carries a random key, rendered with the page. The first
+submission stores the key next to the request it created, under a unique
+constraint; a repeat with the same key (a double tap, or a retry after a
+dropped response) finds that row and gets the original request back. When
+two copies race, the loser's insert fails, its transaction rolls back, and
+it looks the key up like any other repeat.
+
+A key only stands for the form it was rendered into. The provider modal is
+shared by every card on the page and gets a fresh key each time it opens
+for another provider, but a key that does come back for a different
+provider or category is a new submission, not a repeat.
+
+Submissions without a key, or with a fresh key after a reload, are caught
+by ``find_duplicate``: an open request from the same customer for the same
+provider and category within ``settings.DUPLICATE_REQUEST_WINDOW``.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ServiceRequest, SubmissionKey
+
+KEY_FIELD = 'submission_key'
+OPEN_STATUSES = ('pending', 'accepted', 'in_progress')
+
+
+def new_key():
+    return uuid.uuid4().hex
+
+
+def submitted_key(request):
+    """The key posted with ``request``, or ``None`` if it is missing or malformed."""
+    key = request.POST.get(KEY_FIELD, '').strip()
+    if not key or len(key) > SubmissionKey._meta.get_field('key').max_length:
+        return None
+    return key
+
+
+def find_original(user, key):
+    """The request first created with ``key``, or ``None``."""
+    if key is None:
+        return None
+    return ServiceRequest.objects.select_related('provider').filter(
+        id__in=SubmissionKey.objects.filter(user=user, key=key).values('service_request_id')
+    ).first()
+
+
+def same_target(service_request, category, provider=None):
+    """Whether ``service_request`` was made for ``category`` from ``provider`` (``None``: dispatched)."""
+    if service_request.service_category_id != category.id:
+        return False
+    if provider is None:
+        return service_request.is_dispatched
+    return not service_request.is_dispatched and service_request.provider_id == provider.id
+
+
+def find_duplicate(user, category, provider=None):
+    """An open request ``user`` made for the same provider and category moments ago.
+
+    ``provider=None`` matches dispatched requests, which have no provider
+    until one accepts.
+    """
+    since = timezone.now() - timedelta(seconds=settings.DUPLICATE_REQUEST_WINDOW)
+    requests = ServiceRequest.objects.select_related('provider').filter(
+        customer=user, status__in=OPEN_STATUSES, created_at__gte=since, service_category=category
+    )
+    if provider is None:
+        requests = requests.filter(is_dispatched=True)
+    else:
+        requests = requests.filter(provider=provider)
+    return requests.order_by('-created_at', '-id').first()
+
+
+def find_existing(user, key, category, provider=None):
+    """The request this submission repeats, by key or as a near-duplicate, and the key to store.
+
+    Returns ``(request or None, key)``. The key comes back as ``None`` when
+    it was already used for another provider or category, so the new
+    request is created without one.
+    """
+    original = find_original(user, key)
+    if original is not None:
+        if same_target(original, category, provider):
+            return original, key
+        key = None
+    return find_duplicate(user, category, provider), key
+
+
+def remember(user, key, service_request):
+    """Store ``key`` for ``service_request``. Must run in the transaction that created it.
+
+    Raises ``IntegrityError`` if another submission already used the key.
+    """
+    if key is not None:
+        SubmissionKey.objects.create(user=user, key=key, service_request=service_request)
+
+
+def purge(older_than=None, batch_size=1000):
+    """Delete keys older than ``older_than`` seconds (default ``settings.SUBMISSION_KEY_TTL``).
+
+    Deletes ``batch_size`` rows per statement, so the write lock is never
+    held for long. Returns how many keys were deleted.
+    """
+    if older_than is None:
+        older_than = settings.SUBMISSION_KEY_TTL
+    expired = SubmissionKey.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=older_than))
+    deleted = 0
+    while True:
+        batch = list(expired.values_list('id', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += SubmissionKey.objects.filter(id__in=batch).delete()[0]
@@ -0,0 +1,237 @@
+"""Bulk loading of service providers from CSV or JSON Lines files.
+
+``ProviderRegistrationForm`` creates one provider at a time, with a query
+per uniqueness check and a full password hash on the request thread. Here
+the file is read as a stream and handled ``chunk_size`` rows at a time:
+
+- every row is checked as the form would check it, but the usernames and
+  emails of the whole chunk are looked up in one query each;
+- passwords are hashed on a process pool, since PBKDF2 is slow on purpose;
+- users, providers, their category links and their ``ProviderStats`` rows
+  are inserted with ``bulk_create``, one transaction per chunk.
+
+``bulk_create`` sends no signals, so what the signals would do is done
+here: the stats row, the category count, the geohash and, for approved
+providers, dropping the cached listings of their categories.
+
+Columns: ``username``, ``email``, ``company_name``, ``phone_number`` and
+``categories`` (slugs or names, separated by ``;``) are required;
+``password``, ``address``, ``latitude`` and ``longitude`` are optional.
+A row without a password gets an unusable one, to be set through a
+password reset. With passwords, hashing dominates: PBKDF2 takes the
+better part of a second per password on one core.
+"""
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from . import page_cache
+from .models import ProviderStats, ServiceCategory, ServiceProvider
+
+FORMATS = ('csv', 'jsonl')
+REQUIRED = ('username', 'email', 'company_name', 'phone_number', 'categories')
+CHUNK_SIZE = 1000
+CATEGORY_SEPARATOR = ';'
+
+_validate_username = UnicodeUsernameValidator()
+
+
+def format_for(path):
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(path, format):
+    """Yield ``(line number, row dict)`` for every record in the file."""
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        if format == 'csv':
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, {key.strip().lower(): value for key, value in row.items() if key}
+            return
+        for line_number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def category_lookup():
+    """Active categories by lowercased slug and name."""
+    lookup = {}
+    for category in ServiceCategory.objects.filter(is_active=True):
+        lookup[category.slug.lower()] = category.id
+        lookup[category.name.lower()] = category.id
+    return lookup
+
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def _coordinate(value, low, high, name):
+    if value in (None, ''):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f'{name} must be a number.')
+    if not low <= number <= high:
+        raise ValidationError(f'{name} must be between {low} and {high}.')
+    return number
+
+
+def clean_row(row, categories):
+    """The row's values ready to insert, or raises ``ValidationError`` with the first problem."""
+    if row is None:
+        raise ValidationError('Not a JSON object.')
+    missing = [field for field in REQUIRED if not _text(row, field)]
+    if missing:
+        raise ValidationError(f'Missing {", ".join(missing)}.')
+
+    username = _text(row, 'username')
+    if len(username) > 150:
+        raise ValidationError('Username is longer than 150 characters.')
+    _validate_username(username)
+    email = _text(row, 'email')
+    validate_email(email)
+    if len(_text(row, 'company_name')) > 200:
+        raise ValidationError('Company name is longer than 200 characters.')
+    if len(_text(row, 'phone_number')) > 20:
+        raise ValidationError('Phone number is longer than 20 characters.')
+
+    latitude = _coordinate(row.get('latitude'), -90, 90, 'Latitude')
+    longitude = _coordinate(row.get('longitude'), -180, 180, 'Longitude')
+    if (latitude is None) != (longitude is None):
+        raise ValidationError('Enter both latitude and longitude.')
+
+    names = [name.strip().lower() for name in _text(row, 'categories').split(CATEGORY_SEPARATOR) if name.strip()]
+    unknown = [name for name in names if name not in categories]
+    if unknown:
+        raise ValidationError(f'Unknown service category {", ".join(unknown)}.')
+
+    return {
+        'username': username,
+        'email': email,
+        'password': _text(row, 'password') or None,
+        'company_name': _text(row, 'company_name'),
+        'phone_number': _text(row, 'phone_number'),
+        'address': _text(row, 'address'),
+        'latitude': latitude,
+        'longitude': longitude,
+        'category_ids': sorted({categories[name] for name in names}),
+    }
+
+
+def validate(chunk, categories, seen_usernames, seen_emails):
+    """Split a chunk of ``(line number, row)`` into clean rows and ``(line number, message)`` errors.
+
+    ``seen_usernames`` and ``seen_emails`` carry what earlier chunks of the
+    same file claimed, and are updated with this chunk's rows.
+    """
+    cleaned, errors = [], []
+    for line_number, row in chunk:
+        try:
+            cleaned.append((line_number, clean_row(row, categories)))
+        except ValidationError as error:
+            errors.append((line_number, ' '.join(error.messages)))
+
+    taken_usernames = set(
+        User.objects.filter(username__in=[row['username'] for _, row in cleaned]).values_list('username', flat=True)
+    )
+    taken_emails = set(
+        User.objects.filter(email__in=[row['email'] for _, row in cleaned]).values_list('email', flat=True)
+    )
+    valid = []
+    for line_number, row in cleaned:
+        if row['username'] in taken_usernames or row['username'] in seen_usernames:
+            errors.append((line_number, 'This username is already taken.'))
+        elif row['email'] in taken_emails or row['email'] in seen_emails:
+            errors.append((line_number, 'This email is already registered.'))
+        else:
+            seen_usernames.add(row['username'])
+            seen_emails.add(row['email'])
+            valid.append(row)
+    errors.sort()
+    return valid, errors
+
+
+def password_pool(workers):
+    """A process pool for hashing, or ``None`` to hash in this process."""
+    if workers <= 1:
+        return None
+    # Processes started with "spawn" (macOS, Windows) need Django set up again
+    return ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+
+def hash_passwords(passwords, pool=None):
+    """``make_password`` for each password; ``None`` gives an unusable password without hashing."""
+    to_hash = [(index, password) for index, password in enumerate(passwords) if password is not None]
+    hashed = [make_password(None) for _ in passwords]
+    if pool is None:
+        results = map(make_password, [password for _, password in to_hash])
+    else:
+        results = pool.map(make_password, [password for _, password in to_hash], chunksize=16)
+    for (index, _), encoded in zip(to_hash, results):
+        hashed[index] = encoded
+    return hashed
+
+
+def insert(rows, approve=False, pool=None):
+    """Create the users, providers, category links and stats rows of ``rows`` in one transaction.
+
+    Returns the created providers.
+    """
+    passwords = hash_passwords([row['password'] for row in rows], pool)
+    Through = ServiceProvider.service_categories.through
+    with transaction.atomic():
+        users = User.objects.bulk_create(
+            User(username=row['username'], email=row['email'], password=password, is_active=approve)
+            for row, password in zip(rows, passwords)
+        )
+        providers = []
+        for row, user in zip(rows, users):
+            provider = ServiceProvider(
+                user=user,
+                company_name=row['company_name'],
+                phone_number=row['phone_number'],
+                address=row['address'],
+                latitude=row['latitude'],
+                longitude=row['longitude'],
+                is_approved=approve,
+            )
+            provider.geohash = provider.compute_geohash()
+            providers.append(provider)
+        providers = ServiceProvider.objects.bulk_create(providers)
+        Through.objects.bulk_create(
+            Through(serviceprovider_id=provider.id, servicecategory_id=category_id)
+            for row, provider in zip(rows, providers)
+            for category_id in row['category_ids']
+        )
+        ProviderStats.objects.bulk_create(
+            ProviderStats(provider_id=provider.id, service_categories=len(row['category_ids']))
+            for row, provider in zip(rows, providers)
+        )
+        if approve:
+            page_cache.invalidate_on_commit(
+                {category_id for row in rows for category_id in row['category_ids']}
+            )
+    return providers
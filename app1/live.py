@@ -0,0 +1,162 @@
+"""Publish/subscribe for live updates.
+
+Writers publish small JSON-able messages once their transaction commits, on
+a channel per provider (streamed as Server-Sent Events by ``provider_feed``)
+and a channel per service request (long-polled by its customer through
+``service_request_status``). An idle subscriber is one coroutine waiting on an
+``asyncio.Queue`` (no thread, no database connection), so a single ASGI
+worker can hold thousands of them.
+
+The broker is chosen with ``settings.LIVE_FEED_BROKER``. ``LocalBroker``
+only reaches subscribers in the same process; a multi-process deployment
+plugs in a broker with the same ``publish``/``subscribe`` methods backed by
+something shared.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """One listener on one channel, bound to the event loop that created it."""
+
+    def __init__(self, broker, channel, queue_size):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def deliver(self, message):
+        """Queue ``message`` for this subscriber. Safe to call from any thread."""
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.queue.full():
+            # A stalled client loses its oldest message rather than holding
+            # unbounded memory; the dashboard is the source of truth on reload
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """The next message, or ``None`` if ``timeout`` seconds pass first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalBroker:
+    """In-process broker. Publishing is thread-safe, so sync views can call it."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        """Start listening on ``channel``. Must be called inside a running event loop."""
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            listeners = self._subscriptions.get(subscription.channel)
+            if listeners is not None:
+                listeners.discard(subscription)
+                if not listeners:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, message):
+        """Send ``message`` to everyone on ``channel``; returns how many received it."""
+        with self._lock:
+            listeners = list(self._subscriptions.get(channel, ()))
+        delivered = 0
+        for subscription in listeners:
+            try:
+                subscription.deliver(message)
+            except RuntimeError:
+                # Its event loop has shut down without unsubscribing
+                self.unsubscribe(subscription)
+            else:
+                delivered += 1
+        return delivered
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(len(listeners) for listeners in self._subscriptions.values())
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.LIVE_FEED_BROKER)()
+
+
+def provider_channel(provider_id):
+    return f'provider:{provider_id}'
+
+
+def request_channel(service_request_id):
+    """Channel for status changes of a single request, watched by its customer."""
+    return f'request:{service_request_id}'
+
+
+def request_message(event, service_request):
+    """The feed payload for a service request.
+
+    Only uses the category if it is already loaded, so building the message
+    never costs a query.
+    """
+    category = service_request._state.fields_cache.get('service_category')
+    return {
+        'event': event,
+        'id': service_request.id,
+        'status': service_request.status,
+        'customer_name': service_request.customer_name,
+        'customer_location': service_request.customer_location,
+        'category': category.name if category else None,
+        'created_at': service_request.created_at.isoformat() if service_request.created_at else None,
+    }
+
+
+def publish_on_commit(channels, message):
+    """Publish ``message`` on each channel once the current transaction commits."""
+    channels = list(channels)
+    if not channels:
+        return
+
+    def send():
+        broker = get_broker()
+        for channel in channels:
+            broker.publish(channel, message)
+
+    transaction.on_commit(send)
+
+
+def publish_to_providers(provider_ids, message):
+    publish_on_commit(
+        [provider_channel(provider_id) for provider_id in provider_ids if provider_id is not None], message
+    )
+
+
+def request_status_changed(service_request_id, status):
+    publish_on_commit(
+        [request_channel(service_request_id)], {'event': 'status', 'id': service_request_id, 'status': status}
+    )
@@ -1,35 +1,90 @@
-from django.core.management.base import BaseCommand
+import csv
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
 from app1.models import ServiceProvider
 
+
 class Command(BaseCommand):
-    help = 'Approve a service provider by username'
+    help = (
+        'Approve service providers and activate their accounts: by username, '
+        'by filter, or from a CSV file with a "username" or "email" column'
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument('username', type=str, help='Username of the provider to approve')
+        parser.add_argument('usernames', nargs='*', help='Usernames of the providers to approve')
+        parser.add_argument('--csv', dest='csv_path', help='CSV file with a "username" or "email" column')
+        parser.add_argument('--all-pending', action='store_true', help='Every provider awaiting approval')
+        parser.add_argument('--category', help='Only providers offering this category (slug)')
+        parser.add_argument('--email-domain', help='Only providers whose email is at this domain')
+        parser.add_argument('--registered-since', help='Only providers registered on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--dry-run', action='store_true', help='List who would be approved')
+
+    def handle(self, *args, **options):
+        usernames = set(options['usernames'])
+        emails = set()
+        if options['csv_path']:
+            csv_usernames, emails = self.read_csv(options['csv_path'])
+            usernames |= csv_usernames
+
+        providers = ServiceProvider.objects.all()
+        if usernames or emails:
+            providers = providers.filter(user__username__in=usernames) | providers.filter(user__email__in=emails)
+        elif not options['all_pending'] and not any(
+            options[name] for name in ('category', 'email_domain', 'registered_since')
+        ):
+            raise CommandError('Name the providers to approve, give a --csv file, a filter, or --all-pending.')
+
+        if options['category']:
+            providers = providers.filter(service_categories__slug=options['category'])
+        if options['email_domain']:
+            providers = providers.filter(user__email__iendswith='@' + options['email_domain'].lstrip('@'))
+        if options['registered_since']:
+            since = parse_date(options['registered_since'])
+            if since is None:
+                raise CommandError('--registered-since must be a date (YYYY-MM-DD).')
+            providers = providers.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+        providers = providers.distinct()
+
+        found = set(providers.values_list('user__username', flat=True)) | set(
+            providers.values_list('user__email', flat=True)
+        )
+        for name in sorted((usernames | emails) - found):
+            self.stdout.write(self.style.ERROR(f'Provider "{name}" not found'))
+
+        if options['dry_run']:
+            pending = providers.filter(is_approved=False).order_by('company_name')
+            for provider in pending.select_related('user'):
+                self.stdout.write(f'{provider.company_name} ({provider.user.username})')
+            self.stdout.write(f'{pending.count()} providers would be approved')
+            return
+
+        approved = providers.approve()
+        if options['verbosity'] >= 2:
+            for provider in approved:
+                self.stdout.write(f'  {provider.company_name} ({provider.user.username})')
+        self.stdout.write(self.style.SUCCESS(
+            f'Approved {len(approved)} provider{"s" if len(approved) != 1 else ""} and activated their accounts'
+        ))
 
-    def handle(self, *args, **kwargs):
-        username = kwargs['username']
-        
+    def read_csv(self, path):
         try:
-            provider = ServiceProvider.objects.get(user__username=username)
-            
-            # Approve the provider
-            provider.is_approved = True
-            provider.save()
-            
-            # Activate the user account
-            user = provider.user
-            user.is_active = True
-            user.save()
-            
-            self.stdout.write(self.style.SUCCESS(
-                f'Successfully approved provider: {provider.company_name} ({username})'
-            ))
-            self.stdout.write(self.style.SUCCESS(
-                f'User account activated: {user.username}'
-            ))
-            
-        except ServiceProvider.DoesNotExist:
-            self.stdout.write(self.style.ERROR(
-                f'Provider with username "{username}" not found'
-            ))
+            with open(path, newline='', encoding='utf-8-sig') as csv_file:
+                reader = csv.DictReader(csv_file)
+                columns = {name.strip().lower(): name for name in reader.fieldnames or ()}
+                if 'username' not in columns and 'email' not in columns:
+                    raise CommandError(f'{path} needs a "username" or "email" column.')
+                usernames, emails = set(), set()
+                for row in reader:
+                    username = (row.get(columns.get('username')) or '').strip()
+                    email = (row.get(columns.get('email')) or '').strip()
+                    if username:
+                        usernames.add(username)
+                    elif email:
+                        emails.add(email)
+        except OSError as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+        return usernames, emails
@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from app1 import exports
+from app1.models import ArchivedRecord
+
+FINISHED_STATUSES = ['completed', 'cancelled', 'expired']
+
+
+class Command(BaseCommand):
+    help = (
+        'Move completed, cancelled and expired service requests and bookings older than a cutoff '
+        'into ArchivedRecord, in small transactions. Safe to interrupt and run again. '
+        'Bookings with a review are kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+            help='Archive rows created more than this many days ago (default: ARCHIVE_AFTER_DAYS)',
+        )
+        parser.add_argument(
+            '--kind', choices=sorted(exports.EXPORTS), action='append', dest='kinds',
+            help='What to archive; repeat for several (default: everything)',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction')
+        parser.add_argument(
+            '--pause', type=float, default=0, help='Seconds to sleep between batches, to let live writes through'
+        )
+        parser.add_argument('--limit', type=int, help='Stop after archiving this many rows of each kind')
+        parser.add_argument('--dry-run', action='store_true', help='Count what would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        for kind in options['kinds'] or sorted(exports.EXPORTS):
+            eligible = self.eligible(kind, cutoff)
+            if options['dry_run']:
+                self.stdout.write(f'{eligible.count()} {kind} would be archived')
+                continue
+
+            archived = 0
+            started = time.perf_counter()
+            while options['limit'] is None or archived < options['limit']:
+                batch_size = options['batch_size']
+                if options['limit'] is not None:
+                    batch_size = min(batch_size, options['limit'] - archived)
+                moved = self.archive_batch(kind, eligible, batch_size)
+                if not moved:
+                    break
+                archived += moved
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'  {kind}: {archived} archived')
+                if options['pause']:
+                    time.sleep(options['pause'])
+
+            elapsed = time.perf_counter() - started
+            rate = archived / elapsed if elapsed else 0
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {archived} {kind} in {elapsed:.1f}s ({rate:,.0f} rows/s)'
+            ))
+
+    def eligible(self, kind, cutoff):
+        model, _ = exports.EXPORTS[kind]
+        # Served by the (status, created_at) index
+        rows = model.objects.filter(status__in=FINISHED_STATUSES, created_at__lt=cutoff)
+        if kind == 'bookings':
+            # Deleting the booking would delete its review with it
+            rows = rows.filter(review__isnull=True)
+        return rows
+
+    def archive_batch(self, kind, eligible, batch_size):
+        """Copy up to ``batch_size`` rows into the archive and delete them, in one transaction.
+
+        An interrupted batch rolls back whole, so the next run picks up from
+        the rows still in the live table. Returns how many rows were moved.
+        """
+        model, columns = exports.EXPORTS[kind]
+        names = [name for name, _ in columns]
+        with transaction.atomic():
+            ids = list(eligible.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return 0
+            rows = [
+                dict(zip(names, row))
+                for row in model.objects.filter(id__in=ids).values_list(*(lookup for _, lookup in columns))
+            ]
+            ArchivedRecord.objects.bulk_create(
+                [
+                    ArchivedRecord(
+                        kind=kind, original_id=row['id'], status=row['status'], created_at=row['created_at'], data=row
+                    )
+                    for row in rows
+                ]
+            )
+            model.objects.filter(id__in=ids).delete()
+        return len(ids)
@@ -0,0 +1,157 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app1.models import ServiceRequest
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the ServiceRequest dashboard queries on a synthetic table, '
+        'before and after adding the Meta.indexes declared on the model'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Number of synthetic service requests')
+        parser.add_argument('--providers', type=int, default=5_000, help='Number of distinct providers')
+        parser.add_argument('--customers', type=int, default=200_000, help='Number of distinct customers')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic data')
+        parser.add_argument('--path', help='SQLite file to build the table in (default: a temporary file)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark generates SQLite DDL and needs the default database to be SQLite.')
+
+        path = options['path'] or os.path.join(tempfile.mkdtemp(), 'benchmark.sqlite3')
+        if os.path.exists(path):
+            raise CommandError(f'{path} already exists, refusing to overwrite it.')
+
+        create_table, field_indexes, meta_indexes = self.model_ddl()
+        db = sqlite3.connect(path)
+        db.execute(create_table)
+        # "Before" is the table as it was shipped: only the per-FK indexes
+        for sql in field_indexes:
+            db.execute(sql)
+
+        self.stdout.write(f'Building {options["rows"]:,} synthetic rows in {path} ...')
+        started = time.perf_counter()
+        self.populate(db, options)
+        self.stdout.write(f'  done in {time.perf_counter() - started:.1f}s')
+
+        rng = random.Random(options['seed'])
+        probes = {
+            'provider': rng.randint(1, options['providers']),
+            'customer': rng.randint(1, options['customers']),
+        }
+
+        db.execute('ANALYZE')
+        before = self.run_queries(db, probes, options['repeat'], 'BEFORE (foreign key indexes only)')
+
+        started = time.perf_counter()
+        for sql in meta_indexes:
+            db.execute(sql)
+        db.execute('ANALYZE')
+        self.stdout.write(f'\nCreated {len(meta_indexes)} Meta.indexes in {time.perf_counter() - started:.1f}s')
+
+        after = self.run_queries(db, probes, options['repeat'], 'AFTER (with Meta.indexes)')
+
+        self.stdout.write(self.style.SUCCESS('\nSummary (median ms)'))
+        for label in before:
+            speedup = before[label] / after[label] if after[label] else float('inf')
+            self.stdout.write(f'  {label:<40} {before[label]:>10.3f} {after[label]:>10.3f}  x{speedup:,.1f}')
+
+        db.close()
+        if not options['path']:
+            os.remove(path)
+
+    def model_ddl(self):
+        """CREATE statements for the ServiceRequest table exactly as Django would emit them."""
+        model = ServiceRequest
+        with connection.schema_editor(collect_sql=True) as editor:
+            create_table, _ = editor.table_sql(model)
+            field_indexes = [
+                str(sql)
+                for field in model._meta.local_fields
+                for sql in editor._field_indexes_sql(model, field)
+            ]
+            meta_indexes = [str(index.create_sql(model, editor)) for index in model._meta.indexes]
+        return create_table, field_indexes, meta_indexes
+
+    def populate(self, db, options):
+        rng = random.Random(options['seed'])
+        # Most requests in a mature table are finished
+        statuses = ['pending', 'accepted', 'in_progress', 'completed', 'cancelled']
+        weights = [1, 1, 1, 6, 1]
+        now = datetime(2025, 1, 1)
+
+        fields = [field for field in ServiceRequest._meta.concrete_fields if not field.primary_key]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join('?' for _ in fields)
+        sql = f'INSERT INTO {connection.ops.quote_name(ServiceRequest._meta.db_table)} ({columns}) VALUES ({placeholders})'
+
+        # Fields the benchmark does not care about get their model default
+        defaults = {field.attname: field.get_db_prep_save(field.get_default(), connection) for field in fields}
+
+        def rows():
+            for _ in range(options['rows']):
+                created = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+                created = created.strftime('%Y-%m-%d %H:%M:%S.%f')
+                values = dict(defaults)
+                values.update({
+                    'provider_id': rng.randint(1, options['providers']),
+                    'customer_id': rng.randint(1, options['customers']),
+                    'service_category_id': rng.randint(1, 6),
+                    'customer_name': 'Synthetic Customer',
+                    'customer_phone': '555-0100',
+                    'customer_location': 'Somewhere on the road',
+                    'status': rng.choices(statuses, weights)[0],
+                    'created_at': created,
+                    'updated_at': created,
+                })
+                yield [values[field.attname] for field in fields]
+
+        with db:
+            db.executemany(sql, rows())
+
+    def queries(self):
+        table = connection.ops.quote_name(ServiceRequest._meta.db_table)
+        return [
+            ('provider_dashboard pending count',
+             f"SELECT COUNT(*) FROM {table} WHERE provider_id = :provider AND status = 'pending'"),
+            ('provider_dashboard recent requests',
+             f'SELECT * FROM {table} WHERE provider_id = :provider ORDER BY created_at DESC LIMIT 10'),
+            ('my_bookings all requests',
+             f'SELECT * FROM {table} WHERE customer_id = :customer ORDER BY created_at DESC LIMIT 20'),
+            ('my_bookings completed tab',
+             f"SELECT * FROM {table} WHERE customer_id = :customer AND status = 'completed' "
+             f'ORDER BY created_at DESC LIMIT 20'),
+            ('admin_dashboard pending count',
+             f"SELECT COUNT(*) FROM {table} WHERE status = 'pending'"),
+            ('admin_dashboard recent requests',
+             f'SELECT * FROM {table} ORDER BY created_at DESC LIMIT 10'),
+        ]
+
+    def run_queries(self, db, params, repeat, title):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n{title}'))
+        timings = {}
+        for label, sql in self.queries():
+            plan = db.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                db.execute(sql, params).fetchall()
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[label] = statistics.median(samples)
+
+            self.stdout.write(f'  {label}: median {timings[label]:.3f} ms')
+            for row in plan:
+                self.stdout.write(f'      {row[-1]}')
+        return timings
@@ -0,0 +1,219 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app1.models import ProviderStats, RequestEvent, ServiceRequest
+from roadmate1 import database
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark concurrent service request writes on SQLite under each database profile '
+        '(see roadmate1/database.py)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent writer threads')
+        parser.add_argument('--transactions', type=int, default=200, help='Transactions per writer thread')
+        parser.add_argument('--readers', type=int, default=2, help='Threads reading the provider dashboard meanwhile')
+        parser.add_argument('--providers', type=int, default=50, help='Number of distinct providers')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument(
+            '--profile', action='append', choices=sorted(database.PROFILES), dest='profiles',
+            help='Profile to benchmark; repeat for several (default: all of them)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark generates SQLite DDL and needs the default database to be SQLite.')
+
+        results = {}
+        for name in options['profiles'] or sorted(database.PROFILES):
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, f'{name}.sqlite3')
+            self.create_schema(path, options['providers'])
+            results[name] = self.run_profile(name, path, options)
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+            os.rmdir(directory)
+
+        self.stdout.write(self.style.SUCCESS('\nSummary'))
+        self.stdout.write(
+            f'  {"profile":<12} {"tx/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"failed":>7} {"reads/s":>9}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'  {name:<12} {result["throughput"]:>9.1f} {result["p50"]:>9.2f} {result["p99"]:>9.2f} '
+                f'{result["failed"]:>7} {result["read_throughput"]:>9.1f}'
+            )
+
+    def create_schema(self, path, providers):
+        """The tables a new service request writes to, as Django would create them."""
+        db = sqlite3.connect(path)
+        with connection.schema_editor(collect_sql=True) as editor:
+            for model in (ServiceRequest, RequestEvent, ProviderStats):
+                create_table, _ = editor.table_sql(model)
+                db.execute(create_table)
+                for field in model._meta.local_fields:
+                    for sql in editor._field_indexes_sql(model, field):
+                        db.execute(str(sql))
+                for index in model._meta.indexes:
+                    db.execute(str(index.create_sql(model, editor)))
+        with db:
+            db.executemany(
+                f'INSERT INTO {ProviderStats._meta.db_table} (provider_id, pending_requests, active_requests, '
+                'active_bookings, total_services, service_categories, updated_at) VALUES (?, 0, 0, 0, 0, 0, ?)',
+                [(provider_id, self.now()) for provider_id in range(1, providers + 1)],
+            )
+        db.close()
+
+    def now(self):
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    def insert_sql(self, model):
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join(f':{field.attname}' for field in fields)
+        defaults = {field.attname: field.get_db_prep_save(field.get_default(), connection) for field in fields}
+        return f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) VALUES ({placeholders})', defaults
+
+    def run_profile(self, name, path, options):
+        settings = database.profile(name)
+        db_options = settings.get('OPTIONS', {})
+        pragmas = [command.strip() for command in db_options.get('init_command', '').split(';') if command.strip()]
+        begin = f'BEGIN {db_options["transaction_mode"]}' if db_options.get('transaction_mode') else 'BEGIN'
+        persistent = settings.get('CONN_MAX_AGE', 0) != 0
+
+        def connect():
+            # Python's own 5 second timeout, as Django uses when none is configured
+            db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            for pragma in pragmas:
+                db.execute(pragma)
+            return db
+
+        request_sql, request_defaults = self.insert_sql(ServiceRequest)
+        event_sql, event_defaults = self.insert_sql(RequestEvent)
+        stats_sql = (
+            f'UPDATE {ProviderStats._meta.db_table} SET pending_requests = pending_requests + 1, '
+            'updated_at = ? WHERE provider_id = ?'
+        )
+        dashboard_sql = (
+            f"SELECT COUNT(*) FROM {ServiceRequest._meta.db_table} WHERE provider_id = ? AND status = 'pending'"
+        )
+
+        latencies = []
+        failures = []
+        reads = []
+        done = threading.Event()
+        start = threading.Barrier(options['threads'] + options['readers'])
+
+        def writer(thread_number):
+            rng = random.Random(options['seed'] + thread_number)
+            db = connect() if persistent else None
+            mine, failed = [], 0
+            start.wait()
+            for _ in range(options['transactions']):
+                provider_id = rng.randint(1, options['providers'])
+                now = self.now()
+                started = time.perf_counter()
+                # Without persistent connections every request opens its own
+                if not persistent:
+                    db = connect()
+                try:
+                    db.execute(begin)
+                    cursor = db.execute(request_sql, {
+                        **request_defaults,
+                        'provider_id': provider_id,
+                        'customer_id': rng.randint(1, 10_000),
+                        'service_category_id': rng.randint(1, 6),
+                        'customer_name': 'Benchmark Customer',
+                        'customer_phone': '555-0100',
+                        'customer_location': 'Somewhere on the road',
+                        'status': 'pending',
+                        'created_at': now,
+                        'updated_at': now,
+                    })
+                    db.execute(event_sql, {
+                        **event_defaults,
+                        'service_request_id': cursor.lastrowid,
+                        'provider_id': provider_id,
+                        'to_status': 'pending',
+                        'created_at': now,
+                    })
+                    db.execute(stats_sql, (now, provider_id))
+                    db.execute('COMMIT')
+                except sqlite3.OperationalError:
+                    # What Django would surface as a 500: "database is locked"
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+                    failed += 1
+                else:
+                    mine.append((time.perf_counter() - started) * 1000)
+                if not persistent:
+                    db.close()
+            if persistent:
+                db.close()
+            latencies.extend(mine)
+            failures.append(failed)
+
+        def reader(thread_number):
+            rng = random.Random(-options['seed'] - thread_number)
+            db = connect() if persistent else None
+            count = 0
+            start.wait()
+            while not done.is_set():
+                if not persistent:
+                    db = connect()
+                try:
+                    db.execute(dashboard_sql, (rng.randint(1, options['providers']),)).fetchone()
+                    count += 1
+                except sqlite3.OperationalError:
+                    pass
+                if not persistent:
+                    db.close()
+            if persistent:
+                db.close()
+            reads.append(count)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'\n{name}: {options["threads"]} writers x {options["transactions"]} transactions, '
+            f'{options["readers"]} readers'
+        ))
+        if pragmas:
+            self.stdout.write(f'  {"; ".join(pragmas)}')
+        self.stdout.write(f'  {begin}, {"persistent" if persistent else "per-request"} connections')
+
+        writers = [threading.Thread(target=writer, args=(i,)) for i in range(options['threads'])]
+        readers = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        for thread in writers + readers:
+            thread.start()
+        started = time.perf_counter()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        latencies.sort()
+        result = {
+            'throughput': len(latencies) / elapsed,
+            'p50': statistics.median(latencies) if latencies else float('nan'),
+            'p99': latencies[int(len(latencies) * 0.99) - 1] if latencies else float('nan'),
+            'failed': sum(failures),
+            'read_throughput': sum(reads) / elapsed,
+        }
+        self.stdout.write(
+            f'  {len(latencies)} committed, {result["failed"]} failed in {elapsed:.2f}s: '
+            f'{result["throughput"]:.1f} tx/s, p50 {result["p50"]:.2f} ms, p99 {result["p99"]:.2f} ms, '
+            f'{result["read_throughput"]:.1f} reads/s'
+        )
+        return result
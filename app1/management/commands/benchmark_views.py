@@ -0,0 +1,241 @@
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from app1 import idempotency, routers
+from app1.models import ServiceProvider, ServiceRequest
+
+from .request_sla import percentile
+
+VIEWS = [
+    'home',
+    'service_detail',
+    'create_service_request',
+    'update_service_request',
+    'my_bookings',
+    'provider_dashboard',
+    'admin_dashboard',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Latency percentiles, queries per request and throughput of the main views, on the data '
+        'seed_synthetic made. Runs in-process through the test client, inside a transaction that is '
+        'rolled back, or against a running server with --base-url (whose writes are kept).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view', action='append', choices=VIEWS, dest='views', help='View to benchmark; repeat for several'
+        )
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per view')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per view first')
+        parser.add_argument('--seed', type=int, default=42, help='The seed_synthetic --seed whose accounts to use')
+        parser.add_argument('--base-url', help='A running server to send the requests to, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight at once (--base-url only)')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] > 1 and not options['base_url']:
+            raise CommandError('--concurrency needs --base-url; in-process requests run one at a time.')
+        self.prefix = f'syn{options["seed"]}'
+        self.load_actors(options['iterations'] + options['warmup'])
+
+        results = {}
+        for view in options['views'] or VIEWS:
+            plan = getattr(self, f'plan_{view}')(options['iterations'] + options['warmup'])
+            if options['base_url']:
+                results[view] = self.run_remote(options['base_url'], plan, options)
+            else:
+                results[view] = self.run_in_process(plan, options)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{"view":<24} {"n":>5} {"errors":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} '
+            f'{"queries":>8} {"req/s":>8}'
+        ))
+        for view, result in results.items():
+            latencies = sorted(result['latencies'])
+            if not latencies:
+                self.stdout.write(f'{view:<24} {"(nothing to request)":>25}')
+                continue
+            queries = f'{result["queries"] / len(latencies):.1f}' if result['queries'] is not None else '-'
+            self.stdout.write(
+                f'{view:<24} {len(latencies):>5} {result["errors"]:>6} '
+                + ' '.join(f'{percentile(latencies, pct):>8.1f}' for pct in (50, 95, 99))
+                + f' {queries:>8} {len(latencies) / result["elapsed"]:>8.1f}'
+            )
+        if not options['base_url']:
+            self.stdout.write('Writes were rolled back.')
+
+    # Who makes the requests
+
+    def load_actors(self, count):
+        self.customers = list(
+            User.objects.filter(username__startswith=f'{self.prefix}-customer-').order_by('id')[:count]
+        )
+        providers = (
+            ServiceProvider.objects.filter(user__username__startswith=f'{self.prefix}-provider-', is_approved=True)
+            .select_related('user').prefetch_related('service_categories').order_by('id')[:count]
+        )
+        self.providers = [(provider, list(provider.service_categories.all())) for provider in providers]
+        self.staff = User.objects.filter(is_superuser=True, is_active=True).order_by('id').first()
+        if not self.customers or not self.providers:
+            raise CommandError(f'No synthetic accounts for seed {self.prefix[3:]}; run seed_synthetic first.')
+
+    # What each view is asked: a list of (user or None, method, path, POST data)
+
+    def plan_home(self, count):
+        return [(None, 'GET', reverse('home'), None)] * count
+
+    def plan_service_detail(self, count):
+        slugs = [category.slug for _, offered in self.providers for category in offered]
+        return [
+            (self.customers[i % len(self.customers)], 'GET', reverse('service_detail', args=[slugs[i % len(slugs)]]), None)
+            for i in range(count)
+        ]
+
+    def plan_create_service_request(self, count):
+        plan = []
+        for i in range(count):
+            # A different customer and provider pair each time, so none is a near duplicate
+            customer = self.customers[i % len(self.customers)]
+            provider, offered = self.providers[i // len(self.customers) % len(self.providers)]
+            plan.append((customer, 'POST', reverse('create_service_request', args=[provider.id, offered[0].id]), {
+                'customer_name': customer.get_full_name() or customer.username,
+                'customer_phone': '555-0100',
+                'customer_location': 'Benchmark Road',
+                'description': 'Benchmark request',
+                idempotency.KEY_FIELD: idempotency.new_key(),
+            }))
+        return plan
+
+    def plan_update_service_request(self, count):
+        pending = ServiceRequest.objects.filter(
+            provider__user__username__startswith=f'{self.prefix}-provider-', status='pending'
+        ).select_related('provider__user').order_by('id')[:count]
+        return [
+            (service_request.provider.user, 'POST', reverse('update_service_request', args=[service_request.id]),
+             {'action': 'accept', 'version': service_request.version})
+            for service_request in pending
+        ]
+
+    def plan_my_bookings(self, count):
+        return [(self.customers[i % len(self.customers)], 'GET', reverse('my_bookings'), None) for i in range(count)]
+
+    def plan_provider_dashboard(self, count):
+        return [
+            (self.providers[i % len(self.providers)][0].user, 'GET', reverse('provider_dashboard'), None)
+            for i in range(count)
+        ]
+
+    def plan_admin_dashboard(self, count):
+        if self.staff is None:
+            self.stderr.write('No active superuser; skipping admin_dashboard (see create_admin).')
+            return []
+        return [(self.staff, 'GET', reverse('admin_dashboard'), None)] * count
+
+    # Running the plan
+
+    def run_in_process(self, plan, options):
+        # Only the databases the views can be routed to; touching another alias would connect to it
+        aliases = [DEFAULT_DB_ALIAS] + ([routers.REPLICA] if settings.READ_REPLICA_ENABLED else [])
+        latencies, errors, queries = [], 0, 0
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), transaction.atomic():
+            clients = {None: Client()}
+            for user, _, _, _ in plan:
+                if user is not None and user.id not in clients:
+                    clients[user.id] = Client()
+                    clients[user.id].force_login(user)
+
+            started = None
+            for i, (user, method, path, data) in enumerate(plan):
+                client = clients[user.id if user is not None else None]
+                if i == options['warmup']:
+                    started = time.perf_counter()
+                with ExitStack() as stack:
+                    captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in aliases]
+                    request_started = time.perf_counter()
+                    response = client.post(path, data) if method == 'POST' else client.get(path)
+                    elapsed = time.perf_counter() - request_started
+                if i >= options['warmup']:
+                    latencies.append(elapsed * 1000)
+                    queries += sum(len(context) for context in captured)
+                    errors += response.status_code >= 400
+            transaction.set_rollback(True)
+        return {
+            'latencies': latencies,
+            'errors': errors,
+            'queries': queries,
+            'elapsed': time.perf_counter() - started if started else 0,
+        }
+
+    def run_remote(self, base_url, plan, options):
+        cookies = {}
+        for user, _, _, _ in plan:
+            if user is not None and user.id not in cookies:
+                cookies[user.id] = self.session_cookies(user)
+        opener = urllib.request.build_opener(_NoRedirects)
+
+        def send(step):
+            user, method, path, data = step
+            cookie = cookies.get(user.id if user is not None else None, {})
+            headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in cookie.items())}
+            body = None
+            if method == 'POST':
+                headers['X-CSRFToken'] = cookie.get(settings.CSRF_COOKIE_NAME, '')
+                headers['Referer'] = base_url
+                body = urllib.parse.urlencode(data).encode()
+            request = urllib.request.Request(base_url.rstrip('/') + path, data=body, headers=headers, method=method)
+            request_started = time.perf_counter()
+            try:
+                with opener.open(request, timeout=30) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as error:
+                status = error.code
+            except OSError:
+                status = 599
+            return (time.perf_counter() - request_started) * 1000, status
+
+        for step in plan[:options['warmup']]:
+            send(step)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            outcomes = list(pool.map(send, plan[options['warmup']:]))
+        return {
+            'latencies': [latency for latency, _ in outcomes],
+            'errors': sum(status >= 400 for _, status in outcomes),
+            # The server's queries are out of sight
+            'queries': None,
+            'elapsed': time.perf_counter() - started,
+        }
+
+    def session_cookies(self, user):
+        """A logged-in session stored where the server reads it, and a CSRF token to post with."""
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return {settings.SESSION_COOKIE_NAME: session.session_key, settings.CSRF_COOKIE_NAME: get_random_string(32)}
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    """Time the view itself, not the page it redirects to."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
@@ -1,30 +1,41 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
 
 class Command(BaseCommand):
     help = 'Creates or updates the admin user'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-missing', action='store_true',
+            help='Only create the admin user if it does not exist yet; never touch an existing one'
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to create the admin user in')
+
     def handle(self, *args, **options):
         User = get_user_model()
+        users = User._default_manager.db_manager(options['database'])
         username = 'admin'
         email = 'admin@roadmate.com'
         password = 'roadmate'
         
-        if User.objects.filter(username=username).exists():
-            admin = User.objects.get(username=username)
+        if users.filter(username=username).exists():
+            if options['if_missing']:
+                return
+            admin = users.get(username=username)
             admin.set_password(password)
             admin.email = email
             admin.is_staff = True
             admin.is_superuser = True
             admin.is_active = True
-            admin.save()
+            admin.save(using=options['database'])
             self.stdout.write(self.style.SUCCESS('Successfully updated admin user'))
         else:
-            User.objects.create_superuser(username, email, password)
+            users.create_superuser(username, email, password)
             self.stdout.write(self.style.SUCCESS('Successfully created admin user'))
             
         # Verify the user exists and has correct permissions
-        admin = User.objects.get(username=username)
+        admin = users.get(username=username)
         self.stdout.write(self.style.SUCCESS(f'Admin user details:'))
         self.stdout.write(f'Username: {admin.username}')
         self.stdout.write(f'Email: {admin.email}')
@@ -8,31 +8,37 @@ class Command(BaseCommand):
         categories = [
             {
                 'name': 'Towing Service',
+                'slug': 'towing',
                 'description': 'Vehicle towing to nearest garage or preferred location',
                 'icon': 'fa-truck-pickup'
             },
             {
                 'name': 'Fuel Delivery',
+                'slug': 'fuel-delivery',
                 'description': '24/7 fuel delivery service to get you back on the road',
                 'icon': 'fa-gas-pump'
             },
             {
                 'name': 'Battery Jump Start',
+                'slug': 'battery',
                 'description': 'Quick battery jump start service',
                 'icon': 'fa-car-battery'
             },
             {
                 'name': 'Tire Change',
+                'slug': 'tire',
                 'description': 'Flat tire change with spare tire',
                 'icon': 'fa-tire'
             },
             {
                 'name': 'Lockout Service',
+                'slug': 'lockout',
                 'description': 'Vehicle lockout assistance',
                 'icon': 'fa-key'
             },
             {
                 'name': 'On-Site Mechanic',
+                'slug': 'mechanic',
                 'description': 'Mobile mechanic for on-site repairs',
                 'icon': 'fa-wrench'
             },
@@ -42,6 +48,7 @@ class Command(BaseCommand):
             category, created = ServiceCategory.objects.get_or_create(
                 name=cat_data['name'],
                 defaults={
+                    'slug': cat_data['slug'],
                     'description': cat_data['description'],
                     'icon': cat_data['icon'],
                     'is_active': True
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app1 import expiry
+
+
+class Command(BaseCommand):
+    help = (
+        'Offer service requests pending past their category timeout to other providers, '
+        'or expire them. Runs once (for cron) or every --interval seconds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Requests handled per transaction')
+        parser.add_argument('--interval', type=float, help='Keep running, starting a pass every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            totals = expiry.run(options['batch_size'])
+            redispatched = sum(counts[expiry.REDISPATCHED] for counts in totals.values())
+            expired = sum(counts[expiry.EXPIRED] for counts in totals.values())
+            if options['verbosity'] >= 2:
+                for category, counts in totals.items():
+                    if any(counts.values()):
+                        self.stdout.write(
+                            f'  {category.name if category else "No category"}: '
+                            f'{counts[expiry.REDISPATCHED]} re-offered, '
+                            f'{counts[expiry.EXPIRED]} expired'
+                        )
+            self.stdout.write(
+                f'Re-offered {redispatched} and expired {expired} requests '
+                f'in {time.perf_counter() - started:.2f}s'
+            )
+            if not options['interval']:
+                return
+            # Like a request, each pass starts with a fresh or still-usable connection
+            close_old_connections()
+            time.sleep(options['interval'])
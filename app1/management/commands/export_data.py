@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app1 import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream service requests or bookings, with provider, category and customer, as CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--since', type=date.fromisoformat, help='First creation date to include (YYYY-MM-DD)')
+        parser.add_argument('--until', type=date.fromisoformat, help='Last creation date to include (YYYY-MM-DD)')
+        parser.add_argument('--status', action='append', help='Only rows with this status; repeat for several')
+        parser.add_argument('--output', help='File to write to (default: standard output)')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE, help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        unknown = set(options['status'] or []) - set(exports.statuses(kind))
+        if unknown:
+            raise CommandError(
+                f'Unknown status {", ".join(sorted(unknown))}; choose from {", ".join(exports.statuses(kind))}.'
+            )
+
+        rows = exports.rows(
+            kind, options['since'], options['until'], options['status'], chunk_size=options['chunk_size']
+        )
+        lines = exports.lines(rows, options['format'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
+        self.stderr.write(f'Exported {kind} to {options["output"]}')
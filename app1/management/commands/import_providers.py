@@ -0,0 +1,69 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from app1 import imports
+
+
+class Command(BaseCommand):
+    help = (
+        'Create service providers from a CSV or JSON Lines file, in bulk. Columns: username, email, '
+        'company_name, phone_number, categories (slugs or names separated by ";"), and optionally '
+        'password, address, latitude, longitude. Rows with problems are reported and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=imports.FORMATS, help='Default: from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=imports.CHUNK_SIZE, help='Rows per transaction')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes hashing passwords (default: one per CPU; 1 hashes in this process)',
+        )
+        parser.add_argument('--approve', action='store_true', help='Approve the providers and activate their accounts')
+        parser.add_argument('--dry-run', action='store_true', help='Check the file without importing anything')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+        rows = imports.read_rows(path, options['format'] or imports.format_for(path))
+        categories = imports.category_lookup()
+        seen_usernames, seen_emails = set(), set()
+
+        imported = skipped = 0
+        started = time.perf_counter()
+        pool = None if options['dry_run'] else imports.password_pool(options['workers'])
+        try:
+            for chunk in imports.chunks(rows, options['chunk_size']):
+                valid, errors = imports.validate(chunk, categories, seen_usernames, seen_emails)
+                for line_number, message in errors:
+                    self.stderr.write(f'Line {line_number}: {message}')
+                skipped += len(errors)
+                if options['dry_run']:
+                    imported += len(valid)
+                    continue
+                if not valid:
+                    continue
+                try:
+                    imported += len(imports.insert(valid, approve=options['approve'], pool=pool))
+                except IntegrityError as error:
+                    # Someone registered one of these names after the chunk was checked
+                    self.stderr.write(f'Lines {chunk[0][0]}-{chunk[-1][0]} not imported: {error}')
+                    skipped += len(valid)
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'  {imported} imported')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        if options['dry_run']:
+            self.stdout.write(f'{imported} rows would be imported, {skipped} have problems')
+            return
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} providers, skipped {skipped} rows, in {elapsed:.1f}s ({rate:,.0f} providers/s)'
+        ))
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app1 import idempotency
+
+
+class Command(BaseCommand):
+    help = 'Delete request form idempotency keys older than SUBMISSION_KEY_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=settings.SUBMISSION_KEY_TTL,
+            help='Age in seconds past which keys are deleted (default: SUBMISSION_KEY_TTL)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Keys deleted per statement')
+
+    def handle(self, *args, **options):
+        deleted = idempotency.purge(options['older_than'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired submission keys'))
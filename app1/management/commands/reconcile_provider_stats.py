@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app1 import counters
+from app1.models import ProviderStats, ServiceProvider
+
+
+class Command(BaseCommand):
+    help = 'Recount ProviderStats from the source tables and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Providers recounted per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = drifted = 0
+
+        provider_ids = ServiceProvider.objects.order_by('id').values_list('id', flat=True)
+        last_id = 0
+        while True:
+            batch = list(provider_ids.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+
+            with transaction.atomic():
+                expected = counters.compute(batch)
+                stored = {
+                    row['provider_id']: row
+                    for row in ProviderStats.objects.filter(provider_id__in=batch).values(
+                        'provider_id', *counters.COUNTER_FIELDS
+                    )
+                }
+                stale = []
+                for provider_id, values in expected.items():
+                    current = stored.get(provider_id)
+                    if current is None or any(current[field] != values[field] for field in counters.COUNTER_FIELDS):
+                        stale.append(provider_id)
+                        if options['verbosity'] >= 2:
+                            self.stdout.write(f'Provider {provider_id}: stored {current}, expected {values}')
+
+                if stale and not options['dry_run']:
+                    counters.store({provider_id: expected[provider_id] for provider_id in stale})
+
+            checked += len(batch)
+            drifted += len(stale)
+
+        action = 'found' if options['dry_run'] else 'repaired'
+        style = self.style.WARNING if drifted else self.style.SUCCESS
+        self.stdout.write(style(f'Checked {checked} providers, {action} drift on {drifted}'))
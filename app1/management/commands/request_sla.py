@@ -0,0 +1,139 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app1.models import RequestEvent, RequestOffer, ServiceCategory, ServiceProvider
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}h{minutes:02d}m' if hours else f'{minutes}m{seconds:02d}s'
+
+
+class Command(BaseCommand):
+    help = (
+        'Time-to-accept and time-to-complete percentiles per provider or category, from the status event log. '
+        'Per provider, time to accept counts from when the accepting provider was offered the request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group-by', choices=['provider', 'category'], default='provider')
+        parser.add_argument('--since', type=int, default=30, help='Only requests created in the last N days')
+        parser.add_argument(
+            '--percentiles', default='50,90,99', help='Comma separated percentiles to report (default: 50,90,99)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Events fetched per database round trip')
+
+    def handle(self, *args, **options):
+        try:
+            percentiles = [float(value) for value in options['percentiles'].split(',')]
+        except ValueError:
+            raise CommandError('--percentiles must be a comma separated list of numbers.')
+        if not percentiles or any(not 0 < pct <= 100 for pct in percentiles):
+            raise CommandError('Percentiles must be between 0 (exclusive) and 100.')
+
+        to_accept, to_complete = self.collect(
+            timezone.now() - timedelta(days=options['since']),
+            'provider_id' if options['group_by'] == 'provider' else 'category_id',
+            options['chunk_size'],
+        )
+        if not to_accept and not to_complete:
+            self.stdout.write('No requests in the event log for that period.')
+            return
+
+        model = ServiceProvider if options['group_by'] == 'provider' else ServiceCategory
+        group_ids = sorted(set(to_accept) | set(to_complete), key=lambda group_id: (group_id is None, group_id))
+        names = model.objects.in_bulk([group_id for group_id in group_ids if group_id is not None])
+
+        labels = [f'p{pct:g}' for pct in percentiles]
+        self.stdout.write(
+            f'{options["group_by"]:<30} {"metric":<12} {"count":>7} ' + ' '.join(f'{label:>9}' for label in labels)
+        )
+        for group_id in group_ids:
+            group = names.get(group_id)
+            name = str(group) if group is not None else ('(unassigned)' if group_id is None else f'#{group_id}')
+            for metric, durations in (('accept', to_accept.get(group_id)), ('complete', to_complete.get(group_id))):
+                if not durations:
+                    continue
+                durations.sort()
+                values = ' '.join(f'{format_duration(percentile(durations, pct)):>9}' for pct in percentiles)
+                self.stdout.write(f'{name[:30]:<30} {metric:<12} {len(durations):>7} {values}')
+
+    def collect(self, since, group_field, chunk_size):
+        """Walk the log one request at a time; returns ``{group: [seconds]}`` twice.
+
+        Events arrive ordered by request, so only the current request's
+        timestamps, and those of up to ``chunk_size`` finished requests, are
+        held in memory. Only requests created since ``since`` are read, since
+        the others' start is not in range.
+
+        Per provider, time to accept starts when the request was offered to
+        the provider who accepted it, so a redispatched request's wait with
+        providers who ignored it is not charged to the one who answered. Per
+        category it is the customer's whole wait.
+        """
+        to_accept = defaultdict(list)
+        to_complete = defaultdict(list)
+        # Requests created in range, found through event_created_idx; each one's
+        # events are then read in order through event_request_created_idx
+        created_since = RequestEvent.objects.filter(from_status='', created_at__gte=since).values('service_request_id')
+        events = (
+            RequestEvent.objects.filter(service_request_id__in=created_since, created_at__gte=since)
+            .order_by('service_request_id', 'created_at', 'id')
+            .values_list('service_request_id', 'to_status', 'created_at', group_field)
+        )
+        finished = []
+
+        def flush():
+            offered_at = {}
+            if group_field == 'provider_id':
+                # Only dispatched and redispatched requests have offers
+                offered_at = dict(
+                    RequestOffer.objects.filter(
+                        service_request_id__in=[request[0] for request in finished if request[3] is not None],
+                        status='accepted',
+                    ).values_list('service_request_id', 'created_at')
+                )
+            for request_id, group, created, accepted, completed in finished:
+                if accepted is not None:
+                    start = max(offered_at.get(request_id, created), created)
+                    to_accept[group].append((accepted - start).total_seconds())
+                if completed is not None:
+                    to_complete[group].append((completed - created).total_seconds())
+            finished.clear()
+
+        current_id = created = accepted = completed = group = None
+
+        def finish():
+            if created is None:
+                return
+            finished.append((current_id, group, created, accepted, completed))
+            if len(finished) >= chunk_size:
+                flush()
+
+        for request_id, to_status, created_at, group_id in events.iterator(chunk_size=chunk_size):
+            if request_id != current_id:
+                finish()
+                current_id, created, accepted, completed, group = request_id, None, None, None, None
+            if group_id is not None:
+                # The provider is only known once someone accepts the request
+                group = group_id
+            if to_status == 'pending' and created is None:
+                created = created_at
+            elif to_status == 'accepted' and accepted is None:
+                accepted = created_at
+            elif to_status == 'completed' and completed is None:
+                completed = created_at
+        finish()
+        flush()
+        return to_accept, to_complete
@@ -0,0 +1,103 @@
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from app1.models import DailyStats, ServiceProvider, ServiceRequest
+from app1.stats import DASHBOARD_FIELDS, advance_dashboard_stats, live_dashboard_stats
+
+
+class Command(BaseCommand):
+    help = 'Update the DailyStats rollup used by the admin dashboard (run it from cron every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Re-roll this many past days instead of continuing from the last rolled-up day'
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Recount today's dashboard snapshot instead of carrying the last one forward"
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+
+        if options['days'] is not None:
+            start = today - timedelta(days=options['days'])
+        else:
+            # The last rolled-up day may have been partial, so redo it
+            latest = DailyStats.objects.order_by('-date').values_list('date', flat=True).first()
+            start = latest or self.first_activity_date() or today
+
+        since = timezone.make_aware(datetime.combine(start, time.min))
+        User = get_user_model()
+        per_day = {}
+        for field, queryset, column in [
+            ('new_users', User.objects.all(), 'date_joined'),
+            ('new_providers', ServiceProvider.objects.all(), 'created_at'),
+            ('new_requests', ServiceRequest.objects.all(), 'created_at'),
+        ]:
+            # One grouped query per table, however many days are being rolled up
+            rows = (
+                queryset.filter(**{f'{column}__gte': since})
+                .annotate(day=TruncDate(column))
+                .order_by()
+                .values('day')
+                .annotate(count=Count('id'))
+            )
+            for row in rows:
+                per_day.setdefault(row['day'], {})[field] = row['count']
+
+        days = []
+        day = start
+        while day <= today:
+            counts = per_day.get(day, {})
+            days.append(DailyStats(
+                date=day,
+                new_users=counts.get('new_users', 0),
+                new_providers=counts.get('new_providers', 0),
+                new_requests=counts.get('new_requests', 0),
+            ))
+            day += timedelta(days=1)
+
+        # Today's row also carries a snapshot of the dashboard counters. Later
+        # runs the same day carry it forward from the changes since; the first
+        # run of a day recounts, so rows deleted meanwhile drift for a day at most
+        now = timezone.now()
+        previous = DailyStats.objects.filter(date=today, snapshot_at__isnull=False).first()
+        if previous is None or options['full']:
+            snapshot = live_dashboard_stats()
+        else:
+            snapshot = advance_dashboard_stats(
+                {field: getattr(previous, field) for field in DASHBOARD_FIELDS}, previous.snapshot_at, now
+            )
+        for field in DASHBOARD_FIELDS:
+            setattr(days[-1], field, snapshot[field])
+        days[-1].snapshot_at = now
+
+        with transaction.atomic():
+            DailyStats.objects.bulk_create(
+                days[:-1],
+                update_conflicts=True,
+                unique_fields=['date'],
+                update_fields=['new_users', 'new_providers', 'new_requests'],
+            )
+            DailyStats.objects.bulk_create(
+                days[-1:],
+                update_conflicts=True,
+                unique_fields=['date'],
+                update_fields=['new_users', 'new_providers', 'new_requests', 'snapshot_at'] + DASHBOARD_FIELDS,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {len(days)} day(s) from {start} to {today}'
+        ))
+
+    def first_activity_date(self):
+        first = ServiceRequest.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        return timezone.localdate(first) if first else None
@@ -0,0 +1,284 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app1 import counters, page_cache
+from app1.models import (
+    Booking, BookingEvent, ProviderStats, RequestEvent, Review, Service, ServiceCategory, ServiceProvider,
+    ServiceRequest,
+)
+
+# Most requests and bookings in a mature table are finished
+REQUEST_STATUSES = ['pending', 'accepted', 'in_progress', 'completed', 'cancelled', 'expired']
+REQUEST_WEIGHTS = [1, 1, 1, 12, 2, 1]
+# Status changes it takes to reach each status, for ServiceRequest.version
+REQUEST_VERSIONS = {'pending': 0, 'accepted': 1, 'in_progress': 2, 'completed': 3, 'cancelled': 1, 'expired': 1}
+BOOKING_STATUSES = ['pending', 'confirmed', 'in_progress', 'completed', 'cancelled']
+BOOKING_WEIGHTS = [1, 2, 1, 10, 2]
+# Happy customers leave more reviews
+RATING_WEIGHTS = [1, 1, 2, 5, 8]
+
+# Provider locations are scattered around a handful of cities
+CITIES = [(40.71, -74.01), (34.05, -118.24), (41.88, -87.63), (29.76, -95.37), (47.61, -122.33)]
+STREETS = ['Main Street', 'Highway 1', 'Oak Avenue', 'Route 66', 'Harbor Road', 'Exit 12', 'Mill Lane']
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with a reproducible synthetic data set (customers, providers, service requests, '
+        'bookings and reviews) for benchmarks, using bulk inserts. Every account gets --password.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', type=int, default=500)
+        parser.add_argument('--customers', type=int, default=2_000)
+        parser.add_argument('--requests', type=int, default=20_000, help='Service requests')
+        parser.add_argument('--bookings', type=int, default=5_000)
+        parser.add_argument('--review-rate', type=float, default=0.4, help='Share of completed bookings with a review')
+        parser.add_argument('--approved-rate', type=float, default=0.9, help='Share of providers already approved')
+        parser.add_argument('--days', type=int, default=90, help='Spread creation times over this many days')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; usernames include it')
+        parser.add_argument('--chunk-size', type=int, default=2_000, help='Rows per INSERT transaction')
+        parser.add_argument('--password', default='synthetic', help='Password of every synthetic account')
+
+    def handle(self, *args, **options):
+        self.prefix = f'syn{options["seed"]}'
+        if User.objects.filter(username__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f'Data for seed {options["seed"]} already exists; pick another --seed.')
+        if options['providers'] < 1 or options['customers'] < 1:
+            raise CommandError('Seed at least one provider and one customer.')
+
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        call_command('create_service_categories', stdout=StringIO())
+        self.categories = list(ServiceCategory.objects.filter(is_active=True).order_by('id'))
+        password = make_password(options['password'])
+
+        customers = self.create_customers(options['customers'], password)
+        providers = self.create_providers(options['providers'], options['approved_rate'], password)
+        self.step('customers and providers', len(customers) + len(providers), started)
+
+        step_started = time.perf_counter()
+        requests = self.create_requests(options['requests'], customers, providers, options['days'])
+        self.step('service requests', requests, step_started)
+
+        step_started = time.perf_counter()
+        bookings, reviews = self.create_bookings(
+            options['bookings'], customers, providers, options['days'], options['review_rate']
+        )
+        self.step(f'bookings ({reviews:,} reviewed)', bookings, step_started)
+
+        # Bulk inserts send no signals, so the counters and cached pages are redone here
+        step_started = time.perf_counter()
+        provider_ids = [provider.id for provider in providers]
+        for start in range(0, len(provider_ids), 500):
+            counters.rebuild(provider_ids[start:start + 500])
+        page_cache.invalidate([category.id for category in self.categories])
+        self.step('provider counters', len(provider_ids), step_started)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded "{self.prefix}" in {time.perf_counter() - started:.1f}s. Log in as '
+            f'{self.prefix}-customer-0 or {self.prefix}-provider-0 with password "{options["password"]}". '
+            f'Run rollup_daily_stats to refresh the admin dashboard totals.'
+        ))
+
+    def step(self, label, count, started):
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(f'  {count:,} {label} in {elapsed:.1f}s ({rate:,.0f} rows/s)')
+
+    def created_at(self, days):
+        return self.now - timedelta(seconds=self.rng.randint(60, days * 24 * 3600))
+
+    def chunks(self, total):
+        for start in range(0, total, self.chunk_size):
+            yield range(start, min(start + self.chunk_size, total))
+
+    def create_customers(self, count, password):
+        users = []
+        for chunk in self.chunks(count):
+            with transaction.atomic():
+                users += User.objects.bulk_create(
+                    User(
+                        username=f'{self.prefix}-customer-{i}',
+                        email=f'{self.prefix}-customer-{i}@example.com',
+                        first_name='Customer',
+                        last_name=str(i),
+                        password=password,
+                    )
+                    for i in chunk
+                )
+        return users
+
+    def create_providers(self, count, approved_rate, password):
+        Through = ServiceProvider.service_categories.through
+        providers = []
+        for chunk in self.chunks(count):
+            # The first provider is always approved, so there is one to log in as
+            approved = [i == 0 or self.rng.random() < approved_rate for i in chunk]
+            with transaction.atomic():
+                # Inactive until approved, as registration leaves them
+                users = User.objects.bulk_create(
+                    User(
+                        username=f'{self.prefix}-provider-{i}',
+                        email=f'{self.prefix}-provider-{i}@example.com',
+                        password=password,
+                        is_active=is_approved,
+                    )
+                    for i, is_approved in zip(chunk, approved)
+                )
+                batch = []
+                for i, user, is_approved in zip(chunk, users, approved):
+                    latitude, longitude = self.rng.choice(CITIES)
+                    provider = ServiceProvider(
+                        user=user,
+                        company_name=f'{self.rng.choice(["Rapid", "Ace", "Metro", "Highway", "24/7"])} Roadside {i}',
+                        phone_number=f'555-{i % 10_000:04d}',
+                        address=f'{self.rng.randint(1, 9999)} {self.rng.choice(STREETS)}',
+                        latitude=round(latitude + self.rng.uniform(-0.3, 0.3), 6),
+                        longitude=round(longitude + self.rng.uniform(-0.3, 0.3), 6),
+                        is_approved=is_approved,
+                    )
+                    provider.geohash = provider.compute_geohash()
+                    batch.append(provider)
+                batch = ServiceProvider.objects.bulk_create(batch)
+                provider_categories = {
+                    provider.id: self.rng.sample(self.categories, self.rng.randint(1, min(3, len(self.categories))))
+                    for provider in batch
+                }
+                Through.objects.bulk_create(
+                    Through(serviceprovider_id=provider_id, servicecategory_id=category.id)
+                    for provider_id, offered in provider_categories.items()
+                    for category in offered
+                )
+                ProviderStats.objects.bulk_create(ProviderStats(provider_id=provider.id) for provider in batch)
+                Service.objects.bulk_create(
+                    Service(
+                        provider_id=provider_id,
+                        category=category,
+                        title=category.name,
+                        description=f'{category.name} around the clock',
+                        price=Decimal(self.rng.randrange(40, 250)),
+                        duration=self.rng.choice([30, 45, 60, 90]),
+                    )
+                    for provider_id, offered in provider_categories.items()
+                    for category in offered
+                )
+                for provider in batch:
+                    provider.offered = provider_categories[provider.id]
+                providers += batch
+        return providers
+
+    def create_requests(self, count, customers, providers, days):
+        approved = [provider for provider in providers if provider.is_approved]
+        for chunk in self.chunks(count):
+            with transaction.atomic():
+                rows = []
+                for _ in chunk:
+                    provider = self.rng.choice(approved)
+                    customer = self.rng.choice(customers)
+                    status = self.rng.choices(REQUEST_STATUSES, REQUEST_WEIGHTS)[0]
+                    # Nothing stays pending for long
+                    created = self.created_at(1 if status == 'pending' else days)
+                    rows.append(ServiceRequest(
+                        provider=provider,
+                        customer=customer,
+                        service_category=self.rng.choice(provider.offered),
+                        customer_name=customer.get_full_name(),
+                        customer_phone=f'555-{self.rng.randint(0, 9999):04d}',
+                        customer_location=f'{self.rng.choice(STREETS)}, mile {self.rng.randint(1, 300)}',
+                        description='Synthetic request',
+                        status=status,
+                        version=REQUEST_VERSIONS[status],
+                    ))
+                    rows[-1].seed_times = (created, created + timedelta(minutes=self.rng.randint(5, 240)))
+                rows = ServiceRequest.objects.bulk_create(rows)
+                self.backdate(ServiceRequest, rows)
+
+                events = []
+                for row in rows:
+                    created, updated = row.seed_times
+                    events.append(RequestEvent(
+                        service_request_id=row.id, provider_id=row.provider_id, category_id=row.service_category_id,
+                        to_status='pending', created_at=created,
+                    ))
+                    if row.status != 'pending':
+                        events.append(RequestEvent(
+                            service_request_id=row.id, provider_id=row.provider_id,
+                            category_id=row.service_category_id, from_status='pending', to_status=row.status,
+                            created_at=updated,
+                        ))
+                RequestEvent.objects.bulk_create(events, batch_size=500)
+        return count
+
+    def create_bookings(self, count, customers, providers, days, review_rate):
+        services = list(
+            Service.objects.filter(provider__in=[provider for provider in providers if provider.is_approved])
+            .values_list('id', 'provider_id')
+        )
+        if not services:
+            return 0, 0
+        reviews = 0
+        for chunk in self.chunks(count):
+            with transaction.atomic():
+                rows = []
+                for _ in chunk:
+                    service_id, provider_id = self.rng.choice(services)
+                    created = self.created_at(days)
+                    rows.append(Booking(
+                        service_id=service_id,
+                        customer=self.rng.choice(customers),
+                        booking_date=created + timedelta(days=self.rng.randint(0, 14)),
+                        status=self.rng.choices(BOOKING_STATUSES, BOOKING_WEIGHTS)[0],
+                    ))
+                    rows[-1].seed_times = (created, created + timedelta(hours=self.rng.randint(1, 72)))
+                    rows[-1].provider_id = provider_id
+                rows = Booking.objects.bulk_create(rows)
+                self.backdate(Booking, rows)
+                BookingEvent.objects.bulk_create(
+                    [
+                        BookingEvent(
+                            booking_id=row.id, provider_id=row.provider_id, to_status=row.status,
+                            created_at=row.seed_times[0],
+                        )
+                        for row in rows
+                    ],
+                    batch_size=500,
+                )
+                reviewed = [row for row in rows if row.status == 'completed' and self.rng.random() < review_rate]
+                Review.objects.bulk_create(
+                    [
+                        Review(
+                            booking_id=row.id,
+                            rating=self.rng.choices(range(1, 6), RATING_WEIGHTS)[0],
+                            comment=self.rng.choice(['Fast and friendly.', 'Arrived late.', 'Great service!', 'OK.']),
+                        )
+                        for row in reviewed
+                    ],
+                    batch_size=500,
+                )
+                reviews += len(reviewed)
+        return count, reviews
+
+    def backdate(self, model, rows):
+        """Give bulk-created rows their synthetic times, which ``auto_now_add`` overrode on insert."""
+        # One prepared UPDATE run per row; bulk_update's CASE expressions are far slower here
+        table = connection.ops.quote_name(model._meta.db_table)
+        adapt = connection.ops.adapt_datetimefield_value
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {table} SET created_at = %s, updated_at = %s WHERE id = %s',
+                [(adapt(row.seed_times[0]), adapt(row.seed_times[1]), row.id) for row in rows],
+            )
@@ -0,0 +1,43 @@
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app1 import notifications
+
+
+class Command(BaseCommand):
+    help = (
+        'Send the email, SMS and webhook notifications waiting in the outbox. '
+        'Runs until the outbox is empty (for cron) or, with --interval, keeps polling it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Notifications claimed per round')
+        parser.add_argument(
+            '--workers', type=int, default=settings.NOTIFICATION_WORKERS,
+            help='Threads sending at once (default: NOTIFICATION_WORKERS)',
+        )
+        parser.add_argument('--interval', type=float, help='Keep running, checking the outbox every INTERVAL seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            totals = Counter()
+            while True:
+                results = notifications.send_due(options['batch_size'], options['workers'])
+                if not results:
+                    break
+                totals.update(results)
+            if totals or not options['interval']:
+                self.stdout.write(
+                    f'Sent {totals[notifications.SENT]}, will retry {totals[notifications.RETRY]}, '
+                    f'gave up on {totals[notifications.FAILED]} notifications '
+                    f'in {time.perf_counter() - started:.2f}s'
+                )
+            if not options['interval']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from app1.routers import REPLICA
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the read replica file (see app1.routers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="File to copy into instead of the replica's")
+        parser.add_argument(
+            '--interval', type=float, help='Keep copying every INTERVAL seconds until interrupted'
+        )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replica copies SQLite files; use the database\'s own replication instead.')
+        source = str(primary.settings_dict['NAME'])
+        target = str(options['output'] or connections[REPLICA].settings_dict['NAME'])
+        if os.path.exists(target) and os.path.samefile(source, target):
+            raise CommandError(f'The replica is the primary database itself ({source}).')
+
+        while True:
+            started = time.perf_counter()
+            pages = self.copy(source, target)
+            self.stdout.write(f'Copied {pages:,} pages to {target} in {time.perf_counter() - started:.2f}s')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, source, target):
+        """Snapshot ``source`` into ``target`` with SQLite's online backup.
+
+        Readers of ``target`` see either the old copy or the new one. With
+        the production profile (WAL), writers of ``source`` are not blocked
+        while it runs.
+        """
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(target, timeout=30)
+        try:
+            src.backup(dst)
+            return dst.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            dst.close()
+            src.close()
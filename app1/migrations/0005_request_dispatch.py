@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0004_provider_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicerequest',
+            name='is_dispatched',
+            field=models.BooleanField(default=False, help_text='Offered to nearby providers instead of one picked by the customer'),
+        ),
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='provider',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='service_requests', to='app1.serviceprovider'),
+        ),
+        migrations.CreateModel(
+            name='RequestOffer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(help_text='Position in the dispatch ranking, 0 is the best candidate')),
+                ('distance_km', models.FloatField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('offered', 'Offered'), ('accepted', 'Accepted'), ('declined', 'Declined'), ('withdrawn', 'Withdrawn')], default='offered', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='request_offers', to='app1.serviceprovider')),
+                ('service_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='offers', to='app1.servicerequest')),
+            ],
+            options={
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['provider', 'status'], name='offer_provider_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('service_request', 'provider'), name='unique_offer_per_provider')],
+            },
+        ),
+    ]
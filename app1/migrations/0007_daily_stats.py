@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('new_users', models.PositiveIntegerField(default=0)),
+                ('new_providers', models.PositiveIntegerField(default=0)),
+                ('new_requests', models.PositiveIntegerField(default=0)),
+                ('total_users', models.PositiveIntegerField(blank=True, null=True)),
+                ('total_providers', models.PositiveIntegerField(blank=True, null=True)),
+                ('active_providers', models.PositiveIntegerField(blank=True, null=True)),
+                ('pending_providers', models.PositiveIntegerField(blank=True, null=True)),
+                ('total_requests', models.PositiveIntegerField(blank=True, null=True)),
+                ('pending_requests', models.PositiveIntegerField(blank=True, null=True)),
+                ('active_requests', models.PositiveIntegerField(blank=True, null=True)),
+                ('completed_requests', models.PositiveIntegerField(blank=True, null=True)),
+                ('snapshot_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Stats',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0007_daily_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='servicerequest',
+            name='request_provider_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='servicerequest',
+            name='request_provider_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='servicerequest',
+            name='request_customer_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='servicerequest',
+            name='request_customer_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['provider', 'status', '-created_at', '-id'], name='request_provider_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['provider', '-created_at', '-id'], name='request_provider_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['customer', 'status', '-created_at', '-id'], name='request_customer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='request_customer_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0008_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderStats',
+            fields=[
+                ('provider', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='app1.serviceprovider')),
+                ('pending_requests', models.IntegerField(default=0)),
+                ('active_requests', models.IntegerField(default=0)),
+                ('active_bookings', models.IntegerField(default=0)),
+                ('total_services', models.IntegerField(default=0)),
+                ('service_categories', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Provider Stats',
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:20
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+# The slugs service_detail used to hardcode, so existing links keep working
+LEGACY_SLUGS = {
+    'Fuel Delivery': 'fuel-delivery',
+    'Towing Service': 'towing',
+    'On-Site Mechanic': 'mechanic',
+    'Battery Jump Start': 'battery',
+    'Tire Change': 'tire',
+    'Lockout Service': 'lockout',
+}
+
+
+def populate_slugs(apps, schema_editor):
+    ServiceCategory = apps.get_model('app1', 'ServiceCategory')
+    taken = set()
+    for category in ServiceCategory.objects.order_by('id'):
+        base = LEGACY_SLUGS.get(category.name) or slugify(category.name) or 'category'
+        slug, suffix = base, 2
+        while slug in taken:
+            slug, suffix = f'{base}-{suffix}', suffix + 1
+        taken.add(slug)
+        category.slug = slug
+        category.save(update_fields=['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0009_provider_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicecategory',
+            name='slug',
+            field=models.SlugField(max_length=100, null=True),
+        ),
+        migrations.RunPython(populate_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='servicecategory',
+            name='slug',
+            field=models.SlugField(help_text='Used in the page address: /services/<slug>/', max_length=100, unique=True),
+        ),
+    ]
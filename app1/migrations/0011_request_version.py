@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0010_category_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicerequest',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Bumped by every status change'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:35
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0014_booking_export_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('requests', 'Service request'), ('bookings', 'Booking')], max_length=20)),
+                ('original_id', models.BigIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(help_text='When the original row was created')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'created_at'], name='archive_kind_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'original_id'), name='unique_archived_record')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0015_archived_records'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicecategory',
+            name='pending_timeout',
+            field=models.PositiveIntegerField(blank=True, help_text='Minutes a request may wait for a provider before it is offered to others or expires. Empty uses the site default.', null=True),
+        ),
+        migrations.AddField(
+            model_name='servicerequest',
+            name='redispatch_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Times the request went unanswered and was offered to other providers'),
+        ),
+        migrations.AlterField(
+            model_name='servicerequest',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['status', 'service_category', 'updated_at'], name='request_stale_idx'),
+        ),
+    ]
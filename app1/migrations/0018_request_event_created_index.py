@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app1', '0017_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='requestevent',
+            index=models.Index(fields=['created_at'], name='event_created_idx'),
+        ),
+    ]
@@ -1,11 +1,20 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.text import slugify
+
+from . import geo
+
+# Providers per UPDATE when approving in bulk, below SQLite's parameter limit
+APPROVE_BATCH_SIZE = 500
 
 class ServiceCategory(models.Model):
     name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100, unique=True, help_text="Used in the page address: /services/<slug>/")
     description = models.TextField(blank=True)
     icon = models.CharField(max_length=50, default='fa-tools')
+    pending_timeout = models.PositiveIntegerField(null=True, blank=True, help_text="Minutes a request may wait for a provider before it is offered to others or expires. Empty uses the site default.")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -13,23 +22,113 @@ class ServiceCategory(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = slugify(self.name)
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = 'Service Categories'
 
+class ServiceProviderQuerySet(models.QuerySet):
+    def available(self, category=None):
+        """Approved, active providers, optionally limited to one category."""
+        queryset = self.filter(is_approved=True, is_active=True)
+        if category is not None:
+            queryset = queryset.filter(service_categories=category)
+        return queryset
+
+    def nearest(self, latitude, longitude, k=10, max_distance_km=None):
+        """The ``k`` providers nearest to a point, closest first."""
+        return geo.nearest(self, latitude, longitude, k=k, max_distance_km=max_distance_km)
+
+    def approve(self):
+        """Approve these providers and activate their accounts. Returns the providers approved.
+        
+        Set-based ``UPDATE``s of ``ServiceProvider`` and ``User``, two per
+        ``APPROVE_BATCH_SIZE`` providers, in one transaction. Providers
+        already approved are left alone. ``update()``
+        sends no signals, so the cached listings of their categories are
+        dropped and their notifications queued here.
+        """
+        from . import notifications, page_cache
+        
+        with transaction.atomic():
+            providers = list(self.filter(is_approved=False).select_related('user'))
+            for start in range(0, len(providers), APPROVE_BATCH_SIZE):
+                batch = providers[start:start + APPROVE_BATCH_SIZE]
+                self.model.objects.filter(id__in=[provider.id for provider in batch]).update(
+                    is_approved=True, updated_at=timezone.now()
+                )
+                User.objects.filter(id__in=[provider.user_id for provider in batch]).update(is_active=True)
+                page_cache.invalidate_on_commit(
+                    self.model.service_categories.through.objects.filter(
+                        serviceprovider_id__in=[provider.id for provider in batch]
+                    ).values_list('servicecategory_id', flat=True).distinct()
+                )
+            for provider in providers:
+                provider.is_approved = provider.user.is_active = True
+            notifications.enqueue(
+                [notification for provider in providers for notification in notifications.provider_approved(provider)]
+            )
+        return providers
+
 class ServiceProvider(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='service_provider')
     company_name = models.CharField(max_length=200)
     phone_number = models.CharField(max_length=20)
     address = models.TextField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     service_categories = models.ManyToManyField(ServiceCategory, related_name='providers', blank=True)
     is_approved = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ServiceProviderQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.company_name} ({self.user.email})"
 
+    def save(self, *args, **kwargs):
+        # Keep the spatial index column in step with the coordinates
+        self.geohash = self.compute_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+    def compute_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            return ''
+        return geo.encode(self.latitude, self.longitude)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_approved', 'is_active'], name='provider_approval_idx'),
+        ]
+
+class ProviderStats(models.Model):
+    """Dashboard counters for one provider, updated on every write that affects them.
+
+    See ``app1.counters``. ``reconcile_provider_stats`` repairs any drift.
+    """
+    provider = models.OneToOneField(ServiceProvider, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    pending_requests = models.IntegerField(default=0)
+    active_requests = models.IntegerField(default=0)
+    active_bookings = models.IntegerField(default=0)
+    total_services = models.IntegerField(default=0)
+    service_categories = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.provider.company_name}"
+
+    class Meta:
+        verbose_name_plural = 'Provider Stats'
+
 class Service(models.Model):
     provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='services')
     category = models.ForeignKey(ServiceCategory, on_delete=models.SET_NULL, null=True, related_name='services')
@@ -44,6 +143,9 @@ class Service(models.Model):
     def __str__(self):
         return f"{self.title} - {self.provider.company_name}"
 
+class InvalidTransition(ValueError):
+    """A status change the ServiceRequest transition table does not allow."""
+
 class ServiceRequest(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -51,24 +153,164 @@ class ServiceRequest(models.Model):
         ('in_progress', 'In Progress'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
+        ('expired', 'Expired'),
     ]
     
-    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='service_requests')
+    # Every status a request may move to from each status. Change status
+    # through transition_to() rather than assigning it and calling save().
+    TRANSITIONS = {
+        'pending': ('accepted', 'cancelled', 'expired'),
+        'accepted': ('in_progress', 'completed', 'cancelled'),
+        'in_progress': ('completed', 'cancelled'),
+        'completed': (),
+        'cancelled': (),
+        'expired': (),
+    }
+    
+    # Empty while a dispatched request is still looking for a provider
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='service_requests', null=True, blank=True)
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='service_requests')
     service_category = models.ForeignKey(ServiceCategory, on_delete=models.SET_NULL, null=True)
     customer_name = models.CharField(max_length=200)
     customer_phone = models.CharField(max_length=20)
     customer_location = models.TextField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
     description = models.TextField(blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    is_dispatched = models.BooleanField(default=False, help_text="Offered to nearby providers instead of one picked by the customer")
+    version = models.PositiveIntegerField(default=0, editable=False, help_text="Bumped by every status change")
+    redispatch_count = models.PositiveSmallIntegerField(default=0, editable=False, help_text="Times the request went unanswered and was offered to other providers")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.service_category.name if self.service_category else 'Service'} - {self.customer_name}"
     
+    def can_transition_to(self, status):
+        return status in self.TRANSITIONS.get(self.status, ())
+    
+    def transition_to(self, status):
+        """Move to ``status`` unless the request changed since it was loaded.
+        
+        This is one conditional UPDATE on (id, status, version), so there are
+        no row locks, and of two racing transitions exactly one wins. Returns
+        ``False`` when this instance was stale; reload it to see the current
+        status.
+        """
+        if not self.can_transition_to(status):
+            raise InvalidTransition(f'Cannot move a {self.status} request to {status}')
+        now = timezone.now()
+        updated = ServiceRequest.objects.filter(
+            pk=self.pk, status=self.status, version=self.version
+        ).update(status=status, version=models.F('version') + 1, updated_at=now)
+        if updated:
+            self.status, self.version, self.updated_at = status, self.version + 1, now
+        return bool(updated)
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Provider dashboard: pending count and request history (keyset-paginated)
+            models.Index(fields=['provider', 'status', '-created_at', '-id'], name='request_provider_status_idx'),
+            models.Index(fields=['provider', '-created_at', '-id'], name='request_provider_recent_idx'),
+            # My bookings: per-status tabs and full history (keyset-paginated)
+            models.Index(fields=['customer', 'status', '-created_at', '-id'], name='request_customer_status_idx'),
+            models.Index(fields=['customer', '-created_at', '-id'], name='request_customer_recent_idx'),
+            # Admin dashboard: status counts and most recent requests
+            models.Index(fields=['status', 'created_at'], name='request_status_created_idx'),
+            models.Index(fields=['-created_at'], name='request_recent_idx'),
+            # Expiry: pending requests of one category, oldest first
+            models.Index(fields=['status', 'service_category', 'updated_at'], name='request_stale_idx'),
+        ]
+
+class RequestOffer(models.Model):
+    """A dispatched service request offered to one candidate provider."""
+    STATUS_CHOICES = [
+        ('offered', 'Offered'),
+        ('accepted', 'Accepted'),
+        ('declined', 'Declined'),
+        ('withdrawn', 'Withdrawn'),
+    ]
+
+    service_request = models.ForeignKey(ServiceRequest, on_delete=models.CASCADE, related_name='offers')
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='request_offers')
+    rank = models.PositiveSmallIntegerField(help_text="Position in the dispatch ranking, 0 is the best candidate")
+    distance_km = models.FloatField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='offered')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.service_request} -> {self.provider.company_name} ({self.status})"
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['service_request', 'provider'], name='unique_offer_per_provider'),
+        ]
+        indexes = [
+            models.Index(fields=['provider', 'status'], name='offer_provider_status_idx'),
+        ]
+
+class SubmissionKey(models.Model):
+    """The idempotency key a request form was submitted with, and the request it created.
+    
+    See ``app1.idempotency``. ``purge_submission_keys`` deletes expired keys.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submission_keys')
+    key = models.CharField(max_length=64)
+    service_request = models.ForeignKey(ServiceRequest, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.key} -> request {self.service_request_id}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_submission_key_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='submission_key_created_idx'),
+        ]
+
+class RequestEvent(models.Model):
+    """One status change of a service request. Rows are only ever inserted.
+    
+    Written in the same transaction as the change itself (see ``workflow``).
+    Provider and category are copied in, so response-time reports read this
+    table alone. There is no database foreign key, so the history outlives
+    archived or deleted requests.
+    """
+    service_request = models.ForeignKey(
+        ServiceRequest, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events'
+    )
+    provider_id = models.BigIntegerField(null=True, blank=True)
+    category_id = models.BigIntegerField(null=True, blank=True)
+    from_status = models.CharField(max_length=20, blank=True, help_text="Empty for the event that created the request")
+    to_status = models.CharField(max_length=20)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    @classmethod
+    def for_change(cls, service_request, from_status, to_status):
+        return cls(
+            service_request_id=service_request.id,
+            provider_id=service_request.provider_id,
+            category_id=service_request.service_category_id,
+            from_status=from_status or '',
+            to_status=to_status,
+        )
+    
+    def __str__(self):
+        return f"Request {self.service_request_id}: {self.from_status or 'new'} -> {self.to_status}"
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['service_request', 'created_at'], name='event_request_created_idx'),
+            # Reports and the dashboard rollup read the log by time window
+            models.Index(fields=['created_at'], name='event_created_idx'),
+        ]
 
 class Booking(models.Model):
     STATUS_CHOICES = [
@@ -90,6 +332,33 @@ class Booking(models.Model):
     def __str__(self):
         return f"{self.service.title} - {self.customer.get_full_name() or self.customer.username}"
 
+    class Meta:
+        indexes = [
+            # Provider dashboard: active bookings and recent bookings per service
+            models.Index(fields=['service', 'status', '-created_at'], name='booking_service_status_idx'),
+            models.Index(fields=['customer', '-created_at'], name='booking_customer_recent_idx'),
+            # Exports filtered by status and date range
+            models.Index(fields=['status', 'created_at'], name='booking_status_created_idx'),
+            models.Index(fields=['created_at'], name='booking_created_idx'),
+        ]
+
+class BookingEvent(models.Model):
+    """One status change of a booking, written by the Booking signals. Rows are only ever inserted."""
+    booking = models.ForeignKey(Booking, on_delete=models.DO_NOTHING, db_constraint=False, related_name='events')
+    provider_id = models.BigIntegerField(null=True, blank=True)
+    from_status = models.CharField(max_length=20, blank=True, help_text="Empty for the event that created the booking")
+    to_status = models.CharField(max_length=20)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Booking {self.booking_id}: {self.from_status or 'new'} -> {self.to_status}"
+    
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['booking', 'created_at'], name='event_booking_created_idx'),
+        ]
+
 class Review(models.Model):
     booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='review')
     rating = models.PositiveSmallIntegerField(choices=[(i, i) for i in range(1, 6)])
@@ -110,3 +379,98 @@ class SystemSetting(models.Model):
 
     def __str__(self):
         return self.key
+
+class DailyStats(models.Model):
+    """Per-day platform activity, kept current by the ``rollup_daily_stats`` command.
+
+    The ``new_*`` columns count rows created on ``date``. The remaining columns
+    are a snapshot of the admin dashboard counters taken at ``snapshot_at``, so
+    the dashboard reads one row instead of counting the live tables.
+    """
+    date = models.DateField(unique=True)
+    new_users = models.PositiveIntegerField(default=0)
+    new_providers = models.PositiveIntegerField(default=0)
+    new_requests = models.PositiveIntegerField(default=0)
+
+    total_users = models.PositiveIntegerField(null=True, blank=True)
+    total_providers = models.PositiveIntegerField(null=True, blank=True)
+    active_providers = models.PositiveIntegerField(null=True, blank=True)
+    pending_providers = models.PositiveIntegerField(null=True, blank=True)
+    total_requests = models.PositiveIntegerField(null=True, blank=True)
+    pending_requests = models.PositiveIntegerField(null=True, blank=True)
+    active_requests = models.PositiveIntegerField(null=True, blank=True)
+    completed_requests = models.PositiveIntegerField(null=True, blank=True)
+    snapshot_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Stats for {self.date}"
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Daily Stats'
+
+class ArchivedRecord(models.Model):
+    """A finished service request or booking moved out of the live tables by ``archive_requests``.
+    
+    ``data`` holds the row with its provider, category and customer columns,
+    as ``app1.exports`` exports it. The status events stay in their own tables.
+    """
+    KIND_CHOICES = [
+        ('requests', 'Service request'),
+        ('bookings', 'Booking'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    original_id = models.BigIntegerField()
+    status = models.CharField(max_length=20)
+    created_at = models.DateTimeField(help_text="When the original row was created")
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    
+    def __str__(self):
+        return f"Archived {self.get_kind_display().lower()} {self.original_id}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'original_id'], name='unique_archived_record'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'created_at'], name='archive_kind_created_idx'),
+        ]
+
+class Notification(models.Model):
+    """A message to a customer or provider, waiting in the outbox or already sent.
+    
+    Written in the same transaction as the change it reports and delivered
+    later by ``send_notifications`` (see ``app1.notifications``), so a
+    request never waits on a mail server.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    channel = models.CharField(max_length=20, help_text="A key of settings.NOTIFICATION_TRANSPORTS")
+    recipient = models.CharField(max_length=254, help_text="Email address, phone number or URL, depending on the channel")
+    event = models.CharField(max_length=50)
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    data = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True, editable=False, help_text="Set by the worker sending it")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.get_status_display()} {self.channel} to {self.recipient}: {self.subject}"
+    
+    class Meta:
+        indexes = [
+            # The worker's queue: pending notifications that are due
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx'),
+            models.Index(fields=['claim'], name='notification_claim_idx'),
+        ]
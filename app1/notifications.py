@@ -0,0 +1,238 @@
+"""Email, SMS and webhook notifications, sent outside the request.
+
+Views never talk to a mail server. A change that someone should hear about
+adds ``Notification`` rows (the outbox) in the same transaction as the
+change itself, so a rolled-back change sends nothing and a committed one
+is never lost. The ``send_notifications`` command delivers them.
+
+Each channel maps to a transport class in ``settings.NOTIFICATION_TRANSPORTS``;
+a channel without one is not written at all. A transport's
+``send(recipient, notifications)`` is handed every due notification for
+one recipient at once, so it can fold them into one message, and raises
+to have all of them retried. Sends run on a thread pool, since transports
+spend their time waiting on the network; the database is only used from
+the calling thread.
+
+A failed send is retried after ``NOTIFICATION_RETRY_DELAY`` seconds,
+doubling each time, until ``NOTIFICATION_MAX_ATTEMPTS`` is reached and the
+notification is marked failed.
+"""
+import json
+import logging
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Notification, ServiceRequest
+
+logger = logging.getLogger(__name__)
+
+SENT = 'sent'
+RETRY = 'retry'
+FAILED = 'failed'
+
+# A claimed notification whose worker died goes back in the queue after this
+CLAIM_TIMEOUT = timedelta(minutes=5)
+MAX_RETRY_DELAY = timedelta(hours=6)
+
+
+class EmailTransport:
+    """Sends through ``EMAIL_BACKEND``. Several notifications to one address become one email."""
+
+    def send(self, recipient, notifications):
+        if len(notifications) == 1:
+            subject, body = notifications[0].subject, notifications[0].body
+        else:
+            subject = f'{len(notifications)} updates from RoadMate'
+            body = '\n\n'.join(f'{notification.subject}\n{notification.body}' for notification in notifications)
+        send_mail(subject, body, None, [recipient])
+
+
+class SmsTransport:
+    """Stand-in for an SMS gateway: logs the text it would send."""
+
+    def send(self, recipient, notifications):
+        logger.info('SMS to %s: %s', recipient, ' / '.join(notification.subject for notification in notifications))
+
+
+class WebhookTransport:
+    """Stand-in for an HTTP endpoint: logs the JSON it would POST."""
+
+    def send(self, recipient, notifications):
+        payload = [
+            {'event': notification.event, 'subject': notification.subject, 'data': notification.data}
+            for notification in notifications
+        ]
+        logger.info('POST %s %s', recipient, json.dumps(payload, cls=DjangoJSONEncoder))
+
+
+@lru_cache(maxsize=None)
+def get_transport(channel):
+    path = settings.NOTIFICATION_TRANSPORTS.get(channel)
+    return import_string(path)() if path else None
+
+
+def build(event, subject, body, email='', phone='', data=None):
+    """Unsaved notifications of one event, one per configured channel that has an address."""
+    addresses = {'email': email, 'sms': phone, 'webhook': settings.NOTIFICATION_WEBHOOK_URL}
+    return [
+        Notification(
+            channel=channel, recipient=recipient, event=event, subject=subject, body=body, data=data or {}
+        )
+        for channel, recipient in addresses.items()
+        if recipient and channel in settings.NOTIFICATION_TRANSPORTS
+    ]
+
+
+def enqueue(notifications):
+    """Add ``notifications`` to the outbox. Call inside the transaction making the change."""
+    if notifications:
+        Notification.objects.bulk_create(notifications)
+
+
+def _request_body(service_request):
+    return (
+        f'{service_request.customer_name} needs {service_request.service_category.name}.\n'
+        f'Phone: {service_request.customer_phone}\n'
+        f'Location: {service_request.customer_location}\n\n'
+        f'{service_request.description}'
+    )
+
+
+def new_request(service_request, provider):
+    """For ``provider``: a customer sent them ``service_request``."""
+    return build(
+        'request_created',
+        f'New service request from {service_request.customer_name}',
+        _request_body(service_request),
+        email=provider.user.email,
+        phone=provider.phone_number,
+        data={'request': service_request.id, 'provider': provider.id},
+    )
+
+
+def request_offered(service_request, providers):
+    """For each of ``providers``: a dispatched request is theirs if they accept it first."""
+    body = f'{_request_body(service_request)}\n\nThe first provider to accept gets the job.'
+    return [
+        notification
+        for provider in providers
+        for notification in build(
+            'request_offered',
+            f'Service request nearby: {service_request.customer_name}',
+            body,
+            email=provider.user.email,
+            phone=provider.phone_number,
+            data={'request': service_request.id, 'provider': provider.id},
+        )
+    ]
+
+
+def status_changed(service_request_id, status, email, phone):
+    """For the customer: their request moved to ``status``."""
+    label = dict(ServiceRequest.STATUS_CHOICES)[status].lower()
+    return build(
+        f'request_{status}',
+        f'Your service request #{service_request_id} is {label}',
+        f'Your service request #{service_request_id} is now {label}.',
+        email=email,
+        phone=phone,
+        data={'request': service_request_id, 'status': status},
+    )
+
+
+def provider_approved(provider):
+    return build(
+        'provider_approved',
+        f'{provider.company_name} is approved',
+        'Your provider account has been approved. You can now log in and receive service requests.',
+        email=provider.user.email,
+        phone=provider.phone_number,
+        data={'provider': provider.id},
+    )
+
+
+def retry_delay(attempts):
+    """How long to wait after the ``attempts``-th failed send."""
+    seconds = settings.NOTIFICATION_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, MAX_RETRY_DELAY.total_seconds()))
+
+
+def claim(batch_size, now=None):
+    """Reserve up to ``batch_size`` due notifications for this worker, oldest first.
+
+    Another worker skips them until ``CLAIM_TIMEOUT`` has passed, so a
+    crashed worker's notifications are picked up again.
+    """
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    due = Notification.objects.filter(status='pending', next_attempt_at__lte=now)
+    ids = list(due.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    # Conditional, so two workers reading the same ids cannot both claim one
+    due.filter(id__in=ids).update(claim=token, next_attempt_at=now + CLAIM_TIMEOUT)
+    return list(Notification.objects.filter(claim=token).order_by('id'))
+
+
+def _send(channel, recipient, notifications):
+    transport = get_transport(channel)
+    if transport is None:
+        raise LookupError(f'No transport for the {channel!r} channel')
+    transport.send(recipient, notifications)
+
+
+def send_due(batch_size=200, workers=None, now=None):
+    """Claim one batch and send it, one task per recipient. Returns ``Counter({SENT: n, RETRY: n, FAILED: n})``."""
+    notifications = claim(batch_size, now)
+    if not notifications:
+        return Counter()
+    groups = defaultdict(list)
+    for notification in notifications:
+        groups[notification.channel, notification.recipient].append(notification)
+
+    with ThreadPoolExecutor(max_workers=workers or settings.NOTIFICATION_WORKERS) as pool:
+        futures = [
+            (pool.submit(_send, channel, recipient, group), group)
+            for (channel, recipient), group in groups.items()
+        ]
+        outcomes = [(future.exception(), group) for future, group in futures]
+
+    results = Counter()
+    now = timezone.now()
+    sent_ids = []
+    failed = []
+    for error, group in outcomes:
+        if error is None:
+            sent_ids.extend(notification.id for notification in group)
+            results[SENT] += len(group)
+            continue
+        logger.warning('Sending %d %s notification(s) to %s failed: %s',
+                       len(group), group[0].channel, group[0].recipient, error)
+        for notification in group:
+            notification.attempts += 1
+            notification.last_error = repr(error)
+            if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                notification.status = 'failed'
+                results[FAILED] += 1
+            else:
+                notification.next_attempt_at = now + retry_delay(notification.attempts)
+                results[RETRY] += 1
+            notification.claim = ''
+            failed.append(notification)
+
+    with transaction.atomic():
+        Notification.objects.filter(id__in=sent_ids).update(status='sent', sent_at=now, claim='')
+        Notification.objects.bulk_update(
+            failed, ['attempts', 'last_error', 'status', 'next_attempt_at', 'claim'], batch_size=500
+        )
+    return results
@@ -0,0 +1,78 @@
+"""Cached provider listings for the service pages.
+
+A category's provider cards only change when one of its providers is
+approved, edited or deactivated, or changes categories. They are rendered
+once per category and per variant (anonymous or logged in) and stored in
+the default cache. The signals in ``signals`` delete exactly the affected
+categories' entries. The key also carries the category registry version,
+so editing any category drops every listing, since category names show on
+the cards.
+
+The per-user parts of the page (navbar, request modals, CSRF token) are
+rendered outside the cached fragment. Hits and misses are counted in the
+cache too, so ``metrics()`` covers every process sharing it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import categories
+from .routers import use_primary
+
+KEY_PREFIX = 'service-page'
+VARIANTS = ('anonymous', 'customer')
+
+
+def fragment_key(category_id, variant):
+    return f'{KEY_PREFIX}:{categories.current_version()}:{category_id}:{variant}'
+
+
+def get_or_render(category_id, variant, render):
+    """The cached fragment, or ``render()``'s result after storing it."""
+    key = fragment_key(category_id, variant)
+    fragment = cache.get(key)
+    if fragment is not None:
+        _count('hits')
+        return fragment
+    _count('misses')
+    # Cached for up to an hour, so never rendered from a lagging replica
+    with use_primary():
+        fragment = render()
+    cache.set(key, fragment, settings.SERVICE_PAGE_CACHE_TIMEOUT)
+    return fragment
+
+
+def invalidate(category_ids):
+    cache.delete_many([fragment_key(category_id, variant) for category_id in category_ids for variant in VARIANTS])
+
+
+def invalidate_on_commit(category_ids):
+    """Drop the listings of ``category_ids`` once the current transaction commits.
+
+    Waiting for the commit stops a concurrent request from caching the old rows again.
+    """
+    category_ids = set(category_ids)
+    if category_ids:
+        transaction.on_commit(lambda: invalidate(category_ids))
+
+
+def _count(event):
+    key = f'{KEY_PREFIX}:{event}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def metrics():
+    """``{'hits': ..., 'misses': ..., 'hit_rate': ...}`` since the counters were last reset."""
+    counts = cache.get_many([f'{KEY_PREFIX}:hits', f'{KEY_PREFIX}:misses'])
+    hits = counts.get(f'{KEY_PREFIX}:hits', 0)
+    misses = counts.get(f'{KEY_PREFIX}:misses', 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+
+
+def reset_metrics():
+    cache.delete_many([f'{KEY_PREFIX}:hits', f'{KEY_PREFIX}:misses'])
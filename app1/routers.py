@@ -0,0 +1,139 @@
+"""Send the dashboards' reads to a read replica, and everything else to the primary.
+
+Views opt in with ``@reads_from_replica``. The replica trails the primary
+by however long ``sync_replica`` takes to run again, so within an opted-in
+view reads still go to the primary once:
+
+- the request has written anything (the router sees every write), or
+- the session wrote something in the last ``REPLICA_PIN_SECONDS``, so a
+  user who just accepted a request and got redirected to their dashboard
+  sees the change.
+
+Anything cached beyond the request (the category registry, the service page
+listings) is loaded under ``use_primary()``, since a stale copy would
+outlive the replica's lag.
+
+Reads only go to the replica when ``settings.READ_REPLICA_ENABLED`` is set.
+Outside a request (management commands, the shell) everything uses the
+primary.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.decorators import sync_and_async_middleware
+
+REPLICA = 'replica'
+PIN_SESSION_KEY = '_primary_until'
+
+
+class _RequestState:
+    def __init__(self):
+        self.replica_allowed = False
+        self.primary_only = False
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('database_routing', default=None)
+
+
+@contextmanager
+def request_scope():
+    """Routing state for one request; yields it. Used by the middleware."""
+    token = _state.set(_RequestState())
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside this block, even in an opted-in view."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous, state.primary_only = state.primary_only, True
+    try:
+        yield
+    finally:
+        state.primary_only = previous
+
+
+def _pinned(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+def reads_from_replica(view_func):
+    """Let ``view_func``'s reads go to the replica, unless the session just wrote.
+
+    Only for ``GET`` and ``HEAD``: a form post reads what it is about to
+    change, and a lagging copy would have it act on stale rows.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is not None and request.method in ('GET', 'HEAD') and not _pinned(request):
+            state.replica_allowed = True
+        return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def _pin_if_written(request, state):
+    if settings.READ_REPLICA_ENABLED and state.wrote and hasattr(request, 'session'):
+        request.session[PIN_SESSION_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """Tracks each request's writes. Must come after the session middleware."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with request_scope() as state:
+                response = await get_response(request)
+                _pin_if_written(request, state)
+            return response
+    else:
+        def middleware(request):
+            with request_scope() as state:
+                response = get_response(request)
+                _pin_if_written(request, state)
+            return response
+    return middleware
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            settings.READ_REPLICA_ENABLED
+            and state is not None
+            and state.replica_allowed
+            and not state.primary_only
+            and not state.wrote
+        ):
+            return REPLICA
+        # Explicit, so that rows loaded from the replica do not pull their
+        # related objects from it later on
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA} or None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary's file, schema included
+        return False if db == REPLICA else None
@@ -0,0 +1,145 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.db import transaction
+from django.db.models import QuerySet
+from django.dispatch import receiver
+
+from . import categories, counters, page_cache
+from .models import Booking, BookingEvent, ProviderStats, Service, ServiceCategory, ServiceProvider, ServiceRequest
+
+
+def ensure_admin_user(sender, using, verbosity=1, **kwargs):
+    """Create the default admin account once, right after migrations run.
+
+    This used to happen on every hit to ``home`` and ``admin_dashboard``.
+    """
+    output = {} if verbosity else {'stdout': StringIO()}
+    call_command('create_admin', if_missing=True, database=using, verbosity=verbosity, **output)
+
+
+# ProviderStats maintenance for writes that happen outside our own views
+# (Django admin edits, cascades). See app1.counters.
+
+@receiver(post_save, sender=ServiceProvider)
+def create_provider_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProviderStats.objects.get_or_create(provider=instance)
+
+
+@receiver(m2m_changed, sender=ServiceProvider.service_categories.through)
+def recount_provider_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        provider_ids = [instance.pk]
+    elif pk_set:
+        provider_ids = list(pk_set)
+    else:
+        # A category was cleared of all its providers; nothing tells us which
+        return
+    for provider_id in provider_ids:
+        total = ServiceProvider.service_categories.through.objects.filter(serviceprovider_id=provider_id).count()
+        updated = ProviderStats.objects.filter(provider_id=provider_id).update(service_categories=total)
+        if not updated:
+            counters.rebuild([provider_id])
+
+
+@receiver(post_save, sender=Service)
+def count_new_service(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.apply_deltas(instance.provider_id, {'total_services': 1})
+
+
+def _deleting_providers(origin):
+    """Whether the delete that ``origin`` started takes providers with it."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, ServiceProvider)
+
+
+@receiver(post_delete, sender=Service)
+def count_deleted_service(sender, instance, origin=None, **kwargs):
+    if not _deleting_providers(origin):
+        counters.apply_deltas(instance.provider_id, {'total_services': -1}, rebuild_missing=False)
+
+
+@receiver(post_init, sender=Booking)
+def remember_booking_status(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred status field is not fetched per row
+    instance._saved_status = instance.__dict__.get('status') if instance.pk else None
+
+
+@receiver(post_save, sender=Booking)
+def count_booking_status(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_status = None if created else instance._saved_status
+    if old_status != instance.status:
+        provider_id = Service.objects.filter(id=instance.service_id).values_list('provider_id', flat=True).first()
+        counters.booking_status_changed(provider_id, old_status, instance.status)
+        BookingEvent.objects.create(
+            booking=instance, provider_id=provider_id, from_status=old_status or '', to_status=instance.status
+        )
+    instance._saved_status = instance.status
+
+
+@receiver(post_delete, sender=Booking)
+def count_deleted_booking(sender, instance, origin=None, **kwargs):
+    deltas = counters.status_deltas(counters.BOOKING_COUNTERS, instance._saved_status, None)
+    if not deltas or _deleting_providers(origin):
+        # Finished bookings count towards nothing; archive_requests deletes them by the hundred
+        return
+    # Deleting a provider's user cascades too; their stats row may already be gone
+    provider_id = Service.objects.filter(id=instance.service_id).values_list('provider_id', flat=True).first()
+    counters.apply_deltas(provider_id, deltas, rebuild_missing=False)
+
+
+@receiver(post_delete, sender=ServiceRequest)
+def count_deleted_request(sender, instance, origin=None, **kwargs):
+    deltas = counters.status_deltas(counters.REQUEST_COUNTERS, instance.status, None)
+    if not deltas or _deleting_providers(origin):
+        # Finished requests count towards nothing; archive_requests deletes them by the hundred
+        return
+    # Deleting a provider's user cascades too; their stats row may already be gone
+    counters.apply_deltas(instance.provider_id, deltas, rebuild_missing=False)
+
+
+@receiver(post_save, sender=ServiceCategory)
+@receiver(post_delete, sender=ServiceCategory)
+def invalidate_category_registry(sender, **kwargs):
+    # After commit, so no process reloads the registry from the old rows
+    transaction.on_commit(categories.invalidate)
+
+
+# Cached service page listings (see app1.page_cache). Category edits are
+# covered by the registry version in the cache key.
+
+@receiver(post_save, sender=ServiceProvider)
+@receiver(pre_delete, sender=ServiceProvider)
+def invalidate_provider_listings(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.invalidate_on_commit(instance.service_categories.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=ServiceProvider.service_categories.through)
+def invalidate_category_listings(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        page_cache.invalidate_on_commit([instance.pk] if reverse else pk_set)
+    elif action == 'pre_clear':
+        page_cache.invalidate_on_commit(
+            [instance.pk] if reverse else instance.service_categories.values_list('id', flat=True)
+        )
+
+
+@receiver(post_save, sender=User)
+def invalidate_provider_user_listings(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Cards show the provider's username and email, but logins only touch last_login
+    if created or raw or (update_fields is not None and set(update_fields) == {'last_login'}):
+        return
+    page_cache.invalidate_on_commit(
+        ServiceProvider.service_categories.through.objects.filter(
+            serviceprovider__user=instance
+        ).values_list('servicecategory_id', flat=True)
+    )
@@ -0,0 +1,107 @@
+"""Counters shown on the admin dashboard."""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import DailyStats, RequestEvent, ServiceProvider, ServiceRequest
+
+DASHBOARD_FIELDS = [
+    'total_users',
+    'total_providers',
+    'active_providers',
+    'pending_providers',
+    'total_requests',
+    'pending_requests',
+    'active_requests',
+    'completed_requests',
+]
+
+# Which request counter each status is counted under
+REQUEST_STATUS_FIELDS = {
+    'pending': 'pending_requests',
+    'accepted': 'active_requests',
+    'in_progress': 'active_requests',
+    'completed': 'completed_requests',
+}
+
+
+def live_dashboard_stats():
+    """Compute the dashboard counters with two conditional-aggregation queries."""
+    User = get_user_model()
+
+    # Providers are one-to-one with users, so one pass over the user table
+    # (LEFT JOIN service_provider) counts both
+    stats = User.objects.aggregate(
+        total_users=Count('id', filter=Q(is_staff=False)),
+        total_providers=Count('service_provider'),
+        active_providers=Count(
+            'service_provider',
+            filter=Q(service_provider__is_active=True, service_provider__is_approved=True),
+        ),
+        pending_providers=Count('service_provider', filter=Q(service_provider__is_approved=False)),
+    )
+    stats.update(ServiceRequest.objects.aggregate(
+        total_requests=Count('id'),
+        pending_requests=Count('id', filter=Q(status='pending')),
+        active_requests=Count('id', filter=Q(status__in=['accepted', 'in_progress'])),
+        completed_requests=Count('id', filter=Q(status='completed')),
+    ))
+    return stats
+
+
+def advance_dashboard_stats(snapshot, since, until):
+    """Carry a snapshot taken at ``since`` forward to ``until`` without recounting.
+
+    Request counters move by the status changes in the event log, user and
+    provider totals by the sign-ups in between. The provider status counts
+    are read from the ``provider_approval_idx`` index. Rows deleted in
+    between are not seen, so ``rollup_daily_stats`` recounts once a day.
+    """
+    User = get_user_model()
+    stats = {field: snapshot[field] for field in DASHBOARD_FIELDS}
+    window = {'created_at__gte': since, 'created_at__lt': until}
+
+    stats['total_users'] += User.objects.filter(
+        is_staff=False, date_joined__gte=since, date_joined__lt=until
+    ).count()
+    stats['total_providers'] += ServiceProvider.objects.filter(**window).count()
+    stats.update(ServiceProvider.objects.aggregate(
+        active_providers=Count('id', filter=Q(is_approved=True, is_active=True)),
+        pending_providers=Count('id', filter=Q(is_approved=False)),
+    ))
+
+    moves = (
+        RequestEvent.objects.filter(**window)
+        .order_by()
+        .values('from_status', 'to_status')
+        .annotate(count=Count('id'))
+    )
+    for move in moves:
+        if not move['from_status']:
+            stats['total_requests'] += move['count']
+        if move['from_status'] in REQUEST_STATUS_FIELDS:
+            stats[REQUEST_STATUS_FIELDS[move['from_status']]] -= move['count']
+        if move['to_status'] in REQUEST_STATUS_FIELDS:
+            stats[REQUEST_STATUS_FIELDS[move['to_status']]] += move['count']
+    return stats
+
+
+def dashboard_stats():
+    """Dashboard counters from the latest rollup snapshot.
+
+    ``snapshot_at`` says when they were taken, and ``stale`` is set once that
+    is more than ``DASHBOARD_STATS_MAX_AGE`` seconds ago. Only before the
+    first rollup are the tables counted live, with ``snapshot_at`` of None.
+    """
+    latest = DailyStats.objects.filter(snapshot_at__isnull=False).order_by('-date').first()
+    if latest is None:
+        return {**live_dashboard_stats(), 'snapshot_at': None, 'stale': False}
+    max_age = timedelta(seconds=settings.DASHBOARD_STATS_MAX_AGE)
+    return {
+        **{field: getattr(latest, field) for field in DASHBOARD_FIELDS},
+        'snapshot_at': latest.snapshot_at,
+        'stale': timezone.now() - latest.snapshot_at > max_age,
+    }
@@ -1,3 +1,2007 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import random
+import re
+import runpy
+import sqlite3
+import tempfile
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import F
+from django.core.management.base import CommandError
+from django.core.management.sql import emit_post_migrate_signal
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import categories, counters, dispatch, expiry, geo, idempotency, imports, live, notifications, page_cache, routers, stats, views, workflow
+from roadmate1 import database
+
+from .admin import RequestEventAdmin, ServiceProviderAdmin
+from .models import (
+    ArchivedRecord, Booking, BookingEvent, DailyStats, InvalidTransition, Notification, ProviderStats, RequestEvent, RequestOffer, Service, ServiceCategory, ServiceProvider,
+    Review, ServiceRequest, SubmissionKey,
+)
+
+CATEGORIES = [
+    ('Towing Service', 'towing', 'fa-truck-pickup'),
+    ('Fuel Delivery', 'fuel-delivery', 'fa-gas-pump'),
+    ('Battery Jump Start', 'battery', 'fa-car-battery'),
+    ('Tire Change', 'tire', 'fa-tire'),
+    ('Lockout Service', 'lockout', 'fa-key'),
+    ('On-Site Mechanic', 'mechanic', 'fa-wrench'),
+]
+
+
+class LargeFixtureMixin:
+    """A few hundred providers, requests and bookings, built with bulk inserts."""
+    approved_providers = 200
+    pending_providers = 40
+    requests_per_party = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = ServiceCategory.objects.bulk_create(
+            ServiceCategory(name=name, slug=slug, icon=icon) for name, slug, icon in CATEGORIES
+        )
+        # bulk_create sends no signals
+        categories.invalidate()
+        cls.towing = cls.categories[0]
+
+        provider_count = cls.approved_providers + cls.pending_providers
+        users = User.objects.bulk_create(
+            User(username=f'provider{i}', email=f'provider{i}@example.com') for i in range(provider_count)
+        )
+        providers = [
+            ServiceProvider(
+                user=user,
+                company_name=f'Company {i}',
+                phone_number='555-0100',
+                address=f'{i} Main Street',
+                latitude=40 + (i % 20) * 0.01,
+                longitude=-74 + (i // 20) * 0.01,
+                is_approved=i < cls.approved_providers,
+            )
+            for i, user in enumerate(users)
+        ]
+        for provider in providers:
+            provider.geohash = provider.compute_geohash()
+        providers = ServiceProvider.objects.bulk_create(providers)
+
+        Through = ServiceProvider.service_categories.through
+        Through.objects.bulk_create(
+            Through(serviceprovider_id=provider.id, servicecategory_id=category.id)
+            for i, provider in enumerate(providers)
+            for category in (cls.towing, cls.categories[1 + i % 5])
+        )
+
+        cls.provider = providers[0]
+        cls.customer = User.objects.create(username='customer', email='customer@example.com')
+        cls.staff = User.objects.create(username='staff', is_staff=True, is_superuser=True)
+
+        ServiceRequest.objects.bulk_create(
+            ServiceRequest(
+                provider=providers[i % cls.approved_providers] if i % 2 else cls.provider,
+                customer=cls.customer,
+                service_category=cls.categories[i % 6],
+                customer_name='Customer',
+                customer_phone='555-0199',
+                customer_location='Highway 1',
+                status=['pending', 'accepted', 'in_progress', 'completed', 'cancelled'][i % 5],
+            )
+            for i in range(cls.requests_per_party * 2)
+        )
+        # Older than the duplicate request window, so tests can file new ones
+        ServiceRequest.objects.update(created_at=timezone.now() - timedelta(days=1))
+
+        service = Service.objects.create(
+            provider=cls.provider, category=cls.towing, title='Tow', description='Tow',
+            price=50, duration=60,
+        )
+        Booking.objects.bulk_create(
+            Booking(service=service, customer=cls.customer, booking_date=timezone.now() + timedelta(days=i))
+            for i in range(cls.requests_per_party)
+        )
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AdminUserTests(TestCase):
+
+    def migrate(self):
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+
+    def test_migrate_creates_the_admin_once(self):
+        # The test database was itself migrated
+        self.assertTrue(User.objects.get(username='admin').is_superuser)
+        User.objects.filter(username='admin').delete()
+
+        self.migrate()
+        self.migrate()
+        admin_user = User.objects.get(username='admin')
+        self.assertTrue(admin_user.is_staff and admin_user.is_superuser)
+        self.assertTrue(admin_user.check_password('roadmate'))
+
+    def test_migrate_leaves_an_existing_admin_alone(self):
+        admin_user = User.objects.get(username='admin')
+        admin_user.set_password('changed-since')
+        admin_user.email = 'ops@example.com'
+        admin_user.save()
+
+        self.migrate()
+        admin_user.refresh_from_db()
+        self.assertTrue(admin_user.check_password('changed-since'))
+        self.assertEqual(admin_user.email, 'ops@example.com')
+        self.assertEqual(User.objects.filter(username='admin').count(), 1)
+
+
+class GeoTests(TestCase):
+
+    def test_encode_known_points(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geo.encode(42.6, -5.6, 5), 'ezs42')
+        self.assertEqual(geo.encode(-25.382708, -49.265506, 8), '6gkzwgjz')
+        self.assertEqual(len(geo.encode(0, 0)), geo.GEOHASH_PRECISION)
+
+    def test_neighbours_cross_cell_edges(self):
+        # The western three lie in another parent cell
+        self.assertEqual(
+            geo.neighbours('ezs42'),
+            {'ezefp', 'ezefr', 'ezefx', 'ezs40', 'ezs41', 'ezs43', 'ezs48', 'ezs49'},
+        )
+        # Across the antimeridian
+        east = geo.encode(0, 179.99, 3)
+        self.assertIn(geo.encode(0, -179.99, 3), geo.neighbours(east))
+        self.assertEqual(len(geo.neighbours(east)), 8)
+        # Nothing north of the pole row
+        self.assertEqual(len(geo.neighbours(geo.encode(89.99, 0, 3))), 5)
+
+    def test_cells_filter_matches_by_prefix(self):
+        ServiceProvider.objects.bulk_create(
+            ServiceProvider(
+                user=User.objects.create(username=f'geo{i}'), company_name=f'Geo {i}', phone_number='555',
+                address='Road', geohash=geohash,
+            )
+            for i, geohash in enumerate(['ezs42abc', 'ezs43xyz', 'ezs4', 'ezs5aaaa'])
+        )
+        matched = ServiceProvider.objects.filter(geo.cells_filter({'ezs42', 'ezs5'}))
+        self.assertEqual(sorted(matched.values_list('geohash', flat=True)), ['ezs42abc', 'ezs5aaaa'])
+
+    def test_nearest_agrees_with_plain_distance(self):
+        rng = random.Random(3)
+        users = User.objects.bulk_create(User(username=f'geo{i}') for i in range(300))
+        providers = []
+        for i, user in enumerate(users):
+            # A dense city and a sparse ring around it
+            spread = 0.05 if i % 3 else 2.0
+            provider = ServiceProvider(
+                user=user, company_name=f'Geo {i}', phone_number='555', address='Road',
+                latitude=40.7 + rng.uniform(-spread, spread), longitude=-74.0 + rng.uniform(-spread, spread),
+                is_approved=True,
+            )
+            provider.geohash = provider.compute_geohash()
+            providers.append(provider)
+        ServiceProvider.objects.bulk_create(providers)
+
+        for latitude, longitude in [(40.7, -74.0), (40.74, -73.96), (41.9, -72.5), (35.0, -80.0)]:
+            by_distance = sorted(
+                ServiceProvider.objects.all(),
+                key=lambda provider: geo.haversine_km(latitude, longitude, provider.latitude, provider.longitude),
+            )
+            found = ServiceProvider.objects.nearest(latitude, longitude, k=10)
+            self.assertEqual([provider.id for provider in found], [provider.id for provider in by_distance[:10]])
+            self.assertEqual([provider.distance_km for provider in found], sorted(provider.distance_km for provider in found))
+
+        within = ServiceProvider.objects.nearest(40.7, -74.0, k=500, max_distance_km=3)
+        self.assertEqual(
+            {provider.id for provider in within},
+            {
+                provider.id for provider in ServiceProvider.objects.all()
+                if geo.haversine_km(40.7, -74.0, provider.latitude, provider.longitude) <= 3
+            },
+        )
+
+
+class QueryBudgetTests(LargeFixtureMixin, TestCase):
+    """Every page runs a fixed number of queries, however many rows it lists."""
+
+    def setUp(self):
+        # Measure service pages with a cold listing cache but a loaded
+        # category registry, which happens once per process
+        cache.clear()
+        categories.active_categories()
+
+    def test_home_anonymous(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_service_detail_anonymous(self):
+        # providers + users, categories prefetch; the category comes from the registry
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('service_detail', args=['towing']))
+        self.assertEqual(response.context['providers_count'], self.approved_providers)
+
+    def test_service_detail_cached(self):
+        self.client.get(reverse('service_detail', args=['towing']))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('service_detail', args=['towing']))
+        self.assertEqual(response.context['providers_count'], self.approved_providers)
+
+    def test_service_detail_logged_in(self):
+        self.client.force_login(self.customer)
+        # session, user, providers + users, categories prefetch
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('service_detail', args=['towing']))
+        self.assertContains(response, 'Request Service')
+
+    def test_service_detail_nearest(self):
+        # providers + categories prefetch for two cell sizes (the fixture is
+        # sparse enough that the search widens once), then for the rest
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('service_detail', args=['towing']), {'lat': '40.05', 'lng': '-73.95'})
+        self.assertEqual(response.context['providers_count'], self.approved_providers)
+
+    def test_service_detail_nearest_keeps_everyone_else(self):
+        unlocated = ServiceProvider.objects.available(self.towing).order_by('-id')[:5]
+        ServiceProvider.objects.filter(id__in=[provider.id for provider in unlocated]).update(
+            latitude=None, longitude=None, geohash=''
+        )
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('service_detail', args=['towing']), {'lat': '40.05', 'lng': '-73.95'})
+        listed = [
+            int(id) for id in re.findall(rf'/service-request/(\d+)/{self.towing.id}/', response.content.decode())
+        ]
+
+        nearest = ServiceProvider.objects.available(self.towing).nearest(
+            40.05, -73.95, k=settings.NEAREST_PROVIDERS_LIMIT
+        )
+        self.assertEqual(listed[:len(nearest)], [provider.id for provider in nearest])
+        self.assertEqual(
+            listed[len(nearest):],
+            [
+                provider.id for provider in ServiceProvider.objects.available(self.towing)
+                if provider.id not in listed[:len(nearest)]
+            ],
+        )
+        self.assertEqual(response.context['providers_count'], self.approved_providers)
+        self.assertContains(response, 'km away', count=len(nearest))
+
+    def test_my_bookings(self):
+        self.client.force_login(self.customer)
+        # session, user, status counts, one page
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('my_bookings'))
+        self.assertEqual(response.context['total_bookings'], self.requests_per_party * 2)
+
+    def test_my_bookings_later_page(self):
+        self.client.force_login(self.customer)
+        cursor = self.client.get(reverse('my_bookings')).context['next_cursor']
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('my_bookings'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+    def test_provider_dashboard(self):
+        self.client.force_login(self.provider.user)
+        # session, user, provider + stats row, categories, requests page,
+        # open offers, recent bookings
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('provider_dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_dashboard(self):
+        self.client.force_login(self.staff)
+        with self.assertNumQueries(10):
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(len(response.context['pending_providers']), self.pending_providers)
+
+
+class CategoryRegistryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.category = ServiceCategory.objects.create(name='Winch Out')
+
+    def setUp(self):
+        # Rolling back the previous test sent no signals
+        categories.invalidate()
+
+    def test_slug_is_derived_from_the_name(self):
+        self.assertEqual(self.category.slug, 'winch-out')
+
+    def test_lookups_are_served_from_memory(self):
+        categories.get_by_slug('winch-out')
+        with self.assertNumQueries(0):
+            self.assertEqual(categories.get_by_slug('winch-out'), self.category)
+            self.assertIsNone(categories.get_by_slug('no-such-service'))
+
+    def test_admin_edits_reload_the_registry(self):
+        self.assertEqual(categories.get_by_slug('winch-out').name, 'Winch Out')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Winch-Out Recovery'
+            self.category.save()
+        self.assertEqual(categories.get_by_slug('winch-out').name, 'Winch-Out Recovery')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.is_active = False
+            self.category.save()
+        self.assertIsNone(categories.get_by_slug('winch-out'))
+
+    def test_old_fuel_address_redirects(self):
+        response = self.client.get('/services/fuel/', {'lat': '40', 'lng': '-74'})
+        self.assertRedirects(response, '/services/fuel-delivery/?lat=40&lng=-74', status_code=301, fetch_redirect_response=False)
+
+
+class DashboardStatsTests(LargeFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Approved but deactivated, so active and approved differ
+        ServiceProvider.objects.filter(id__in=list(
+            ServiceProvider.objects.filter(is_approved=True).values_list('id', flat=True)[:7]
+        )).update(is_active=False)
+
+    def test_live_stats_match_plain_counts(self):
+        requests = ServiceRequest.objects.all()
+        self.assertEqual(stats.live_dashboard_stats(), {
+            'total_users': User.objects.filter(is_staff=False).count(),
+            'active_providers': ServiceProvider.objects.filter(is_active=True, is_approved=True).count(),
+            'pending_providers': ServiceProvider.objects.filter(is_approved=False).count(),
+            'total_providers': ServiceProvider.objects.count(),
+            'total_requests': requests.count(),
+            'pending_requests': requests.filter(status='pending').count(),
+            'active_requests': requests.filter(status__in=['accepted', 'in_progress']).count(),
+            'completed_requests': requests.filter(status='completed').count(),
+        })
+
+    def test_rollup_counts_each_day(self):
+        today = timezone.localdate()
+        # Spread the fixture's requests over the last three days
+        ids = list(ServiceRequest.objects.order_by('id').values_list('id', flat=True))
+        for days_ago in range(3):
+            ServiceRequest.objects.filter(id__in=ids[days_ago::3]).update(
+                created_at=timezone.now() - timedelta(days=days_ago)
+            )
+
+        call_command('rollup_daily_stats', days=3, stdout=StringIO())
+        rows = {row.date: row for row in DailyStats.objects.all()}
+        self.assertEqual(sorted(rows), [today - timedelta(days=days_ago) for days_ago in range(3, -1, -1)])
+        for days_ago in range(3):
+            self.assertEqual(rows[today - timedelta(days=days_ago)].new_requests, len(ids[days_ago::3]))
+        self.assertEqual(rows[today - timedelta(days=3)].new_requests, 0)
+        self.assertEqual(rows[today].new_users, User.objects.filter(date_joined__date=today).count())
+        self.assertEqual(rows[today].new_providers, ServiceProvider.objects.count())
+
+        snapshot = {field: getattr(rows[today], field) for field in stats.DASHBOARD_FIELDS}
+        self.assertEqual(snapshot, stats.live_dashboard_stats())
+        self.assertIsNone(rows[today - timedelta(days=1)].snapshot_at)
+
+        # Rerunning continues from today and recounts it in place
+        ServiceRequest.objects.filter(id=ids[0]).delete()
+        call_command('rollup_daily_stats', stdout=StringIO())
+        self.assertEqual(DailyStats.objects.count(), 4)
+        self.assertEqual(DailyStats.objects.get(date=today).new_requests, len(ids[0::3]) - 1)
+
+    def test_later_runs_carry_the_snapshot_forward(self):
+        call_command('rollup_daily_stats', stdout=StringIO())
+
+        ServiceProvider.objects.filter(id__in=list(
+            ServiceProvider.objects.filter(is_approved=False).values_list('id', flat=True)[:3]
+        )).approve()
+        User.objects.create_user('late_signup', 'late@example.com', 'password123')
+        dispatch.create_dispatched_request(self.customer, self.towing, description='Flat tyre')
+        pending = list(
+            ServiceRequest.objects.filter(provider=self.provider, status='pending').values_list('id', flat=True)[:6]
+        )
+        self.assertEqual(len(pending), 6)
+        workflow.bulk_apply(self.provider.id, 'accept', pending)
+        workflow.bulk_apply(self.provider.id, 'complete', pending[:2])
+        workflow.bulk_apply(self.provider.id, 'start', pending[2:4])
+
+        command = 'app1.management.commands.rollup_daily_stats.live_dashboard_stats'
+        with mock.patch(command, wraps=stats.live_dashboard_stats) as recount:
+            call_command('rollup_daily_stats', stdout=StringIO())
+        recount.assert_not_called()
+        today = DailyStats.objects.get(date=timezone.localdate())
+        self.assertEqual(
+            {field: getattr(today, field) for field in stats.DASHBOARD_FIELDS}, stats.live_dashboard_stats()
+        )
+
+        DailyStats.objects.update(total_requests=F('total_requests') + 5)
+        with mock.patch(command, wraps=stats.live_dashboard_stats) as recount:
+            call_command('rollup_daily_stats', full=True, stdout=StringIO())
+        recount.assert_called_once()
+        self.assertEqual(DailyStats.objects.get(date=today.date).total_requests, ServiceRequest.objects.count())
+
+    def test_dashboard_serves_the_snapshot_with_its_age(self):
+        call_command('rollup_daily_stats', stdout=StringIO())
+        DailyStats.objects.filter(date=timezone.localdate()).update(total_requests=12345)
+        self.assertEqual(stats.dashboard_stats()['total_requests'], 12345)
+        self.assertFalse(stats.dashboard_stats()['stale'])
+
+        # A stale snapshot is still served, flagged, and never recounted
+        DailyStats.objects.update(snapshot_at=timezone.now() - timedelta(seconds=settings.DASHBOARD_STATS_MAX_AGE + 1))
+        self.client.force_login(self.staff)
+        with mock.patch.object(stats, 'live_dashboard_stats') as recount:
+            response = self.client.post(reverse('admin_dashboard'))
+        recount.assert_not_called()
+        self.assertEqual(response.context['stats']['total_requests'], 12345)
+        self.assertTrue(response.context['stats']['stale'])
+        self.assertContains(response, 'rollup_daily_stats job may not be running')
+
+    def test_dashboard_counts_live_before_the_first_rollup(self):
+        self.assertEqual(stats.dashboard_stats(), {
+            **stats.live_dashboard_stats(), 'snapshot_at': None, 'stale': False,
+        })
+
+
+class PageCacheTests(LargeFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def get_listing(self, slug):
+        return self.client.get(reverse('service_detail', args=[slug]))
+
+    def test_variants_keep_per_user_markup_out_of_the_cache(self):
+        anonymous = self.get_listing('towing')
+        self.assertContains(anonymous, 'Login to Request')
+        self.assertNotContains(anonymous, 'csrfmiddlewaretoken')
+
+        self.client.force_login(self.customer)
+        customer = self.get_listing('towing')
+        self.assertContains(customer, 'data-bs-target="#providerRequestModal"')
+        self.assertContains(customer, 'csrfmiddlewaretoken')
+        self.assertEqual(page_cache.metrics(), {'hits': 0, 'misses': 2, 'hit_rate': 0.0})
+
+    def test_provider_changes_only_drop_their_categories(self):
+        self.get_listing('towing')
+        self.get_listing('fuel-delivery')
+        fuel_key = page_cache.fragment_key(self.categories[1].id, 'anonymous')
+        tire_key = page_cache.fragment_key(self.categories[3].id, 'anonymous')
+        cache.set(tire_key, {'html': 'tire', 'count': 0})
+
+        # Provider 0 offers towing and fuel delivery, not tire change
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.company_name = 'Renamed Towing'
+            self.provider.save()
+        self.assertIsNone(cache.get(fuel_key))
+        self.assertIsNotNone(cache.get(tire_key))
+        self.assertContains(self.get_listing('towing'), 'Renamed Towing')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.service_categories.add(self.categories[3])
+        self.assertIsNone(cache.get(tire_key))
+
+    def test_deactivated_provider_leaves_the_listing(self):
+        self.assertContains(self.get_listing('towing'), self.provider.company_name + '<')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.is_active = False
+            self.provider.save()
+        response = self.get_listing('towing')
+        self.assertNotContains(response, self.provider.company_name + '<')
+        self.assertEqual(page_cache.metrics()['hits'], 0)
+
+
+class BulkUpdateTests(LargeFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        counters.rebuild([cls.provider.id])
+
+    def post(self, action, request_ids, **extra):
+        return self.client.post(
+            reverse('bulk_update_service_requests'),
+            {'action': action, 'request_ids': request_ids},
+            HTTP_ACCEPT='application/json',
+            **extra
+        )
+
+    def test_accept_reports_each_request(self):
+        mine = ServiceRequest.objects.filter(provider=self.provider)
+        pending = list(mine.filter(status='pending').values_list('id', flat=True)[:3])
+        completed = mine.filter(status='completed').values_list('id', flat=True).first()
+        someone_elses = ServiceRequest.objects.exclude(provider=self.provider).values_list('id', flat=True).first()
+
+        self.client.force_login(self.provider.user)
+        response = self.post('accept', pending + [completed, someone_elses])
+        self.assertEqual(response.json()['updated'], 3)
+        self.assertEqual(response.json()['results'], {
+            **{str(request_id): workflow.UPDATED for request_id in pending},
+            str(completed): workflow.WRONG_STATUS,
+            str(someone_elses): workflow.NOT_FOUND,
+        })
+        self.assertEqual(set(mine.filter(id__in=pending).values_list('status', flat=True)), {'accepted'})
+        stored = ProviderStats.objects.filter(provider=self.provider).values(*counters.COUNTER_FIELDS).get()
+        self.assertEqual(stored, counters.compute([self.provider.id])[self.provider.id])
+
+    def test_query_count_does_not_grow_with_the_selection(self):
+        active = list(
+            ServiceRequest.objects.filter(provider=self.provider, status__in=['accepted', 'in_progress'])
+            .values_list('id', flat=True)
+        )
+        self.assertGreater(len(active), 10)
+        self.client.force_login(self.provider.user)
+        # session, user, provider, savepoint, read, update, counters, events,
+        # notifications, release
+        with self.assertNumQueries(10):
+            response = self.post('complete', active)
+        self.assertEqual(response.json()['updated'], len(active))
+
+    def test_form_post_redirects_with_a_summary(self):
+        pending = list(
+            ServiceRequest.objects.filter(provider=self.provider, status='pending').values_list('id', flat=True)
+        )
+        self.client.force_login(self.provider.user)
+        response = self.client.post(
+            reverse('bulk_update_service_requests'), {'action': 'reject', 'request_ids': pending}, follow=True
+        )
+        self.assertRedirects(response, reverse('provider_dashboard'))
+        self.assertContains(response, f'{len(pending)} service requests rejected.')
+
+    def test_bulk_start(self):
+        accepted = list(
+            ServiceRequest.objects.filter(provider=self.provider, status='accepted').values_list('id', flat=True)
+        )
+        self.client.force_login(self.provider.user)
+        response = self.client.post(
+            reverse('bulk_update_service_requests'), {'action': 'start', 'request_ids': accepted}, follow=True
+        )
+        self.assertRedirects(response, reverse('provider_dashboard'))
+        self.assertContains(response, f'{len(accepted)} service requests started.')
+        self.assertEqual(
+            set(ServiceRequest.objects.filter(id__in=accepted).values_list('status', flat=True)), {'in_progress'}
+        )
+
+    def test_a_row_that_moved_on_is_read_again(self):
+        accepted = list(
+            ServiceRequest.objects.filter(provider=self.provider, status='accepted').values_list('id', flat=True)[:3]
+        )
+        real_now = timezone.now
+        started = []
+
+        def now_after_a_concurrent_start():
+            # Runs once, between the bulk update's first read and its UPDATE
+            if not started:
+                started.append(ServiceRequest.objects.filter(id=accepted[0]).update(
+                    status='in_progress', version=F('version') + 1
+                ))
+            return real_now()
+
+        with mock.patch.object(timezone, 'now', side_effect=now_after_a_concurrent_start), \
+                mock.patch.object(workflow, '_bulk_apply', wraps=workflow._bulk_apply) as attempts:
+            results = workflow.bulk_apply(self.provider.id, 'complete', accepted)
+        # The first UPDATE missed the moved row, so the whole attempt was rolled back and read again
+        self.assertEqual(attempts.call_count, 2)
+        self.assertEqual(set(results.values()), {workflow.UPDATED})
+        self.assertEqual(
+            list(RequestEvent.objects.filter(service_request_id=accepted[0]).values_list('from_status', 'to_status')),
+            [('accepted', 'completed')],
+        )
+
+    def test_contended_rows_are_reported_not_raised(self):
+        pending = list(
+            ServiceRequest.objects.filter(provider=self.provider, status='pending').values_list('id', flat=True)[:3]
+        )
+        self.client.force_login(self.provider.user)
+        with mock.patch.object(workflow, '_bulk_apply', side_effect=workflow.ConcurrentUpdate) as bulk_apply:
+            response = self.post('accept', pending)
+            form_response = self.client.post(
+                reverse('bulk_update_service_requests'), {'action': 'accept', 'request_ids': pending}, follow=True
+            )
+        self.assertEqual(bulk_apply.call_count, 2 * workflow.BULK_ATTEMPTS)
+        self.assertEqual(response.json()['updated'], 0)
+        self.assertEqual(
+            response.json()['results'], {str(request_id): workflow.CONFLICT for request_id in pending}
+        )
+        self.assertContains(form_response, '3 selected requests were not accepted: they changed while you')
+        self.assertEqual(
+            set(ServiceRequest.objects.filter(id__in=pending).values_list('status', flat=True)), {'pending'}
+        )
+
+    def test_every_action_has_a_label(self):
+        self.assertEqual(set(workflow.ACTION_LABELS), set(workflow.ACTIONS))
+
+    def test_customers_cannot_bulk_update(self):
+        self.client.force_login(self.customer)
+        response = self.post('accept', [1])
+        self.assertEqual(response.status_code, 403)
+
+
+class TransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        cls.service_request = ServiceRequest.objects.create(
+            customer=cls.customer, customer_name='Stranded', customer_phone='555-0199', customer_location='Exit 4',
+        )
+
+    def test_actions_follow_the_transition_table(self):
+        for action, (from_statuses, new_status) in workflow.ACTIONS.items():
+            for status in from_statuses:
+                self.assertIn(new_status, ServiceRequest.TRANSITIONS[status], action)
+
+    def test_finished_requests_cannot_move(self):
+        self.assertTrue(self.service_request.transition_to('cancelled'))
+        with self.assertRaises(InvalidTransition):
+            self.service_request.transition_to('accepted')
+
+    def test_stale_instance_loses(self):
+        first = ServiceRequest.objects.get(id=self.service_request.id)
+        second = ServiceRequest.objects.get(id=self.service_request.id)
+        self.assertEqual(workflow.apply(first, 'accept'), workflow.UPDATED)
+        self.assertEqual(workflow.apply(second, 'reject'), workflow.CONFLICT)
+        self.service_request.refresh_from_db()
+        self.assertEqual((self.service_request.status, self.service_request.version), ('accepted', 1))
+
+
+class TransitionRaceTests(TransactionTestCase):
+    """Threads racing to move the same requests, on SQLite in WAL mode."""
+    thread_count = 8
+    request_count = 20
+
+    def setUp(self):
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            self.skipTest('needs an SQLite database file')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+        user = User.objects.create(username='provider')
+        self.provider = ServiceProvider.objects.create(
+            user=user, company_name='Tow Co', phone_number='555-0100', address='1 Main Street', is_approved=True,
+        )
+        customer = User.objects.create(username='customer')
+        self.request_ids = [
+            ServiceRequest.objects.create(
+                provider=self.provider, customer=customer, customer_name='Stranded',
+                customer_phone='555-0199', customer_location='Exit 4',
+            ).id
+            for _ in range(self.request_count)
+        ]
+        counters.rebuild([self.provider.id])
+
+    def race(self, worker):
+        start = threading.Barrier(self.thread_count)
+        errors = []
+
+        def run(number):
+            try:
+                start.wait()
+                worker(number)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(number,)) for number in range(self.thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_each_transition_applies_exactly_once(self):
+        wins = defaultdict(list)
+        wins_lock = threading.Lock()
+
+        def worker(number):
+            # Half the threads push requests through to completion, the
+            # other half try to reject them, all working on fresh reads
+            actions = ['accept', 'start', 'complete'] if number % 2 else ['reject']
+            for request_id in self.request_ids:
+                for action in actions:
+                    service_request = ServiceRequest.objects.get(id=request_id)
+                    if workflow.apply(service_request, action) == workflow.UPDATED:
+                        with wins_lock:
+                            wins[request_id].append(action)
+
+        self.race(worker)
+
+        for service_request in ServiceRequest.objects.filter(id__in=self.request_ids):
+            actions = wins[service_request.id]
+            self.assertIn(sorted(actions), [['reject'], ['accept', 'complete'], ['accept', 'complete', 'start']])
+            self.assertEqual(service_request.version, len(actions))
+            self.assertEqual(service_request.status, 'cancelled' if actions == ['reject'] else 'completed')
+        stored = ProviderStats.objects.filter(provider=self.provider).values(*counters.COUNTER_FIELDS).get()
+        self.assertEqual(stored, counters.compute([self.provider.id])[self.provider.id])
+
+    def test_bulk_updates_notice_a_changed_status(self):
+        ServiceRequest.objects.filter(id__in=self.request_ids).update(status='accepted')
+        counters.rebuild([self.provider.id])
+
+        def worker(number):
+            # Half the threads complete everything in bulk while the others start requests one by one
+            if number % 2:
+                for _ in range(3):
+                    try:
+                        workflow.bulk_apply(self.provider.id, 'complete', self.request_ids)
+                    except workflow.ConcurrentUpdate:
+                        pass
+            else:
+                for request_id in self.request_ids:
+                    workflow.apply(ServiceRequest.objects.get(id=request_id), 'start')
+
+        # The bulk path reads, then writes in one transaction; as in the
+        # production profile, writers queue for the lock instead of failing
+        with mock.patch.dict(connection.settings_dict['OPTIONS'], transaction_mode='IMMEDIATE'):
+            self.race(worker)
+
+        for service_request in ServiceRequest.objects.filter(id__in=self.request_ids):
+            events = list(service_request.events.order_by('id').values_list('from_status', 'to_status'))
+            self.assertEqual(service_request.status, 'completed')
+            # Every logged change starts from where the previous one ended
+            self.assertEqual(
+                [from_status for from_status, _ in events],
+                ['accepted'] + [to_status for _, to_status in events[:-1]],
+            )
+            self.assertEqual(service_request.version, len(events))
+        stored = ProviderStats.objects.filter(provider=self.provider).values(*counters.COUNTER_FIELDS).get()
+        self.assertEqual(stored, counters.compute([self.provider.id])[self.provider.id])
+
+
+class KeysetPaginationTests(LargeFixtureMixin, TestCase):
+
+    def walk(self, url, params, items_key, cursor_key):
+        seen = []
+        cursor = None
+        while True:
+            query = dict(params, cursor=cursor) if cursor else params
+            context = self.client.get(url, query).context
+            seen.extend(item.id for item in context[items_key])
+            cursor = context[cursor_key]
+            if not cursor:
+                return seen
+
+    def test_my_bookings_pages_cover_every_request_once(self):
+        self.client.force_login(self.customer)
+        seen = self.walk(reverse('my_bookings'), {'tab': 'all'}, 'bookings', 'next_cursor')
+        expected = ServiceRequest.objects.filter(customer=self.customer).order_by('-created_at', '-id')
+        self.assertEqual(seen, list(expected.values_list('id', flat=True)))
+
+    def test_my_bookings_tab_filters_by_status(self):
+        self.client.force_login(self.customer)
+        seen = self.walk(reverse('my_bookings'), {'tab': 'active'}, 'bookings', 'next_cursor')
+        statuses = set(ServiceRequest.objects.filter(id__in=seen).values_list('status', flat=True))
+        self.assertEqual(statuses, {'accepted', 'in_progress'})
+
+    def test_provider_dashboard_pages_cover_every_request_once(self):
+        self.client.force_login(self.provider.user)
+        seen = self.walk(reverse('provider_dashboard'), {}, 'service_requests', 'requests_cursor')
+        expected = ServiceRequest.objects.filter(provider=self.provider).order_by('-created_at', '-id')
+        self.assertEqual(seen, list(expected.values_list('id', flat=True)))
+
+    def test_invalid_cursor_starts_from_the_newest(self):
+        self.client.force_login(self.customer)
+        first = self.client.get(reverse('my_bookings')).context['bookings']
+        response = self.client.get(reverse('my_bookings'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.context['bookings'], first)
+
+
+class ProviderStatsTests(LargeFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # The fixture's bulk inserts bypass the signals, as bulk loads do
+        counters.rebuild([cls.provider.id])
+
+    def assertStatsAccurate(self, provider):
+        stored = ProviderStats.objects.filter(provider=provider).values(*counters.COUNTER_FIELDS).get()
+        self.assertEqual(stored, counters.compute([provider.id])[provider.id])
+
+    def test_counters_follow_request_lifecycle(self):
+        self.client.force_login(self.customer)
+        self.client.post(
+            reverse('create_service_request', args=[self.provider.id, self.towing.id]),
+            {'customer_name': 'Customer', 'customer_phone': '555', 'customer_location': 'Exit 4'},
+        )
+        self.assertStatsAccurate(self.provider)
+
+        service_request = ServiceRequest.objects.filter(provider=self.provider, status='pending').latest('id')
+        self.client.force_login(self.provider.user)
+        for action in ['accept', 'complete']:
+            self.client.post(reverse('update_service_request', args=[service_request.id]), {'action': action})
+            self.assertStatsAccurate(self.provider)
+
+    def test_counters_follow_booking_and_service_changes(self):
+        booking = Booking.objects.filter(service__provider=self.provider).first()
+        booking.status = 'completed'
+        booking.save()
+        self.assertStatsAccurate(self.provider)
+
+        booking.delete()
+        Service.objects.create(
+            provider=self.provider, category=self.towing, title='Jump', description='Jump',
+            price=20, duration=15,
+        )
+        self.provider.service_categories.remove(self.towing)
+        self.assertStatsAccurate(self.provider)
+
+    def test_deleting_a_provider_with_services_and_bookings(self):
+        self.assertTrue(Booking.objects.filter(service__provider=self.provider, status='pending').exists())
+        self.client.force_login(self.staff)
+        response = self.client.post(
+            reverse('admin_dashboard'), {'reject_provider': '1', 'provider_id': self.provider.id}, follow=True
+        )
+        self.assertContains(response, 'Provider request has been rejected and removed.')
+        self.assertFalse(ServiceProvider.objects.filter(id=self.provider.id).exists())
+        self.assertFalse(ProviderStats.objects.filter(provider_id=self.provider.id).exists())
+
+        # Through the user, as the admin deletes accounts
+        other = ServiceProvider.objects.exclude(id=self.provider.id).select_related('user').first()
+        service = Service.objects.create(
+            provider=other, category=self.towing, title='Tow', description='Tow', price=50, duration=60,
+        )
+        Booking.objects.create(service=service, customer=self.customer, booking_date=timezone.now())
+        other.user.delete()
+        self.assertFalse(ProviderStats.objects.filter(provider_id=other.id).exists())
+
+    def test_deleting_a_customer_releases_their_bookings(self):
+        customer = User.objects.create(username='short-lived')
+        service = Service.objects.filter(provider=self.provider).first()
+        Booking.objects.create(service=service, customer=customer, booking_date=timezone.now())
+        active = ProviderStats.objects.get(provider=self.provider).active_bookings
+
+        customer.delete()
+        self.assertEqual(ProviderStats.objects.get(provider=self.provider).active_bookings, active - 1)
+        self.assertStatsAccurate(self.provider)
+
+    def test_deleting_requests_releases_their_counters(self):
+        customer = User.objects.create(username='short-lived')
+        for status in ['pending', 'accepted', 'completed']:
+            ServiceRequest.objects.create(
+                provider=self.provider, customer=customer, service_category=self.towing, status=status,
+                customer_name='Customer', customer_phone='555', customer_location='Exit 4',
+            )
+        counters.rebuild([self.provider.id])
+        before = ProviderStats.objects.get(provider=self.provider)
+
+        # As the admin deletes a single request
+        ServiceRequest.objects.filter(customer=customer, status='accepted').get().delete()
+        self.assertEqual(ProviderStats.objects.get(provider=self.provider).active_requests, before.active_requests - 1)
+
+        customer.delete()
+        after = ProviderStats.objects.get(provider=self.provider)
+        self.assertEqual(after.pending_requests, before.pending_requests - 1)
+        self.assertStatsAccurate(self.provider)
+
+    def test_reconcile_repairs_drift(self):
+        ProviderStats.objects.filter(provider=self.provider).update(pending_requests=999)
+
+        output = StringIO()
+        call_command('reconcile_provider_stats', dry_run=True, stdout=output)
+        self.assertIn('found drift on', output.getvalue())
+        self.assertEqual(ProviderStats.objects.get(provider=self.provider).pending_requests, 999)
+
+        call_command('reconcile_provider_stats', stdout=StringIO())
+        self.assertStatsAccurate(self.provider)
+        self.assertEqual(ProviderStats.objects.count(), ServiceProvider.objects.count())
+
+
+class StatusEventTests(LargeFixtureMixin, TestCase):
+
+    def test_status_changes_are_logged(self):
+        self.client.force_login(self.customer)
+        self.client.post(
+            reverse('create_service_request', args=[self.provider.id, self.towing.id]),
+            {'customer_name': 'Customer', 'customer_phone': '555', 'customer_location': 'Exit 4'},
+        )
+        service_request = ServiceRequest.objects.filter(provider=self.provider).latest('id')
+        self.client.force_login(self.provider.user)
+        for action in ['accept', 'start', 'complete']:
+            self.client.post(reverse('update_service_request', args=[service_request.id]), {'action': action})
+
+        self.assertEqual(
+            list(service_request.events.values_list('from_status', 'to_status', 'provider_id', 'category_id')),
+            [
+                ('', 'pending', self.provider.id, self.towing.id),
+                ('pending', 'accepted', self.provider.id, self.towing.id),
+                ('accepted', 'in_progress', self.provider.id, self.towing.id),
+                ('in_progress', 'completed', self.provider.id, self.towing.id),
+            ],
+        )
+
+    def test_bulk_changes_log_one_event_per_request(self):
+        pending = list(
+            ServiceRequest.objects.filter(provider=self.provider, status='pending').values_list('id', flat=True)
+        )
+        workflow.bulk_apply(self.provider.id, 'accept', pending)
+        self.assertEqual(
+            sorted(RequestEvent.objects.filter(to_status='accepted').values_list('service_request_id', flat=True)),
+            sorted(pending),
+        )
+
+    def test_booking_status_changes_are_logged(self):
+        booking = Booking.objects.filter(service__provider=self.provider).first()
+        booking.status = 'confirmed'
+        booking.save()
+        booking.save()
+        self.assertEqual(
+            list(BookingEvent.objects.filter(booking=booking).values_list('from_status', 'to_status', 'provider_id')),
+            [('pending', 'confirmed', self.provider.id)],
+        )
+
+    def test_event_log_is_append_only_in_the_admin(self):
+        model_admin = RequestEventAdmin(RequestEvent, admin.site)
+        request = RequestFactory().get('/')
+        request.user = self.staff
+        event = RequestEvent.for_change(ServiceRequest.objects.first(), 'pending', 'accepted')
+        event.save()
+        self.assertTrue(model_admin.has_view_permission(request, event))
+        self.assertFalse(model_admin.has_add_permission(request))
+        self.assertFalse(model_admin.has_change_permission(request, event))
+        self.assertFalse(model_admin.has_delete_permission(request, event))
+        self.assertNotIn('delete_selected', model_admin.get_actions(request))
+
+    def test_sla_report_reads_the_log_through_its_indexes(self):
+        created_since = RequestEvent.objects.filter(from_status='', created_at__gte=timezone.now()).values('service_request_id')
+        plan = RequestEvent.objects.filter(
+            service_request_id__in=created_since, created_at__gte=timezone.now()
+        ).order_by('service_request_id', 'created_at', 'id').explain()
+        self.assertIn('event_created_idx', plan)
+        self.assertIn('SEARCH app1_requestevent USING INDEX event_request_created_idx', plan)
+
+    def test_sla_report(self):
+        created = timezone.now() - timedelta(hours=2)
+        requests = ServiceRequest.objects.filter(provider=self.provider)[:4]
+        RequestEvent.objects.bulk_create(
+            RequestEvent(
+                service_request=service_request,
+                provider_id=self.provider.id,
+                category_id=self.towing.id,
+                from_status=from_status,
+                to_status=to_status,
+                created_at=created + timedelta(minutes=offset * (i + 1)),
+            )
+            for i, service_request in enumerate(requests)
+            for from_status, to_status, offset in [
+                ('', 'pending', 0), ('pending', 'accepted', 5), ('accepted', 'completed', 20),
+            ]
+        )
+
+        output = StringIO()
+        call_command('request_sla', group_by='category', percentiles='50,100', stdout=output)
+        row = next(line for line in output.getvalue().splitlines() if 'accept ' in line)
+        # Accepted after 5, 10, 15 and 20 minutes
+        self.assertEqual(row.split()[-3:], ['4', '10m00s', '20m00s'])
+        self.assertIn('Towing Service', row)
+
+    def test_sla_report_charges_providers_from_their_offer(self):
+        service_request, first_batch = dispatch.create_dispatched_request(
+            self.customer, self.towing, customer_name='Stranded', latitude=40.05, longitude=-73.95,
+        )
+        # Nobody in the first batch answers
+        self.assertTrue(dispatch.redispatch(service_request))
+        offer = service_request.offers.filter(status='offered').select_related('provider').first()
+        self.assertTrue(dispatch.accept(service_request.id, offer.provider))
+
+        created = timezone.now() - timedelta(hours=2)
+        service_request.events.filter(to_status='pending').update(created_at=created)
+        service_request.events.filter(to_status='accepted').update(created_at=created + timedelta(minutes=35))
+        RequestOffer.objects.filter(id=offer.id).update(created_at=created + timedelta(minutes=30))
+
+        def accept_row(group_by, name):
+            output = StringIO()
+            call_command('request_sla', group_by=group_by, percentiles='100', stdout=output)
+            return next(line for line in output.getvalue().splitlines() if line.startswith(name)).split()[-2:]
+
+        self.assertEqual(accept_row('provider', offer.provider.company_name), ['1', '5m00s'])
+        # The customer still waited the whole time
+        self.assertEqual(accept_row('category', 'Towing Service'), ['1', '35m00s'])
+
+
+class IdempotentSubmissionTests(LargeFixtureMixin, TestCase):
+
+    def submit(self, category=None, **data):
+        category = category or self.towing
+        return self.client.post(
+            reverse('create_service_request', args=[self.provider.id, category.id]),
+            {'customer_name': 'Customer', 'customer_phone': '555', 'customer_location': 'Exit 4', **data},
+        )
+
+    def assertRepeated(self, response):
+        self.assertIn('was already sent', ' '.join(str(message) for message in get_messages(response.wsgi_request)))
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+        self.before = ServiceRequest.objects.count()
+
+    def test_replayed_key_returns_the_original_request(self):
+        self.submit(submission_key='abc123')
+        with self.settings(DUPLICATE_REQUEST_WINDOW=0):
+            response = self.submit(submission_key='abc123')
+        self.assertRepeated(response)
+        self.assertEqual(ServiceRequest.objects.count(), self.before + 1)
+        self.assertEqual(SubmissionKey.objects.get().service_request.customer, self.customer)
+
+    def test_near_duplicate_without_a_key_is_not_created(self):
+        self.submit()
+        self.submit(submission_key=idempotency.new_key())
+        self.assertEqual(ServiceRequest.objects.count(), self.before + 1)
+
+        self.submit(category=self.categories[1])
+        self.assertEqual(ServiceRequest.objects.count(), self.before + 2)
+
+    def test_near_duplicate_window_expires(self):
+        self.submit()
+        ServiceRequest.objects.filter(customer=self.customer).update(created_at=timezone.now() - timedelta(hours=1))
+        self.submit()
+        self.assertEqual(ServiceRequest.objects.count(), self.before + 2)
+
+    def test_concurrent_copy_loses_on_the_unique_key(self):
+        self.submit(submission_key='abc123')
+        original = SubmissionKey.objects.get().service_request
+        # As if the copy checked for the key before the first one committed
+        with mock.patch.object(idempotency, 'find_existing', return_value=(None, 'abc123')):
+            response = self.submit(submission_key='abc123')
+        self.assertRepeated(response)
+        self.assertEqual(ServiceRequest.objects.count(), self.before + 1)
+        self.assertEqual(original.events.count(), 1)
+
+    def test_same_key_for_another_provider_is_a_new_request(self):
+        # The shared provider modal, submitted for one provider and then another
+        other = ServiceProvider.objects.filter(is_approved=True).exclude(id=self.provider.id).first()
+        self.submit(submission_key='abc123')
+        response = self.client.post(
+            reverse('create_service_request', args=[other.id, self.towing.id]),
+            {'customer_name': 'Customer', 'customer_phone': '555', 'customer_location': 'Exit 4',
+             'submission_key': 'abc123'},
+        )
+        self.assertIn('Service request sent to', ' '.join(str(message) for message in get_messages(response.wsgi_request)))
+        self.assertEqual(ServiceRequest.objects.count(), self.before + 2)
+        self.assertTrue(ServiceRequest.objects.filter(provider=other, customer=self.customer).exists())
+
+        # The key keeps answering for the first provider
+        with self.settings(DUPLICATE_REQUEST_WINDOW=0):
+            self.assertRepeated(self.submit(submission_key='abc123'))
+        self.assertEqual(ServiceRequest.objects.count(), self.before + 2)
+
+    def test_service_page_renders_a_key_per_form(self):
+        response = self.client.get(reverse('service_detail', args=[self.towing.slug]))
+        self.assertNotEqual(response.context['submission_key'], response.context['dispatch_submission_key'])
+
+    def test_dispatch_form_is_idempotent(self):
+        for _ in range(2):
+            self.client.post(
+                reverse('dispatch_service_request', args=[self.towing.id]),
+                {'customer_name': 'Customer', 'customer_phone': '555', 'customer_location': 'Exit 4',
+                 'latitude': '40.05', 'longitude': '-73.95', 'submission_key': 'xyz'},
+            )
+        self.assertEqual(ServiceRequest.objects.filter(is_dispatched=True).count(), 1)
+
+    def test_purge_deletes_expired_keys(self):
+        self.submit(submission_key='old')
+        self.submit(category=self.categories[1], submission_key='new')
+        SubmissionKey.objects.filter(key='old').update(created_at=timezone.now() - timedelta(days=2))
+        output = StringIO()
+        call_command('purge_submission_keys', batch_size=1, stdout=output)
+        self.assertIn('Deleted 1 expired', output.getvalue())
+        self.assertEqual(list(SubmissionKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class DatabaseProfileTests(TransactionTestCase):
+
+    def test_production_profile_configures_each_connection(self):
+        path = settings.BASE_DIR / 'test_profile.sqlite3'
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict, 'NAME': path, **database.profile('production')
+        }, alias='profile')
+        try:
+            with wrapper.cursor() as cursor:
+                for pragma, expected in [('journal_mode', 'wal'), ('synchronous', 1), ('busy_timeout', 5000)]:
+                    cursor.execute(f'PRAGMA {pragma}')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+            self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+        finally:
+            wrapper.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(f'{path}{suffix}'):
+                    os.remove(f'{path}{suffix}')
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database.profile('fast')
+
+    def test_write_benchmark_runs(self):
+        output = StringIO()
+        call_command('benchmark_sqlite_writes', threads=2, transactions=5, readers=1, stdout=output)
+        self.assertEqual(output.getvalue().count(' 0 failed in'), len(database.PROFILES))
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+@override_settings(LIVE_FEED_BROKER='app1.tests.RecordingBroker')
+class LiveFeedPublishTests(LargeFixtureMixin, TestCase):
+
+    def setUp(self):
+        live.get_broker.cache_clear()
+        self.addCleanup(live.get_broker.cache_clear)
+
+    def test_new_request_is_published_to_its_provider(self):
+        self.client.force_login(self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('create_service_request', args=[self.provider.id, self.towing.id]),
+                {'customer_name': 'Stranded', 'customer_location': 'Exit 4'},
+            )
+        channel, message = live.get_broker().published[-1]
+        self.assertEqual(channel, live.provider_channel(self.provider.id))
+        self.assertEqual(
+            (message['event'], message['status'], message['customer_name'], message['category']),
+            ('request', 'pending', 'Stranded', 'Towing Service'),
+        )
+
+    def test_accepting_a_dispatched_request_withdraws_the_other_offers(self):
+        service_request, offers = dispatch.create_dispatched_request(
+            self.customer, self.towing, customer_name='Stranded', latitude=40.05, longitude=-73.95,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch.accept(service_request.id, offers[0].provider)
+        withdrawn = {channel for channel, message in live.get_broker().published if message['event'] == 'withdrawn'}
+        self.assertEqual(withdrawn, {live.provider_channel(offer.provider_id) for offer in offers[1:]})
+
+
+@override_settings(LIVE_FEED_BROKER='app1.tests.RecordingBroker')
+class DispatchTests(LargeFixtureMixin, TestCase):
+
+    def setUp(self):
+        live.get_broker.cache_clear()
+        self.addCleanup(live.get_broker.cache_clear)
+        self.service_request, self.offers = dispatch.create_dispatched_request(
+            self.customer, self.towing, customer_name='Stranded', latitude=40.05, longitude=-73.95,
+        )
+
+    def offer_statuses(self):
+        return dict(self.service_request.offers.values_list('provider_id', 'status'))
+
+    def test_offers_go_to_the_nearest_providers(self):
+        self.assertEqual(len(self.offers), settings.DISPATCH_BATCH_SIZE)
+        nearest = ServiceProvider.objects.available(self.towing).nearest(40.05, -73.95, k=settings.DISPATCH_BATCH_SIZE)
+        self.assertEqual([offer.provider_id for offer in self.offers], [provider.id for provider in nearest])
+        self.assertEqual([offer.rank for offer in self.offers], list(range(settings.DISPATCH_BATCH_SIZE)))
+
+    def test_providers_without_a_location_fill_the_batch(self):
+        ServiceProvider.objects.exclude(id=self.provider.id).update(latitude=None, longitude=None, geohash='')
+        service_request, offers = dispatch.create_dispatched_request(
+            self.customer, self.categories[1], customer_name='Stranded', latitude=40.05, longitude=-73.95,
+        )
+        located = [offer.provider_id for offer in offers if offer.distance_km is not None]
+        unlocated = ServiceProvider.objects.available(self.categories[1]).filter(geohash='').order_by('id')
+        self.assertEqual(len(offers), settings.DISPATCH_BATCH_SIZE)
+        self.assertEqual(located, [self.provider.id])
+        self.assertEqual(
+            [offer.provider_id for offer in offers[1:]],
+            list(unlocated.values_list('id', flat=True)[:settings.DISPATCH_BATCH_SIZE - 1]),
+        )
+
+    def test_offers_are_queued_as_notifications(self):
+        queued = Notification.objects.filter(event='request_offered', channel='email')
+        self.assertEqual(
+            sorted(queued.values_list('recipient', flat=True)),
+            sorted(offer.provider.user.email for offer in self.offers),
+        )
+        self.assertEqual({notification.data['request'] for notification in queued}, {self.service_request.id})
+
+    def test_first_accept_wins(self):
+        first, second = self.offers[0].provider, self.offers[1].provider
+        self.assertTrue(dispatch.accept(self.service_request.id, first))
+        self.assertFalse(dispatch.accept(self.service_request.id, second))
+
+        self.service_request.refresh_from_db()
+        self.assertEqual((self.service_request.provider_id, self.service_request.status), (first.id, 'accepted'))
+        self.assertEqual(self.offer_statuses(), {
+            first.id: 'accepted',
+            **{offer.provider_id: 'withdrawn' for offer in self.offers[1:]},
+        })
+        self.assertEqual(self.service_request.events.filter(to_status='accepted').count(), 1)
+
+    def test_only_offered_providers_can_accept(self):
+        stranger = ServiceProvider.objects.available(self.towing).exclude(
+            id__in=[offer.provider_id for offer in self.offers]
+        ).first()
+        self.assertFalse(dispatch.accept(self.service_request.id, stranger))
+        self.assertTrue(dispatch.decline(self.service_request.id, self.offers[0].provider))
+        self.assertFalse(dispatch.accept(self.service_request.id, self.offers[0].provider))
+        self.assertIsNone(ServiceRequest.objects.get(id=self.service_request.id).provider_id)
+
+    def test_declines_offer_the_next_ranked_batch(self):
+        first_batch = [offer.provider_id for offer in self.offers]
+        for offer in self.offers[:-1]:
+            dispatch.decline(self.service_request.id, offer.provider)
+        self.assertEqual(self.service_request.offers.count(), len(first_batch))
+
+        dispatch.decline(self.service_request.id, self.offers[-1].provider)
+        next_batch = list(self.service_request.offers.filter(status='offered').order_by('rank'))
+        expected = ServiceProvider.objects.available(self.towing).exclude(id__in=first_batch).nearest(
+            40.05, -73.95, k=settings.DISPATCH_BATCH_SIZE
+        )
+        self.assertEqual([offer.provider_id for offer in next_batch], [provider.id for provider in expected])
+        self.assertEqual(next_batch[0].rank, len(first_batch))
+        self.assertFalse(dispatch.decline(self.service_request.id, self.offers[0].provider))
+
+    def test_redispatch_withdraws_open_offers(self):
+        self.assertTrue(dispatch.redispatch(self.service_request))
+        statuses = self.offer_statuses()
+        self.assertEqual({statuses[offer.provider_id] for offer in self.offers}, {'withdrawn'})
+        self.assertEqual(list(statuses.values()).count('offered'), settings.DISPATCH_BATCH_SIZE)
+        self.assertEqual(ServiceRequest.objects.get(id=self.service_request.id).redispatch_count, 1)
+
+        stale = ServiceRequest.objects.get(id=self.service_request.id)
+        stale.version -= 1
+        self.assertFalse(dispatch.redispatch(stale))
+
+
+@override_settings(LIVE_FEED_BROKER='app1.tests.RecordingBroker')
+class ExpiryTests(LargeFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        counters.rebuild([cls.provider.id])
+
+    def setUp(self):
+        live.get_broker.cache_clear()
+        self.addCleanup(live.get_broker.cache_clear)
+        self.service_request = ServiceRequest.objects.filter(
+            provider=self.provider, service_category=self.towing, status='pending'
+        ).first()
+
+    def make_stale(self, service_request, minutes=60):
+        ServiceRequest.objects.filter(id=service_request.id).update(
+            updated_at=timezone.now() - timedelta(minutes=minutes)
+        )
+
+    def run_expiry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return expiry.run(batch_size=2)
+
+    def test_stale_request_is_offered_to_other_providers(self):
+        self.make_stale(self.service_request)
+        totals = self.run_expiry()
+        self.assertEqual(totals[self.towing], {expiry.REDISPATCHED: 1, expiry.EXPIRED: 0})
+
+        self.service_request.refresh_from_db()
+        self.assertEqual(
+            (self.service_request.status, self.service_request.provider_id, self.service_request.redispatch_count),
+            ('pending', None, 1),
+        )
+        offers = dict(self.service_request.offers.values_list('provider_id', 'status'))
+        self.assertEqual(offers.pop(self.provider.id), 'withdrawn')
+        self.assertEqual(set(offers.values()), {'offered'})
+        self.assertEqual(len(offers), settings.DISPATCH_BATCH_SIZE)
+        stored = ProviderStats.objects.filter(provider=self.provider).values(*counters.COUNTER_FIELDS).get()
+        self.assertEqual(stored, counters.compute([self.provider.id])[self.provider.id])
+        self.assertIn(
+            (live.provider_channel(self.provider.id), {'event': 'withdrawn', 'id': self.service_request.id}),
+            live.get_broker().published,
+        )
+
+        # Fresh again until the next timeout passes
+        self.assertEqual(self.run_expiry()[self.towing], {expiry.REDISPATCHED: 0, expiry.EXPIRED: 0})
+
+    def test_category_timeout_overrides_the_default(self):
+        ServiceCategory.objects.filter(id=self.towing.id).update(pending_timeout=120)
+        self.make_stale(self.service_request, minutes=60)
+        totals = self.run_expiry()
+        self.assertFalse(any(any(counts.values()) for counts in totals.values()))
+
+    def test_request_expires_after_the_last_round(self):
+        ServiceRequest.objects.filter(id=self.service_request.id).update(redispatch_count=settings.REDISPATCH_ROUNDS)
+        self.make_stale(self.service_request)
+        self.run_expiry()
+
+        self.service_request.refresh_from_db()
+        self.assertEqual(self.service_request.status, 'expired')
+        self.assertTrue(self.service_request.events.filter(from_status='pending', to_status='expired').exists())
+        self.assertIn(
+            (live.request_channel(self.service_request.id),
+             {'event': 'status', 'id': self.service_request.id, 'status': 'expired'}),
+            live.get_broker().published,
+        )
+        self.assertEqual(
+            ProviderStats.objects.get(provider=self.provider).pending_requests,
+            counters.compute([self.provider.id])[self.provider.id]['pending_requests'],
+        )
+
+    def test_request_without_a_category_expires(self):
+        ServiceRequest.objects.filter(id=self.service_request.id).update(service_category=None)
+        self.make_stale(self.service_request, minutes=settings.PENDING_REQUEST_TIMEOUT - 1)
+        self.assertEqual(self.run_expiry()[None], {expiry.REDISPATCHED: 0, expiry.EXPIRED: 0})
+
+        self.make_stale(self.service_request, minutes=settings.PENDING_REQUEST_TIMEOUT + 1)
+        output = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('expire_pending_requests', batch_size=2, verbosity=2, stdout=output)
+        self.assertIn('No category: 0 re-offered, 1 expired', output.getvalue())
+        self.service_request.refresh_from_db()
+        self.assertEqual((self.service_request.status, self.service_request.redispatch_count), ('expired', 0))
+
+    def test_request_expires_when_nobody_is_left_to_ask(self):
+        niche = ServiceCategory.objects.create(name='Boat Towing', slug='boat-towing')
+        ServiceRequest.objects.filter(id=self.service_request.id).update(service_category=niche)
+        self.make_stale(self.service_request)
+        self.assertEqual(self.run_expiry()[niche], {expiry.REDISPATCHED: 0, expiry.EXPIRED: 1})
+
+        self.service_request.refresh_from_db()
+        # The attempt to re-offer it was rolled back whole
+        self.assertEqual((self.service_request.provider_id, self.service_request.redispatch_count), (self.provider.id, 0))
+        self.assertFalse(RequestOffer.objects.filter(service_request=self.service_request).exists())
+
+    def test_stale_requests_are_found_through_the_index(self):
+        plan = ServiceRequest.objects.filter(
+            status='pending', service_category=self.towing, updated_at__lt=timezone.now()
+        ).order_by('updated_at', 'id').explain()
+        self.assertIn('request_stale_idx', plan)
+
+    def test_command(self):
+        self.make_stale(self.service_request)
+        output = StringIO()
+        call_command('expire_pending_requests', stdout=output)
+        self.assertIn('Re-offered 1 and expired 0 requests', output.getvalue())
+
+
+class FailingTransport:
+    def send(self, recipient, notifications):
+        raise ConnectionError('mail server unreachable')
+
+
+class NotificationTests(LargeFixtureMixin, TestCase):
+
+    def setUp(self):
+        notifications.get_transport.cache_clear()
+        self.addCleanup(notifications.get_transport.cache_clear)
+
+    def test_new_request_only_writes_the_outbox(self):
+        self.client.force_login(self.customer)
+        with self.settings(NOTIFICATION_WEBHOOK_URL='https://hooks.example.com/roadmate'):
+            self.client.post(
+                reverse('create_service_request', args=[self.provider.id, self.towing.id]),
+                {'customer_name': 'Customer', 'customer_phone': '555', 'customer_location': 'Exit 4'},
+            )
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(
+            set(Notification.objects.values_list('event', 'channel', 'recipient', 'status')),
+            {
+                ('request_created', 'email', 'provider0@example.com', 'pending'),
+                ('request_created', 'sms', '555-0100', 'pending'),
+                ('request_created', 'webhook', 'https://hooks.example.com/roadmate', 'pending'),
+            },
+        )
+
+    def test_status_change_tells_the_customer(self):
+        service_request = ServiceRequest.objects.filter(provider=self.provider, status='pending').first()
+        self.client.force_login(self.provider.user)
+        self.client.post(reverse('update_service_request', args=[service_request.id]), {'action': 'accept'})
+        self.assertEqual(
+            set(Notification.objects.values_list('event', 'channel', 'recipient')),
+            {('request_accepted', 'email', 'customer@example.com'), ('request_accepted', 'sms', '555-0199')},
+        )
+
+        # A refused change tells nobody
+        self.client.post(reverse('update_service_request', args=[service_request.id]), {'action': 'accept'})
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_channel_without_a_transport_is_not_written(self):
+        with self.settings(NOTIFICATION_TRANSPORTS={'email': 'app1.notifications.EmailTransport'}):
+            built = notifications.status_changed(1, 'completed', 'customer@example.com', '555-0199')
+        self.assertEqual([notification.channel for notification in built], ['email'])
+
+    def test_worker_sends_one_email_per_recipient(self):
+        notifications.enqueue(
+            notifications.status_changed(1, 'accepted', 'customer@example.com', '')
+            + notifications.status_changed(2, 'accepted', 'customer@example.com', '')
+            + notifications.status_changed(3, 'completed', 'other@example.com', '555-0101')
+        )
+        output = StringIO()
+        call_command('send_notifications', workers=2, stdout=output)
+
+        self.assertIn('Sent 4, will retry 0, gave up on 0', output.getvalue())
+        self.assertEqual(
+            sorted((message.to, message.subject) for message in mail.outbox),
+            [
+                (['customer@example.com'], '2 updates from RoadMate'),
+                (['other@example.com'], 'Your service request #3 is completed'),
+            ],
+        )
+        self.assertFalse(Notification.objects.exclude(status='sent').exists())
+
+    def test_claimed_notifications_are_not_claimed_again(self):
+        notifications.enqueue(notifications.status_changed(1, 'accepted', 'customer@example.com', ''))
+        self.assertEqual(len(notifications.claim(10)), 1)
+        self.assertEqual(notifications.claim(10), [])
+        # Unless the worker holding them never reported back
+        self.assertEqual(len(notifications.claim(10, now=timezone.now() + notifications.CLAIM_TIMEOUT * 2)), 1)
+
+    @override_settings(NOTIFICATION_TRANSPORTS={'email': 'app1.tests.FailingTransport'})
+    def test_failed_send_backs_off_then_gives_up(self):
+        notifications.enqueue(notifications.status_changed(1, 'accepted', 'customer@example.com', ''))
+        now = timezone.now()
+        self.assertEqual(notifications.send_due(now=now), {notifications.RETRY: 1})
+        notification = Notification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), ('pending', 1))
+        self.assertIn('mail server unreachable', notification.last_error)
+        self.assertGreaterEqual(notification.next_attempt_at, now + timedelta(seconds=settings.NOTIFICATION_RETRY_DELAY))
+        self.assertEqual(notifications.send_due(now=now), {})
+
+        later = now
+        for attempt in range(2, settings.NOTIFICATION_MAX_ATTEMPTS + 1):
+            later += notifications.MAX_RETRY_DELAY
+            notifications.send_due(now=later)
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('failed', settings.NOTIFICATION_MAX_ATTEMPTS))
+        self.assertEqual(notifications.send_due(now=later + notifications.MAX_RETRY_DELAY), {})
+
+    def test_retry_delay_doubles_up_to_the_cap(self):
+        delays = [notifications.retry_delay(attempts).total_seconds() for attempts in (1, 2, 3)]
+        self.assertEqual(delays, [settings.NOTIFICATION_RETRY_DELAY * factor for factor in (1, 2, 4)])
+        self.assertEqual(notifications.retry_delay(50), notifications.MAX_RETRY_DELAY)
+
+
+class ProviderApprovalTests(LargeFixtureMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.pending_ids = list(ServiceProvider.objects.filter(is_approved=False).order_by('id').values_list('id', flat=True))
+        User.objects.filter(service_provider__id__in=self.pending_ids).update(is_active=False)
+
+    def assertApproved(self, usernames):
+        approved = ServiceProvider.objects.filter(id__in=self.pending_ids, is_approved=True, user__is_active=True)
+        self.assertEqual(set(approved.values_list('user__username', flat=True)), set(usernames))
+
+    def test_approve_is_set_based(self):
+        selected = ServiceProvider.objects.filter(id__in=self.pending_ids[:5])
+        # savepoint, read, providers, users, their categories, notifications, release
+        with self.assertNumQueries(7), self.captureOnCommitCallbacks(execute=True):
+            approved = selected.approve()
+        self.assertEqual(len(approved), 5)
+        self.assertApproved([provider.user.username for provider in approved])
+        self.assertEqual(
+            Notification.objects.filter(event='provider_approved', channel='email').count(), 5
+        )
+        self.assertEqual(selected.approve(), [])
+
+    def test_approval_drops_cached_listings(self):
+        self.assertNotContains(self.client.get(reverse('service_detail', args=['towing'])), 'Company 200<')
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceProvider.objects.filter(user__username='provider200').approve()
+        self.assertContains(self.client.get(reverse('service_detail', args=['towing'])), 'Company 200<')
+
+    def test_command_approves_usernames_and_csv_rows(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csv_file:
+            csv_file.write('Email,company\nprovider202@example.com,Company 202\nnobody@example.com,None\n')
+        self.addCleanup(os.remove, csv_file.name)
+        output = StringIO()
+        call_command('approve_provider', 'provider200', 'provider201', 'ghost', csv=csv_file.name, stdout=output)
+
+        self.assertIn('Provider "ghost" not found', output.getvalue())
+        self.assertIn('Provider "nobody@example.com" not found', output.getvalue())
+        self.assertIn('Approved 3 providers', output.getvalue())
+        self.assertApproved(['provider200', 'provider201', 'provider202'])
+
+    def test_command_filters(self):
+        fuel = self.categories[1]
+        output = StringIO()
+        call_command('approve_provider', category=fuel.slug, all_pending=True, dry_run=True, stdout=output)
+        self.assertIn('8 providers would be approved', output.getvalue())
+        self.assertApproved([])
+
+        call_command('approve_provider', category=fuel.slug, email_domain='example.com', stdout=output)
+        self.assertApproved(
+            ServiceProvider.objects.filter(id__in=self.pending_ids, service_categories=fuel)
+            .values_list('user__username', flat=True)
+        )
+
+        with self.assertRaises(CommandError):
+            call_command('approve_provider', stdout=output)
+
+    def test_admin_action(self):
+        model_admin = ServiceProviderAdmin(ServiceProvider, admin.site)
+        request = RequestFactory().post('/')
+        with mock.patch.object(model_admin, 'message_user') as message_user:
+            model_admin.approve_selected(request, ServiceProvider.objects.filter(id__in=self.pending_ids[:3]))
+        message_user.assert_called_once_with(request, '3 provider(s) approved.')
+        self.assertApproved(['provider200', 'provider201', 'provider202'])
+
+    def test_dashboard_approves_the_selection(self):
+        self.client.force_login(self.staff)
+        selected = self.pending_ids[:2]
+        self.client.post(reverse('admin_dashboard'), {'approve_providers': '', 'provider_ids': selected})
+        self.assertApproved(['provider200', 'provider201'])
+
+        self.client.post(reverse('admin_dashboard'), {'approve_provider': '', 'provider_id': self.pending_ids[2]})
+        self.assertApproved(['provider200', 'provider201', 'provider202'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportProvidersTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = ServiceCategory.objects.bulk_create(
+            ServiceCategory(name=name, slug=slug, icon=icon) for name, slug, icon in CATEGORIES
+        )
+        categories.invalidate()
+        User.objects.create(username='taken', email='taken@example.com')
+
+    def setUp(self):
+        cache.clear()
+
+    def write(self, suffix, content):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as source:
+            source.write(content)
+        self.addCleanup(os.remove, source.name)
+        return source.name
+
+    def run_import(self, path, **options):
+        output, errors = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_providers', path, workers=1, stdout=output, stderr=errors, **options)
+        return output.getvalue(), errors.getvalue()
+
+    def test_csv_rows_are_checked_and_imported(self):
+        path = self.write('.csv', (
+            'username,email,company_name,phone_number,categories,password,latitude,longitude\n'
+            'acme,acme@example.com,Acme Towing,555-0101,towing;Fuel Delivery,s3cret,40.7,-74.0\n'
+            'bolt,bolt@example.com,Bolt Tires,555-0102,Tire Change,,,\n'
+            'taken,new@example.com,Dup User,555-0103,towing,,,\n'
+            'copy,acme@example.com,Dup Email,555-0104,towing,,,\n'
+            'odd,odd@example.com,Odd,555-0105,hovercraft,,,\n'
+            'far,far@example.com,Far,555-0106,towing,,95,10\n'
+            'half,half@example.com,Half,555-0107,towing,,40,\n'
+        ))
+        output, errors = self.run_import(path, chunk_size=3)
+
+        self.assertIn('Imported 2 providers, skipped 5 rows', output)
+        self.assertEqual(errors.splitlines(), [
+            'Line 4: This username is already taken.',
+            'Line 5: This email is already registered.',
+            'Line 6: Unknown service category hovercraft.',
+            'Line 7: Latitude must be between -90 and 90.',
+            'Line 8: Enter both latitude and longitude.',
+        ])
+
+        acme = ServiceProvider.objects.get(user__username='acme')
+        self.assertEqual(acme.geohash, acme.compute_geohash())
+        self.assertEqual(set(acme.service_categories.values_list('slug', flat=True)), {'towing', 'fuel-delivery'})
+        self.assertFalse(acme.is_approved or acme.user.is_active)
+        self.assertTrue(acme.user.check_password('s3cret'))
+        self.assertFalse(User.objects.get(username='bolt').has_usable_password())
+        stored = ProviderStats.objects.filter(provider__in=[acme, acme.id + 1]).values('provider_id', *counters.COUNTER_FIELDS)
+        computed = counters.compute([acme.id, acme.id + 1])
+        self.assertEqual({row.pop('provider_id'): row for row in stored}, computed)
+
+    def test_approved_jsonl_import_shows_on_the_service_page(self):
+        self.assertNotContains(self.client.get(reverse('service_detail', args=['towing'])), 'Acme Towing')
+        path = self.write('.jsonl', '\n'.join([
+            json.dumps({'username': 'acme', 'email': 'acme@example.com', 'company_name': 'Acme Towing',
+                        'phone_number': '555-0101', 'categories': 'Towing Service', 'latitude': 40.7, 'longitude': -74}),
+            'not json',
+        ]))
+        output, errors = self.run_import(path, approve=True)
+        self.assertIn('Imported 1 providers, skipped 1 rows', output)
+        self.assertIn('Line 2: Not a JSON object.', errors)
+        self.assertTrue(User.objects.get(username='acme').is_active)
+        self.assertContains(self.client.get(reverse('service_detail', args=['towing'])), 'Acme Towing')
+
+    def test_dry_run_imports_nothing(self):
+        path = self.write('.csv', 'username,email,company_name,phone_number,categories\nacme,acme@example.com,Acme,555,towing\n')
+        output, _ = self.run_import(path, dry_run=True)
+        self.assertIn('1 rows would be imported, 0 have problems', output)
+        self.assertFalse(ServiceProvider.objects.exists())
+
+    def test_uniqueness_is_checked_per_chunk(self):
+        rows = [(line, {'username': f'user{line}', 'email': f'user{line}@example.com', 'company_name': 'Co',
+                        'phone_number': '555', 'categories': 'towing'}) for line in range(200)]
+        lookup = imports.category_lookup()
+        # One for the usernames, one for the emails, however long the chunk
+        with self.assertNumQueries(2):
+            valid, errors = imports.validate(rows, lookup, set(), set())
+        self.assertEqual((len(valid), errors), (200, []))
+
+    def test_passwords_hash_in_a_process_pool(self):
+        pool = imports.password_pool(2)
+        self.addCleanup(pool.shutdown)
+        hashed = imports.hash_passwords(['one', None, 'two'], pool)
+        self.assertTrue(check_password('one', hashed[0]))
+        self.assertFalse(hashed[1].startswith('md5$'))
+        self.assertTrue(check_password('two', hashed[2]))
+
+
+class LiveFeedStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='provider')
+        cls.provider = ServiceProvider.objects.create(
+            user=user, company_name='Tow Co', phone_number='555-0100', address='1 Main Street', is_approved=True,
+        )
+        cls.customer = User.objects.create(username='customer')
+
+    async def test_stream_delivers_published_events(self):
+        await self.async_client.aforce_login(self.provider.user)
+        response = await self.async_client.get(reverse('provider_feed'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 1000\n\n')
+        channel = live.provider_channel(self.provider.id)
+        live.get_broker().publish(channel, {'event': 'offer', 'id': 7})
+        self.assertEqual(await anext(stream), b'event: offer\ndata: {"event": "offer", "id": 7}\n\n')
+
+        # A client disconnecting cancels the pending read
+        read = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        read.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await read
+        self.assertEqual(live.get_broker().subscriber_count(channel), 0)
+
+    def test_only_asgi_requests_release_the_connection(self):
+        # Outside the test transaction, as in a real request
+        with mock.patch.object(connection, 'in_atomic_block', False), mock.patch.object(connection, 'close') as close:
+            views._release_connection(RequestFactory().get('/'))
+            close.assert_not_called()
+            views._release_connection(AsyncRequestFactory().get('/'))
+            close.assert_called_once()
+
+    async def test_feed_is_only_for_providers(self):
+        await self.async_client.aforce_login(self.customer)
+        response = await self.async_client.get(reverse('provider_feed'))
+        self.assertEqual(response.status_code, 403)
+
+
+class ExportTests(LargeFixtureMixin, TestCase):
+
+    def export(self, kind, **params):
+        self.client.force_login(self.staff)
+        return self.client.get(reverse('export_data', args=[kind]), params)
+
+    def test_csv_export_streams_every_row_in_one_query(self):
+        response = self.export('requests')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        # Fetching the rows, joins included
+        with self.assertNumQueries(1):
+            content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(content.splitlines()))
+        self.assertEqual(len(rows), ServiceRequest.objects.count())
+        self.assertEqual(rows[0]['category'], 'Towing Service')
+        self.assertEqual(rows[0]['customer_username'], 'customer')
+
+    def test_jsonl_export_filters_by_status_and_date(self):
+        today = timezone.localdate()
+        response = self.export('bookings', format='jsonl', status='pending', since=today.isoformat())
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), Booking.objects.filter(status='pending').count())
+        self.assertEqual(rows[0]['provider'], self.provider.company_name)
+
+        response = self.export('bookings', format='jsonl', until=(today - timedelta(days=1)).isoformat())
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_invalid_filters_are_rejected(self):
+        for params in [{'format': 'xml'}, {'since': '31/01/2025'}, {'until': '2025-02-30'}, {'status': 'lost'}]:
+            self.assertEqual(self.export('requests', **params).status_code, 400, params)
+        self.assertEqual(self.export('reviews').status_code, 404)
+
+    def test_customers_cannot_export(self):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('export_data', args=['requests']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_command(self):
+        output = StringIO()
+        call_command('export_data', 'requests', format='jsonl', status=['completed'], stdout=output)
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(rows), ServiceRequest.objects.filter(status='completed').count())
+        self.assertEqual({row['status'] for row in rows}, {'completed'})
+
+
+class ArchiveTests(LargeFixtureMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        bookings = list(Booking.objects.order_by('id')[:4])
+        for booking in bookings:
+            booking.status = 'completed'
+            booking.save()
+        Review.objects.create(booking=bookings[0], rating=5, comment='Quick')
+        Booking.objects.update(created_at=timezone.now() - timedelta(days=1))
+
+    def archive(self, **options):
+        output = StringIO()
+        call_command('archive_requests', older_than=0, stdout=output, **options)
+        return output.getvalue()
+
+    def test_finished_rows_move_to_the_archive(self):
+        finished = ServiceRequest.objects.filter(status__in=['completed', 'cancelled'])
+        expected = finished.count()
+        service_request = finished.select_related('service_category').first()
+        RequestEvent.for_change(service_request, 'in_progress', 'completed').save()
+
+        output = self.archive(batch_size=7)
+        self.assertIn(f'Archived {expected} requests', output)
+        self.assertIn('Archived 3 bookings', output)
+        self.assertFalse(finished.exists())
+        self.assertEqual(ServiceRequest.objects.count(), self.requests_per_party * 2 - expected)
+
+        record = ArchivedRecord.objects.get(kind='requests', original_id=service_request.id)
+        self.assertEqual(record.data['category'], service_request.service_category.name)
+        self.assertEqual(record.status, service_request.status)
+        # The event log outlives the request
+        self.assertEqual(RequestEvent.objects.filter(service_request_id=service_request.id).count(), 1)
+        # Reviewed bookings stay, along with their review
+        self.assertEqual(Booking.objects.filter(status='completed').count(), 1)
+        self.assertEqual(Review.objects.count(), 1)
+
+    def test_interrupted_run_resumes(self):
+        finished = ServiceRequest.objects.filter(status__in=['completed', 'cancelled']).count()
+        command = import_module('app1.management.commands.archive_requests').Command
+        original = command.archive_batch
+        calls = []
+
+        def fail_on_third_batch(self, *args):
+            calls.append(args)
+            if len(calls) == 3:
+                raise RuntimeError('interrupted')
+            return original(self, *args)
+
+        with mock.patch.object(command, 'archive_batch', fail_on_third_batch):
+            with self.assertRaises(RuntimeError):
+                self.archive(kinds=['requests'], batch_size=5)
+        self.assertEqual(ArchivedRecord.objects.count(), 10)
+        self.assertEqual(
+            ServiceRequest.objects.filter(status__in=['completed', 'cancelled']).count()
+            + ArchivedRecord.objects.count(),
+            finished,
+        )
+
+        self.archive(kinds=['requests'], batch_size=5)
+        self.assertFalse(ServiceRequest.objects.filter(status__in=['completed', 'cancelled']).exists())
+        self.assertIn('Archived 0 requests', self.archive(kinds=['requests']))
+
+    def test_dry_run_and_cutoff(self):
+        finished = ServiceRequest.objects.filter(status__in=['completed', 'cancelled']).count()
+        self.assertIn(f'{finished} requests would be archived', self.archive(dry_run=True))
+        self.assertEqual(ArchivedRecord.objects.count(), 0)
+        output = StringIO()
+        call_command('archive_requests', stdout=output)
+        self.assertIn('Archived 0 requests', output.getvalue())
+
+
+@override_settings(READ_REPLICA_ENABLED=True)
+class ReplicaRoutingTests(TestCase):
+    """The test replica is a second connection, so it cannot see rows the test has not committed."""
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.towing = ServiceCategory.objects.create(name='Towing Service', slug='towing')
+        cls.customer = User.objects.create(username='customer')
+        user = User.objects.create(username='provider')
+        cls.provider = ServiceProvider.objects.create(
+            user=user, company_name='Tow Co', phone_number='555', address='1 Main Street', is_approved=True,
+        )
+        ServiceRequest.objects.create(
+            provider=cls.provider, customer=cls.customer, service_category=cls.towing,
+            customer_name='Customer', customer_phone='555', customer_location='Exit 4',
+        )
+        ServiceRequest.objects.update(created_at=timezone.now() - timedelta(days=1))
+
+    def get_bookings(self):
+        with CaptureQueriesContext(connections[routers.REPLICA]) as replica_queries:
+            response = self.client.get(reverse('my_bookings'))
+        return response, len(replica_queries)
+
+    def test_dashboard_reads_from_the_replica(self):
+        self.client.force_login(self.customer)
+        response, replica_queries = self.get_bookings()
+        self.assertGreater(replica_queries, 0)
+        # The request exists on the primary only
+        self.assertEqual(response.context['total_bookings'], 0)
+
+    def test_session_reads_from_the_primary_after_writing(self):
+        self.client.force_login(self.customer)
+        self.client.post(
+            reverse('create_service_request', args=[self.provider.id, self.towing.id]),
+            {'customer_name': 'Customer', 'customer_phone': '555', 'customer_location': 'Exit 5'},
+        )
+        response, replica_queries = self.get_bookings()
+        self.assertEqual(replica_queries, 0)
+        self.assertEqual(response.context['total_bookings'], 2)
+
+    def test_replica_is_read_only_without_taking_the_write_lock(self):
+        environ = {'ROADMATE_DB_PROFILE': 'production', 'ROADMATE_READ_REPLICA': '/tmp/replica.sqlite3'}
+        with mock.patch.dict(os.environ, environ):
+            databases = runpy.run_module('roadmate1.settings')['DATABASES']
+        self.assertEqual(databases['default']['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertNotIn('transaction_mode', databases['replica']['OPTIONS'])
+        self.assertTrue(databases['replica']['OPTIONS']['init_command'].endswith('; PRAGMA query_only=ON'))
+
+    def test_posts_to_an_opted_in_view_read_from_the_primary(self):
+        # Registered on the primary only, as if since the last sync_replica
+        pending = ServiceProvider.objects.create(
+            user=User.objects.create(username='newcomer', is_active=False), company_name='New Tow',
+            phone_number='555', address='2 Main Street',
+        )
+        self.client.force_login(User.objects.create(username='staff', is_staff=True, is_superuser=True))
+        with CaptureQueriesContext(connections[routers.REPLICA]) as replica_queries:
+            response = self.client.post(
+                reverse('admin_dashboard'), {'approve_provider': '1', 'provider_id': pending.id}, follow=True
+            )
+        self.assertContains(response, 'Provider &quot;New Tow&quot; has been approved!')
+        self.assertTrue(ServiceProvider.objects.get(id=pending.id).is_approved)
+        self.assertEqual(len(replica_queries), 0)
+
+    def test_writes_move_the_rest_of_the_request_to_the_primary(self):
+        with routers.request_scope() as state:
+            state.replica_allowed = True
+            self.assertEqual(router.db_for_read(ServiceRequest), routers.REPLICA)
+            with routers.use_primary():
+                self.assertEqual(router.db_for_read(ServiceCategory), 'default')
+            self.assertEqual(router.db_for_write(ServiceRequest), 'default')
+            self.assertEqual(router.db_for_read(ServiceRequest), 'default')
+
+    def test_reads_outside_opted_in_views_use_the_primary(self):
+        self.assertEqual(router.db_for_read(ServiceRequest), 'default')
+        with routers.request_scope():
+            self.assertEqual(router.db_for_read(ServiceRequest), 'default')
+        with override_settings(READ_REPLICA_ENABLED=False), routers.request_scope() as state:
+            state.replica_allowed = True
+            self.assertEqual(router.db_for_read(ServiceRequest), 'default')
+
+
+class SyncReplicaTests(TransactionTestCase):
+
+    def test_copies_the_primary(self):
+        ServiceCategory.objects.create(name='Towing Service', slug='towing')
+        path = settings.BASE_DIR / 'test_replica_copy.sqlite3'
+        try:
+            call_command('sync_replica', output=path, stdout=StringIO())
+            copy = sqlite3.connect(path)
+            self.assertEqual(
+                copy.execute(f'SELECT slug FROM {ServiceCategory._meta.db_table}').fetchall(), [('towing',)]
+            )
+            copy.close()
+        finally:
+            os.remove(path)
+
+    def test_refuses_to_copy_onto_the_primary(self):
+        # Under test the replica mirrors the primary's file
+        with self.assertRaises(CommandError):
+            call_command('sync_replica', stdout=StringIO())
+
+
+class ServiceRequestStatusTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create(username='customer')
+        cls.service_request = ServiceRequest.objects.create(
+            customer=cls.customer, customer_name='Stranded', customer_phone='555-0199', customer_location='Exit 4',
+        )
+
+    def test_unchanged_status_is_not_modified(self):
+        self.client.force_login(self.customer)
+        url = reverse('service_request_status', args=[self.service_request.id])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['status'], 'pending')
+
+        # session, user, one primary key read
+        with self.assertNumQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_only_the_customer_can_watch(self):
+        self.client.force_login(User.objects.create(username='someone-else'))
+        response = self.client.get(reverse('service_request_status', args=[self.service_request.id]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_long_poll_returns_when_the_status_changes(self):
+        await self.async_client.aforce_login(self.customer)
+        url = reverse('service_request_status', args=[self.service_request.id])
+        etag = (await self.async_client.get(url))['ETag']
+
+        poll = asyncio.ensure_future(self.async_client.get(url, {'wait': 5}, headers={'If-None-Match': etag}))
+        channel = live.request_channel(self.service_request.id)
+        while not live.get_broker().subscriber_count(channel):
+            await asyncio.sleep(0.01)
+        await ServiceRequest.objects.filter(id=self.service_request.id).aupdate(
+            status='accepted', updated_at=timezone.now()
+        )
+        live.get_broker().publish(channel, {'event': 'status', 'id': self.service_request.id, 'status': 'accepted'})
+
+        response = await poll
+        self.assertEqual(response.json()['status'], 'accepted')
+        self.assertNotEqual(response['ETag'], etag)
+
+    async def test_long_poll_times_out_as_not_modified(self):
+        await self.async_client.aforce_login(self.customer)
+        url = reverse('service_request_status', args=[self.service_request.id])
+        etag = (await self.async_client.get(url))['ETag']
+        response = await self.async_client.get(url, {'wait': 0.05}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+
+class SyntheticBenchmarkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_synthetic', providers=5, customers=10, requests=200, bookings=20, seed=7, stdout=StringIO()
+        )
+        User.objects.create_superuser('bench-admin', 'bench-admin@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_creates_consistent_data(self):
+        self.assertEqual(User.objects.filter(username__startswith='syn7-customer-').count(), 10)
+        providers = ServiceProvider.objects.filter(user__username__startswith='syn7-provider-')
+        self.assertEqual(providers.count(), 5)
+        self.assertTrue(providers.get(user__username='syn7-provider-0').is_approved)
+        self.assertEqual(ServiceRequest.objects.count(), 200)
+        self.assertEqual(Booking.objects.count(), 20)
+        self.assertFalse(Review.objects.exclude(booking__status='completed').exists())
+        self.assertEqual(
+            RequestEvent.objects.filter(from_status='').count(), ServiceRequest.objects.count()
+        )
+
+        provider_ids = list(providers.values_list('id', flat=True))
+        stored = {
+            row['provider_id']: {field: row[field] for field in counters.COUNTER_FIELDS}
+            for row in ProviderStats.objects.filter(provider_id__in=provider_ids).values(
+                'provider_id', *counters.COUNTER_FIELDS
+            )
+        }
+        self.assertEqual(stored, counters.compute(provider_ids))
+
+    def test_seed_refuses_to_run_twice(self):
+        with self.assertRaises(CommandError):
+            call_command('seed_synthetic', providers=1, customers=1, requests=0, bookings=0, seed=7, stdout=StringIO())
+
+    def test_benchmark_covers_every_view_and_rolls_back(self):
+        requests = ServiceRequest.objects.count()
+        output = StringIO()
+        call_command('benchmark_views', seed=7, iterations=2, warmup=1, stdout=output, stderr=StringIO())
+
+        rows = {line.split()[0]: line.split() for line in output.getvalue().splitlines() if line.strip()}
+        for view in ('home', 'service_detail', 'create_service_request', 'update_service_request',
+                     'my_bookings', 'provider_dashboard', 'admin_dashboard'):
+            self.assertIn(view, rows)
+            self.assertEqual(rows[view][2], '0', rows[view])
+        self.assertEqual(ServiceRequest.objects.count(), requests)
+
+    def test_benchmark_needs_seeded_data_and_a_server_for_concurrency(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_views', seed=8, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('benchmark_views', seed=7, concurrency=4, stdout=StringIO())
@@ -1,25 +1,36 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.views import LogoutView
+from django.conf import settings
 from django.urls import reverse_lazy
 from django.db.models import Count, Sum, Q
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags, quote_etag
+from django.utils.safestring import mark_safe
 from .models import Booking, Service, ServiceProvider, Review, ServiceCategory
 from .forms import ProviderRegistrationForm, ServiceProviderLoginForm
+from django.db import IntegrityError, connection, router, transaction
+from . import categories, counters, dispatch, exports, geo, idempotency, live, notifications, page_cache, workflow
+from .pagination import keyset_page
+from .routers import reads_from_replica
+from .stats import dashboard_stats
 
 # Check if user is admin
 def admin_required(user):
     return user.is_authenticated and user.is_staff
 
 def home(request):
-    # Ensure admin user exists
-    from django.contrib.auth import get_user_model
-    User = get_user_model()
-    if not User.objects.filter(username='admin').exists():
-        User.objects.create_superuser('admin', 'admin@roadmate.com', 'roadmate')
+    # The admin account is created once after migrate (see signals.ensure_admin_user)
     
     # Explicitly pass the user object to the template context
     context = {
@@ -120,89 +131,101 @@ def custom_logout(request):
     # Redirect to the home page
     return redirect('home')
 
+@reads_from_replica
 def service_detail(request, service_slug):
-    """Dynamic view for service categories."""
-    # Map slugs to service category names
-    slug_to_name = {
-        'fuel-delivery': 'Fuel Delivery',
-        'towing': 'Towing Service',
-        'mechanic': 'On-Site Mechanic',
-        'battery': 'Battery Jump Start',
-        'tire': 'Tire Change',
-        'lockout': 'Lockout Service',
-    }
-    
-    service_name = slug_to_name.get(service_slug)
-    
-    if not service_name:
+    """Providers for one service category, looked up by its slug."""
+    category = categories.get_by_slug(service_slug)
+    if category is None:
         messages.error(request, 'Service not found.')
         return redirect('home')
     
-    try:
-        # Get the service category from database
-        category = ServiceCategory.objects.get(name=service_name, is_active=True)
-        
-        # Get providers offering this service
-        providers = ServiceProvider.objects.filter(
-            service_categories=category,
-            is_approved=True,
-            is_active=True
-        ).select_related('user')
-        
-        context = {
+    # Get providers offering this service
+    providers = ServiceProvider.objects.available(category).select_related('user').prefetch_related('service_categories')
+    coordinates = geo.parse_coordinates(request.GET.get('lat'), request.GET.get('lng'))
+    is_authenticated = request.user.is_authenticated
+    
+    def render_provider_list(providers):
+        # Rendered without the request, so nothing per-user can leak into the cache
+        html = render_to_string('service_provider_list.html', {
             'category': category,
             'service_name': category.name,
-            'service_icon': category.icon,
-            'service_description': category.description,
             'providers': providers,
-            'providers_count': providers.count(),
-        }
-        
-        return render(request, 'service_template.html', context)
-        
-    except ServiceCategory.DoesNotExist:
-        messages.error(request, 'Service category not found.')
-        return redirect('home')
-
-# Keep these for backward compatibility, but redirect to the dynamic view
-def fuel_service_providers(request):
-    return service_detail(request, 'fuel-delivery')
-
-def towing_service(request):
-    return service_detail(request, 'towing')
-
-def mechanic_service(request):
-    return service_detail(request, 'mechanic')
-
-def battery_service(request):
-    return service_detail(request, 'battery')
-
-def tire_service(request):
-    return service_detail(request, 'tire')
-
-def lockout_service(request):
-    return service_detail(request, 'lockout')
+            'coordinates': coordinates,
+            'is_authenticated': is_authenticated,
+        })
+        return {'html': html, 'count': len(providers)}
+    
+    if coordinates:
+        # Nearest first when the customer shared their location, then everyone
+        # else in the usual order. That makes the list theirs alone, so it is
+        # not cached
+        nearest = providers.nearest(*coordinates, k=settings.NEAREST_PROVIDERS_LIMIT)
+        rest = list(providers.exclude(id__in=[provider.id for provider in nearest]))
+        for provider in rest:
+            provider.distance_km = None
+        provider_list = render_provider_list(nearest + rest)
+    else:
+        provider_list = page_cache.get_or_render(
+            category.id,
+            'customer' if is_authenticated else 'anonymous',
+            lambda: render_provider_list(list(providers)),
+        )
+    
+    context = {
+        'category': category,
+        'service_name': category.name,
+        'service_icon': category.icon,
+        'service_description': category.description,
+        'provider_list': mark_safe(provider_list['html']),
+        'providers_count': provider_list['count'],
+        'coordinates': coordinates,
+        'dispatch_submission_key': idempotency.new_key(),
+        'submission_key': idempotency.new_key(),
+    }
+    
+    return render(request, 'service_template.html', context)
 
 @login_required
 def create_service_request(request, provider_id, category_id):
     """Create a service request from customer to provider."""
     if request.method == 'POST':
         try:
-            provider = ServiceProvider.objects.get(id=provider_id, is_approved=True, is_active=True)
+            provider = ServiceProvider.objects.select_related('user').get(id=provider_id, is_approved=True, is_active=True)
             category = ServiceCategory.objects.get(id=category_id)
             
-            # Create service request
-            from .models import ServiceRequest
-            service_request = ServiceRequest.objects.create(
-                provider=provider,
-                customer=request.user,
-                service_category=category,
-                customer_name=request.POST.get('customer_name', request.user.get_full_name() or request.user.username),
-                customer_phone=request.POST.get('customer_phone', ''),
-                customer_location=request.POST.get('customer_location', ''),
-                description=request.POST.get('description', ''),
-                status='pending'
-            )
+            # Create service request, unless this submission repeats one
+            from .models import RequestEvent, ServiceRequest
+            key = idempotency.submitted_key(request)
+            existing, key = idempotency.find_existing(request.user, key, category, provider)
+            if existing is not None:
+                return _repeated_submission(request, existing)
+            
+            coordinates = geo.parse_coordinates(request.POST.get('latitude'), request.POST.get('longitude'))
+            try:
+                with transaction.atomic():
+                    service_request = ServiceRequest.objects.create(
+                        provider=provider,
+                        customer=request.user,
+                        service_category=category,
+                        customer_name=request.POST.get('customer_name', request.user.get_full_name() or request.user.username),
+                        customer_phone=request.POST.get('customer_phone', ''),
+                        customer_location=request.POST.get('customer_location', ''),
+                        latitude=coordinates[0] if coordinates else None,
+                        longitude=coordinates[1] if coordinates else None,
+                        description=request.POST.get('description', ''),
+                        status='pending'
+                    )
+                    counters.request_status_changed(provider.id, None, 'pending')
+                    RequestEvent.for_change(service_request, None, 'pending').save()
+                    live.publish_to_providers([provider.id], live.request_message('request', service_request))
+                    notifications.enqueue(notifications.new_request(service_request, provider))
+                    idempotency.remember(request.user, key, service_request)
+            except IntegrityError:
+                # A concurrent copy of this submission stored the key first
+                original = idempotency.find_original(request.user, key)
+                if original is None:
+                    raise
+                return _repeated_submission(request, original)
             
             messages.success(
                 request, 
@@ -219,38 +242,204 @@ def create_service_request(request, provider_id, category_id):
     
     return redirect('home')
 
+def _repeated_submission(request, service_request):
+    """Answer a repeated request form with the request the first submission created."""
+    if service_request.provider_id:
+        message = (
+            f'Your request to {service_request.provider.company_name} was already sent. '
+            f'They will contact you shortly at {service_request.customer_phone}.'
+        )
+    else:
+        message = 'Your request was already sent to nearby providers. The first to accept will contact you.'
+    messages.info(request, message)
+    referer = request.META.get('HTTP_REFERER', '/')
+    return redirect(referer if referer else 'home')
+
+@login_required
+def dispatch_service_request(request, category_id):
+    """Create a service request offered to the nearest available providers."""
+    if request.method == 'POST':
+        try:
+            category = ServiceCategory.objects.get(id=category_id, is_active=True)
+        except ServiceCategory.DoesNotExist:
+            messages.error(request, 'Service not found.')
+            return redirect('home')
+        
+        key = idempotency.submitted_key(request)
+        existing, key = idempotency.find_existing(request.user, key, category)
+        if existing is not None:
+            return _repeated_submission(request, existing)
+        
+        coordinates = geo.parse_coordinates(request.POST.get('latitude'), request.POST.get('longitude'))
+        try:
+            with transaction.atomic():
+                service_request, offers = dispatch.create_dispatched_request(
+                    customer=request.user,
+                    category=category,
+                    customer_name=request.POST.get('customer_name', request.user.get_full_name() or request.user.username),
+                    customer_phone=request.POST.get('customer_phone', ''),
+                    customer_location=request.POST.get('customer_location', ''),
+                    latitude=coordinates[0] if coordinates else None,
+                    longitude=coordinates[1] if coordinates else None,
+                    description=request.POST.get('description', ''),
+                )
+                idempotency.remember(request.user, key, service_request)
+        except IntegrityError:
+            # A concurrent copy of this submission stored the key first
+            original = idempotency.find_original(request.user, key)
+            if original is None:
+                raise
+            return _repeated_submission(request, original)
+        
+        if offers:
+            messages.success(
+                request,
+                f'Your request was sent to {len(offers)} nearby provider{"s" if len(offers) != 1 else ""}. '
+                f'The first to accept will contact you at {service_request.customer_phone}.'
+            )
+        else:
+            messages.warning(
+                request,
+                'Your request was saved, but no providers are available right now. We will keep looking.'
+            )
+        
+        referer = request.META.get('HTTP_REFERER', '/')
+        return redirect(referer if referer else 'home')
+    
+    return redirect('home')
+
 @login_required
 def update_service_request(request, request_id):
-    """Update service request status (accept/reject)."""
+    """Update service request status (see workflow.ACTIONS)."""
     if request.method == 'POST':
         try:
             from .models import ServiceRequest
-            service_request = ServiceRequest.objects.get(id=request_id)
+            service_request = ServiceRequest.objects.select_related('service_category', 'customer').get(id=request_id)
+            action = request.POST.get('action')
+            
+            # Dispatched requests are open to every provider they were offered to
+            if service_request.provider_id is None and hasattr(request.user, 'service_provider'):
+                provider = request.user.service_provider
+                if action == 'accept':
+                    if dispatch.accept(service_request.id, provider):
+                        messages.success(request, f'Service request from {service_request.customer_name} has been accepted!')
+                    else:
+                        messages.warning(request, 'This request is no longer available. Another provider may have accepted it.')
+                elif action == 'reject':
+                    if dispatch.decline(service_request.id, provider):
+                        messages.info(request, f'Service request from {service_request.customer_name} has been declined.')
+                    else:
+                        messages.warning(request, 'This request is no longer available.')
+                return redirect('provider_dashboard')
             
             # Check if the logged-in user is the provider
             if not hasattr(request.user, 'service_provider') or service_request.provider != request.user.service_provider:
                 messages.error(request, 'You do not have permission to update this request.')
                 return redirect('provider_dashboard')
             
-            action = request.POST.get('action')
-            if action == 'accept':
-                service_request.status = 'accepted'
-                service_request.save()
-                messages.success(request, f'Service request from {service_request.customer_name} has been accepted!')
-            elif action == 'reject':
-                service_request.status = 'cancelled'
-                service_request.save()
-                messages.info(request, f'Service request from {service_request.customer_name} has been rejected.')
-            elif action == 'complete':
-                service_request.status = 'completed'
-                service_request.save()
-                messages.success(request, f'Service request marked as completed!')
+            if action not in workflow.ACTIONS:
+                return redirect('provider_dashboard')
+            
+            # The form carries the version the provider was looking at, so an
+            # action taken on an outdated page is refused rather than applied
+            seen_version = request.POST.get('version')
+            if seen_version is not None and seen_version != str(service_request.version):
+                result = workflow.CONFLICT
+            else:
+                result = workflow.apply(service_request, action)
+            
+            if result == workflow.UPDATED:
+                if action == 'accept':
+                    messages.success(request, f'Service request from {service_request.customer_name} has been accepted!')
+                elif action == 'start':
+                    messages.success(request, f'Service request from {service_request.customer_name} is now in progress.')
+                elif action == 'reject':
+                    messages.info(request, f'Service request from {service_request.customer_name} has been rejected.')
+                elif action == 'complete':
+                    messages.success(request, f'Service request marked as completed!')
+            else:
+                if result == workflow.CONFLICT:
+                    service_request.refresh_from_db(fields=['status', 'version'])
+                messages.warning(
+                    request,
+                    f'Service request from {service_request.customer_name} is already '
+                    f'{service_request.get_status_display().lower()}, so nothing was changed.'
+                )
             
         except ServiceRequest.DoesNotExist:
             messages.error(request, 'Service request not found.')
     
     return redirect('provider_dashboard')
 
+@login_required
+def bulk_update_service_requests(request):
+    """Accept, reject or complete several of the provider's requests at once.
+    
+    Answers with per-request results as JSON when asked for JSON, otherwise
+    with messages and a redirect back to the dashboard.
+    """
+    if request.method != 'POST':
+        return redirect('provider_dashboard')
+    
+    wants_json = request.get_preferred_type(['text/html', 'application/json']) == 'application/json'
+    provider_id = ServiceProvider.objects.filter(
+        user=request.user, is_approved=True
+    ).values_list('id', flat=True).first()
+    action = request.POST.get('action')
+    try:
+        request_ids = [int(request_id) for request_id in request.POST.getlist('request_ids')]
+    except ValueError:
+        request_ids = []
+    
+    error, status = None, 400
+    if provider_id is None:
+        error, status = 'You do not have permission to update these requests.', 403
+    elif action not in workflow.ACTIONS:
+        error = 'Unknown action.'
+    elif not request_ids:
+        error = 'Select at least one request.'
+    elif len(request_ids) > settings.BULK_UPDATE_LIMIT:
+        error = f'Select at most {settings.BULK_UPDATE_LIMIT} requests at a time.'
+    if error:
+        if wants_json:
+            return JsonResponse({'error': error}, status=status)
+        messages.error(request, error)
+        return redirect('provider_dashboard')
+    
+    try:
+        results = workflow.bulk_apply(provider_id, action, request_ids)
+    except workflow.ConcurrentUpdate:
+        # Still contended after every retry; nothing was applied
+        results = dict.fromkeys(request_ids, workflow.CONFLICT)
+    updated = sum(1 for result in results.values() if result == workflow.UPDATED)
+    
+    if wants_json:
+        return JsonResponse({
+            'action': action,
+            'status': workflow.ACTIONS[action][1],
+            'updated': updated,
+            'results': {str(request_id): result for request_id, result in results.items()},
+        })
+    
+    done = workflow.ACTION_LABELS[action]
+    if updated:
+        messages.success(request, f'{updated} service request{"s" if updated != 1 else ""} {done}.')
+    conflicts = sum(1 for result in results.values() if result == workflow.CONFLICT)
+    if conflicts:
+        messages.warning(
+            request,
+            f'{conflicts} selected request{"s were" if conflicts != 1 else " was"} not {done}: '
+            f'they changed while you were updating them. Reload and try again.'
+        )
+    skipped = len(results) - updated - conflicts
+    if skipped:
+        messages.warning(
+            request,
+            f'{skipped} selected request{"s were" if skipped != 1 else " was"} not {done}: '
+            f'already handled or not yours.'
+        )
+    return redirect('provider_dashboard')
+
 @login_required
 def user_profile(request):
     """User profile page."""
@@ -270,66 +459,82 @@ def user_profile(request):
     }
     return render(request, 'user_profile.html', context)
 
+# Tabs on the my_bookings page and the statuses each one lists
+BOOKING_TABS = {
+    'all': None,
+    'pending': ['pending'],
+    'active': ['accepted', 'in_progress'],
+    'completed': ['completed'],
+}
+
 @login_required
+@reads_from_replica
 def my_bookings(request):
     """User's service request bookings."""
     from .models import ServiceRequest
     
-    # Get all service requests made by the user
-    bookings = ServiceRequest.objects.filter(
-        customer=request.user
-    ).select_related('provider', 'service_category').order_by('-created_at')
-    
-    # Categorize bookings by status
-    pending_bookings = bookings.filter(status='pending')
-    active_bookings = bookings.filter(status__in=['accepted', 'in_progress'])
-    completed_bookings = bookings.filter(status='completed')
-    cancelled_bookings = bookings.filter(status='cancelled')
+    tab = request.GET.get('tab', 'all')
+    if tab not in BOOKING_TABS:
+        tab = 'all'
+    
+    # Status counts for the stat cards and tab badges, in one grouped query
+    requests = ServiceRequest.objects.filter(customer=request.user)
+    status_counts = dict(
+        requests.order_by().values_list('status').annotate(count=Count('id'))
+    )
+    
+    # One page of the selected tab, continuing from the cursor if given
+    if BOOKING_TABS[tab]:
+        requests = requests.filter(status__in=BOOKING_TABS[tab])
+    bookings, next_cursor = keyset_page(
+        requests.select_related('provider', 'service_category'),
+        cursor=request.GET.get('cursor'),
+        page_size=settings.BOOKINGS_PAGE_SIZE,
+    )
     
     context = {
         'bookings': bookings,
-        'pending_bookings': pending_bookings,
-        'active_bookings': active_bookings,
-        'completed_bookings': completed_bookings,
-        'cancelled_bookings': cancelled_bookings,
-        'total_bookings': bookings.count(),
+        'tab': tab,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        'total_bookings': sum(status_counts.values()),
+        'pending_count': status_counts.get('pending', 0),
+        'active_count': status_counts.get('accepted', 0) + status_counts.get('in_progress', 0),
+        'completed_count': status_counts.get('completed', 0),
     }
     return render(request, 'my_bookings.html', context)
 
 @login_required
 @user_passes_test(admin_required, login_url='login')
+@reads_from_replica
 def admin_dashboard(request):
     """Custom admin dashboard view."""
     # Ensure the user is staff
     if not request.user.is_staff and not request.user.is_superuser:
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('home')
-        
-    from django.contrib.auth import get_user_model
-    from django.db.models import Count, Sum
-    
-    User = get_user_model()
 
-    # Ensure admin user exists
-    if not User.objects.filter(username='admin').exists():
-        User.objects.create_superuser('admin', 'admin@roadmate.com', 'roadmate')
 
     # Handle provider approval
     if request.method == 'POST' and 'approve_provider' in request.POST:
         provider_id = request.POST.get('provider_id')
         try:
             provider = ServiceProvider.objects.get(id=provider_id)
-            provider.is_approved = True
-            provider.save()
-            
-            # Activate the user account
-            provider.user.is_active = True
-            provider.user.save()
+            # Also activates the user account
+            ServiceProvider.objects.filter(id=provider.id).approve()
             
             messages.success(request, f'Provider "{provider.company_name}" has been approved!')
         except ServiceProvider.DoesNotExist:
             messages.error(request, 'Provider not found.')
     
+    if request.method == 'POST' and 'approve_providers' in request.POST:
+        provider_ids = [value for value in request.POST.getlist('provider_ids') if value.isdigit()]
+        approved = ServiceProvider.objects.filter(id__in=provider_ids).approve()
+        if approved:
+            messages.success(request, f'{len(approved)} provider{"s" if len(approved) != 1 else ""} approved!')
+        else:
+            messages.warning(request, 'Select the providers to approve.')
+    
     # Handle provider rejection
     if request.method == 'POST' and 'reject_provider' in request.POST:
         provider_id = request.POST.get('provider_id')
@@ -348,7 +553,7 @@ def admin_dashboard(request):
         from .models import ServiceRequest
         
         # Get pending providers
-        pending_providers = ServiceProvider.objects.filter(is_approved=False).select_related('user')
+        pending_providers = ServiceProvider.objects.filter(is_approved=False).select_related('user').prefetch_related('service_categories')
         
         # Get all providers
         all_providers = ServiceProvider.objects.filter(is_approved=True).select_related('user').prefetch_related('service_categories')
@@ -357,17 +562,8 @@ def admin_dashboard(request):
         all_requests = ServiceRequest.objects.all().select_related('customer', 'provider', 'service_category')
         recent_requests = all_requests.order_by('-created_at')[:10]
         
-        # Get statistics
-        stats = {
-            'total_users': User.objects.filter(is_staff=False).count(),
-            'active_providers': ServiceProvider.objects.filter(is_active=True, is_approved=True).count(),
-            'pending_providers': pending_providers.count(),
-            'total_providers': ServiceProvider.objects.count(),
-            'total_requests': all_requests.count(),
-            'pending_requests': all_requests.filter(status='pending').count(),
-            'active_requests': all_requests.filter(status__in=['accepted', 'in_progress']).count(),
-            'completed_requests': all_requests.filter(status='completed').count(),
-        }
+        # Get statistics (from the daily rollup snapshot)
+        stats = dashboard_stats()
     except Exception as e:
         # If there's an error (e.g., models not migrated yet), use default values
         pending_providers = []
@@ -391,10 +587,50 @@ def admin_dashboard(request):
         'all_providers': all_providers,
         'recent_requests': recent_requests,
         'current_date': timezone.now().date(),
+        'page_cache': page_cache.metrics(),
     }
     
     return render(request, 'admin_dashboard_simple.html', context)
 
+def _export_date(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return day
+
+@login_required
+@user_passes_test(admin_required, login_url='login')
+@reads_from_replica
+def export_data(request, kind):
+    """Stream every service request or booking matching the filters as CSV or JSON Lines.
+
+    Query parameters: ``format`` (csv or jsonl), ``since`` and ``until``
+    (YYYY-MM-DD, inclusive) and ``status`` (repeatable).
+    """
+    if kind not in exports.EXPORTS:
+        raise Http404
+    format = request.GET.get('format', 'csv')
+    if format not in exports.FORMATS:
+        return HttpResponseBadRequest(f'format must be one of {", ".join(exports.FORMATS)}')
+    try:
+        since, until = _export_date(request, 'since'), _export_date(request, 'until')
+    except ValueError:
+        return HttpResponseBadRequest('since and until must be dates like 2025-01-31')
+    status = request.GET.getlist('status')
+    if set(status) - set(exports.statuses(kind)):
+        return HttpResponseBadRequest(f'status must be among {", ".join(exports.statuses(kind))}')
+
+    # Resolved now: the rows are read after the view returns, outside the routing scope
+    model, _ = exports.EXPORTS[kind]
+    rows = exports.rows(kind, since, until, status, using=router.db_for_read(model))
+    response = StreamingHttpResponse(exports.lines(rows, format), content_type=exports.FORMATS[format])
+    filename = f'{kind}-{timezone.now():%Y%m%d-%H%M%S}.{format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 def provider_register(request):
     # Check if user is already logged in
     if request.user.is_authenticated:
@@ -430,16 +666,16 @@ def provider_register(request):
     return render(request, 'provider_register.html', {'form': form})
 
 @login_required
+@reads_from_replica
 def provider_dashboard(request):
     """View for the service provider dashboard."""
-    # Check if user is a service provider
-    if not hasattr(request.user, 'service_provider'):
+    # Check if user is a service provider, fetching the counters row with it
+    try:
+        provider = ServiceProvider.objects.select_related('stats').get(user=request.user)
+    except ServiceProvider.DoesNotExist:
         messages.error(request, 'You do not have permission to access this page.')
         return redirect('home')
     
-    # Get the provider instance
-    provider = request.user.service_provider
-    
     # Only show dashboard if provider is approved
     if not provider.is_approved:
         messages.warning(
@@ -450,51 +686,46 @@ def provider_dashboard(request):
         return redirect('home')
     
     # Get provider's services
-    try:
-        services = Service.objects.filter(provider=provider)
-        total_services = services.count()
-    except:
-        services = []
-        total_services = 0
+    services = Service.objects.filter(provider=provider)
     
     # Get recent bookings
     try:
         recent_bookings = Booking.objects.filter(
             service__provider=provider
-        ).select_related('service').order_by('-created_at')[:5]
-        
-        active_bookings = Booking.objects.filter(
-            service__provider=provider,
-            status__in=['pending', 'confirmed', 'in_progress']
-        ).count()
+        ).select_related('service', 'customer').order_by('-created_at')[:5]
     except:
         recent_bookings = []
-        active_bookings = 0
     
     # Get service categories
-    service_categories = provider.service_categories.all()
+    service_categories = list(provider.service_categories.all())
     
     # Get service requests
     from .models import ServiceRequest
     
-    # Count pending requests first (before slicing)
-    pending_requests = ServiceRequest.objects.filter(
-        provider=provider,
-        status='pending'
-    ).count()
+    # Counters are maintained on write (see app1.counters), so this is one row
+    provider_stats = counters.stats_for(provider)
+    
+    # Get one page of service requests, newest first
+    service_requests, requests_cursor = keyset_page(
+        ServiceRequest.objects.filter(provider=provider).select_related('customer', 'service_category'),
+        cursor=request.GET.get('cursor'),
+        page_size=10,
+    )
     
-    # Get recent service requests (limited to 10)
-    service_requests = ServiceRequest.objects.filter(
-        provider=provider
-    ).select_related('customer', 'service_category').order_by('-created_at')[:10]
+    # Dispatched requests waiting for this provider to accept or decline
+    from .models import RequestOffer
+    request_offers = RequestOffer.objects.filter(
+        provider=provider,
+        status='offered'
+    ).select_related('service_request__service_category').order_by('-created_at')[:10]
     
     # Calculate statistics
     stats = {
-        'total_services': total_services,
-        'active_bookings': active_bookings,
-        'service_categories': service_categories.count(),
+        'total_services': provider_stats.total_services,
+        'active_bookings': provider_stats.active_bookings,
+        'service_categories': provider_stats.service_categories,
         'company_name': provider.company_name,
-        'pending_requests': pending_requests,
+        'pending_requests': provider_stats.pending_requests,
     }
     
     context = {
@@ -504,6 +735,132 @@ def provider_dashboard(request):
         'stats': stats,
         'service_categories': service_categories,
         'service_requests': service_requests,
+        'requests_cursor': requests_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        'request_offers': request_offers,
     }
     
-    return render(request, 'provider_dashboard.html', context)
\ No newline at end of file
+    return render(request, 'provider_dashboard.html', context)
+
+def _release_connection(request):
+    # Under ASGI, long-lived async responses hand the connection back as soon
+    # as they are done with it rather than holding it while they wait. Under
+    # WSGI the query ran on the request's own thread, whose connection is
+    # kept for CONN_MAX_AGE and checked when the request finishes.
+    if isinstance(request, ASGIRequest) and not connection.in_atomic_block:
+        connection.close()
+
+@sync_to_async
+def _feed_provider_id(request, user):
+    try:
+        return ServiceProvider.objects.filter(
+            user=user, is_approved=True
+        ).values_list('id', flat=True).first()
+    finally:
+        _release_connection(request)
+
+async def _feed_events(channel, persistent):
+    with live.get_broker().subscribe(channel) as subscription:
+        # How long EventSource waits before reconnecting, in milliseconds
+        yield 'retry: 1000\n\n'
+        timeout = settings.LIVE_FEED_HEARTBEAT if persistent else settings.LIVE_FEED_POLL_TIMEOUT
+        while True:
+            message = await subscription.get(timeout)
+            if message is None:
+                if not persistent:
+                    return
+                # Comment line, so proxies do not time out an idle stream
+                yield ': keepalive\n\n'
+                continue
+            messages_ready = [message]
+            while not subscription.queue.empty():
+                messages_ready.append(subscription.queue.get_nowait())
+            for message in messages_ready:
+                yield f'event: {message["event"]}\ndata: {json.dumps(message)}\n\n'
+            if not persistent:
+                return
+
+@login_required
+async def provider_feed(request):
+    """Live feed of new and changed service requests for the logged-in provider.
+
+    Under ASGI this is a Server-Sent Events stream that stays open. Under
+    WSGI (e.g. runserver) an open stream would tie up a worker thread, so the
+    response ends after the first batch of events or
+    ``LIVE_FEED_POLL_TIMEOUT`` seconds and EventSource reconnects, which makes
+    it a long-poll.
+    """
+    provider_id = await _feed_provider_id(request, await request.auser())
+    if provider_id is None:
+        return HttpResponseForbidden('Only approved service providers have a live feed.')
+    
+    response = StreamingHttpResponse(
+        _feed_events(live.provider_channel(provider_id), persistent=isinstance(request, ASGIRequest)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@sync_to_async
+def _service_request_status(request, request_id, user):
+    from .models import ServiceRequest
+    try:
+        return ServiceRequest.objects.filter(id=request_id, customer=user).values(
+            'id', 'status', 'updated_at', 'provider__company_name', 'provider__phone_number'
+        ).first()
+    finally:
+        _release_connection(request)
+
+def _status_etag(row):
+    return quote_etag(f'{row["id"]}-{row["status"]}-{row["updated_at"].timestamp()}')
+
+@login_required
+async def service_request_status(request, request_id):
+    """Status of one of the customer's service requests, as JSON.
+    
+    Answers 304 while ``If-None-Match`` still matches. With ``?wait=<seconds>``
+    and an ``If-None-Match`` it first waits (up to ``LIVE_FEED_POLL_TIMEOUT``)
+    for the status to change, so a client can long-poll it.
+    """
+    from .models import ServiceRequest
+    user = await request.auser()
+    client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+    try:
+        wait = min(max(float(request.GET.get('wait', 0)), 0), settings.LIVE_FEED_POLL_TIMEOUT)
+    except ValueError:
+        wait = 0
+    
+    # Subscribe before reading so a change in between is not missed
+    subscription = None
+    if wait and client_etags:
+        subscription = live.get_broker().subscribe(live.request_channel(request_id))
+    try:
+        row = await _service_request_status(request, request_id, user)
+        if row is None:
+            raise Http404('Service request not found.')
+        if subscription is not None and _status_etag(row) in client_etags:
+            if await subscription.get(wait) is not None:
+                row = await _service_request_status(request, request_id, user)
+    finally:
+        if subscription is not None:
+            subscription.close()
+    
+    etag = _status_etag(row)
+    if etag in client_etags or '*' in client_etags:
+        response = HttpResponseNotModified()
+    else:
+        provider = None
+        if row['provider__company_name'] is not None:
+            provider = {'company_name': row['provider__company_name'], 'phone_number': row['provider__phone_number']}
+        response = JsonResponse({
+            'id': row['id'],
+            'status': row['status'],
+            'status_display': dict(ServiceRequest.STATUS_CHOICES)[row['status']],
+            'provider': provider,
+            'updated_at': row['updated_at'].isoformat(),
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,160 @@
+"""Status changes providers make to their service requests.
+
+Every change is a compare-and-swap: an ``UPDATE`` conditioned on the status
+(and, for a single request, the version) the caller last saw. Two racing
+changes cannot both apply, and no row locks are taken. The legal moves are
+``ServiceRequest.TRANSITIONS``; each action below is a subset of them.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import counters, live, notifications
+from .models import RequestEvent, ServiceRequest
+
+# action: (statuses it applies to, status it moves the request to)
+ACTIONS = {
+    'accept': (('pending',), 'accepted'),
+    'start': (('accepted',), 'in_progress'),
+    'reject': (('pending',), 'cancelled'),
+    'complete': (('accepted', 'in_progress'), 'completed'),
+}
+
+# How each action reads in messages: "3 service requests accepted."
+ACTION_LABELS = {
+    'accept': 'accepted',
+    'start': 'started',
+    'reject': 'rejected',
+    'complete': 'marked as completed',
+}
+
+UPDATED = 'updated'
+NOT_FOUND = 'not_found'
+WRONG_STATUS = 'wrong_status'
+# The request changed between being read and being updated
+CONFLICT = 'conflict'
+
+# How often a bulk update is retried when another writer changes one of
+# the rows between our read and our UPDATE
+BULK_ATTEMPTS = 3
+
+# Rows per INSERT when logging the events of a bulk update
+EVENT_BATCH_SIZE = 500
+
+
+class ConcurrentUpdate(Exception):
+    pass
+
+
+def apply(service_request, action):
+    """Apply ``action`` to one request, as loaded by the caller.
+
+    Returns ``UPDATED``, ``WRONG_STATUS`` when the action does not apply to
+    the request's status, or ``CONFLICT`` when someone else changed the
+    request after it was loaded.
+    """
+    from_statuses, new_status = ACTIONS[action]
+    if service_request.status not in from_statuses:
+        return WRONG_STATUS
+
+    old_status = service_request.status
+    with transaction.atomic():
+        if not service_request.transition_to(new_status):
+            return CONFLICT
+        counters.request_status_changed(service_request.provider_id, old_status, new_status)
+        RequestEvent.for_change(service_request, old_status, new_status).save()
+        notifications.enqueue(notifications.status_changed(
+            service_request.id, new_status, service_request.customer.email, service_request.customer_phone
+        ))
+        # Keeps the provider's other open dashboards in step
+        live.publish_to_providers([service_request.provider_id], live.request_message('request', service_request))
+        live.request_status_changed(service_request.id, new_status)
+    return UPDATED
+
+
+def bulk_apply(provider_id, action, request_ids):
+    """Apply ``action`` to every request in ``request_ids`` that allows it.
+
+    The status change is a single ``UPDATE ... WHERE provider_id = ... AND
+    status IN (...)``. The provider's counters move in the same transaction.
+    Returns ``{request_id: UPDATED | NOT_FOUND | WRONG_STATUS}``, where
+    ``NOT_FOUND`` also covers other providers' requests. Raises
+    ``ConcurrentUpdate``, with nothing applied, if other writers keep
+    changing the rows for ``BULK_ATTEMPTS`` tries.
+    """
+    from_statuses, new_status = ACTIONS[action]
+    request_ids = set(request_ids)
+
+    for attempt in range(BULK_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return _bulk_apply(provider_id, from_statuses, new_status, request_ids)
+        except ConcurrentUpdate:
+            if attempt == BULK_ATTEMPTS - 1:
+                raise
+
+
+def _bulk_apply(provider_id, from_statuses, new_status, request_ids):
+    mine = ServiceRequest.objects.filter(id__in=request_ids, provider_id=provider_id)
+    current = {
+        request_id: (status, category_id, email, phone)
+        for request_id, status, category_id, email, phone in mine.values_list(
+            'id', 'status', 'service_category_id', 'customer__email', 'customer_phone'
+        )
+    }
+    eligible = {request_id: row for request_id, row in current.items() if row[0] in from_statuses}
+
+    if eligible:
+        # Each row must still have the status it was read with, not just any
+        # status the action allows: a row read as accepted and started since
+        # would log the wrong old status
+        by_status = {}
+        for request_id, (status, _, _, _) in eligible.items():
+            by_status.setdefault(status, []).append(request_id)
+        unchanged = Q()
+        for status, ids in by_status.items():
+            unchanged |= Q(id__in=ids, status=status)
+        updated = mine.filter(unchanged).update(
+            status=new_status, version=F('version') + 1, updated_at=timezone.now()
+        )
+        if updated != len(eligible):
+            # Someone else moved one of them after we read it; roll back and
+            # read again rather than guess which rows changed
+            raise ConcurrentUpdate
+
+        deltas = Counter()
+        for old_status, _, _, _ in eligible.values():
+            deltas.update(counters.status_deltas(counters.REQUEST_COUNTERS, old_status, new_status))
+        counters.apply_deltas(provider_id, {field: delta for field, delta in deltas.items() if delta})
+        RequestEvent.objects.bulk_create(
+            [
+                RequestEvent(
+                    service_request_id=request_id,
+                    provider_id=provider_id,
+                    category_id=category_id,
+                    from_status=old_status,
+                    to_status=new_status,
+                )
+                for request_id, (old_status, category_id, _, _) in eligible.items()
+            ],
+            batch_size=EVENT_BATCH_SIZE,
+        )
+        notifications.enqueue([
+            notification
+            for request_id, (_, _, email, phone) in eligible.items()
+            for notification in notifications.status_changed(request_id, new_status, email, phone)
+        ])
+        for request_id in eligible:
+            live.request_status_changed(request_id, new_status)
+
+    results = {}
+    for request_id in request_ids:
+        if request_id in eligible:
+            results[request_id] = UPDATED
+        elif request_id in current:
+            results[request_id] = WRONG_STATUS
+        else:
+            results[request_id] = NOT_FOUND
+    return results
@@ -0,0 +1,57 @@
+"""SQLite connection profiles, picked with the ROADMATE_DB_PROFILE environment variable.
+
+``default`` is Django's stock setup: rollback journal, ``synchronous=FULL``
+and a new connection for every request. Writers lock out readers while they
+commit, and every request pays for opening the file and reading the schema.
+
+``production`` switches the database to write-ahead logging, so readers
+never wait for a writer and a commit costs one append to the log.
+``synchronous=NORMAL`` is safe with WAL: a power cut can lose the last
+commits, never corrupt the file. Connections are kept for ``CONN_MAX_AGE``
+seconds, and transactions start with ``BEGIN IMMEDIATE`` so two writers
+queue on ``busy_timeout`` instead of one failing with "database is locked"
+when it upgrades its read lock.
+
+``benchmark_sqlite_writes`` compares the two under concurrent writes.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+# Applied to every new connection, in this order
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Milliseconds a writer waits for the lock before giving up
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative means KiB rather than pages: 64 MiB of page cache per connection
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def init_command(pragmas):
+    return '; '.join(f'PRAGMA {name}={value}' for name, value in pragmas.items())
+
+
+PROFILES = {
+    'default': {},
+    'production': {
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': init_command(PRODUCTION_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+}
+
+
+def profile(name):
+    """Settings to merge into a SQLite ``DATABASES`` entry for the profile ``name``."""
+    try:
+        settings = PROFILES[name]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f'Unknown database profile {name!r}; choose one of {", ".join(sorted(PROFILES))}.'
+        )
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in settings.items()}
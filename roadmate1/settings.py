@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
+from . import database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -56,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',  # Associates users with requests
+    'app1.routers.replica_routing_middleware',  # Keeps a request's reads on the primary once it writes
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -95,6 +98,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Tests use a file rather than SQLite's in-memory default so the
+        # concurrency tests can run real threads against WAL mode
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -147,3 +155,121 @@ LOGOUT_REDIRECT_URL = 'home'
 
 # Email backend for development (prints emails to console)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# RoadMate settings
+
+# How many of the nearest providers a service page lists first when the
+# customer shares their location; the rest follow in the usual order
+NEAREST_PROVIDERS_LIMIT = 20
+
+# How many providers a dispatched request is offered to at a time
+DISPATCH_BATCH_SIZE = 5
+
+# How old (in seconds) the DailyStats snapshot may be before the admin
+# dashboard flags it as stale
+DASHBOARD_STATS_MAX_AGE = 15 * 60
+
+# Service requests per page on my_bookings
+BOOKINGS_PAGE_SIZE = 20
+
+# Most service requests a provider can accept/reject/complete in one go
+BULK_UPDATE_LIMIT = 100
+
+# Broker behind the live provider feed (see app1.live). LocalBroker only
+# reaches subscribers in the same process.
+LIVE_FEED_BROKER = 'app1.live.LocalBroker'
+
+# Seconds between keepalive comments on an idle live feed stream
+LIVE_FEED_HEARTBEAT = 15
+
+# Longest a long-poll waits for an event before returning empty, in
+# seconds: the live feed when served over WSGI, and service request status
+# checks with ?wait=
+LIVE_FEED_POLL_TIMEOUT = 25
+
+# The default cache holds the category registry version and the cached
+# service page listings. Local memory keeps them per process; for several
+# workers on one machine, point every worker at the same directory with
+# 'django.core.cache.backends.filebased.FileBasedCache' and a LOCATION path.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'roadmate',
+    }
+}
+
+# Upper bound, in seconds, on how long a service page listing is cached.
+# Signals drop it as soon as a listed provider changes; this only limits
+# how stale a listing can get after a bulk write that sends no signals.
+SERVICE_PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Seconds during which a second request from the same customer for the same
+# provider (or, when dispatched, the same category) is treated as a repeat
+# of the first one rather than a new request
+DUPLICATE_REQUEST_WINDOW = 10 * 60
+
+# Seconds a request form's idempotency key is remembered; purge_submission_keys
+# deletes older ones
+SUBMISSION_KEY_TTL = 24 * 60 * 60
+
+# SQLite tuning: 'default' is Django's stock setup, 'production' adds WAL,
+# tuned pragmas and persistent connections (see roadmate1/database.py)
+DATABASES['default'].update(database.profile(os.environ.get('ROADMATE_DB_PROFILE', 'default')))
+
+# Read replica for the dashboards (see app1.routers): a second SQLite file
+# that sync_replica refreshes from the primary. Off unless
+# ROADMATE_READ_REPLICA is set to that file's path. In tests the replica is
+# a second connection to the test database, which only sees committed rows.
+# The replica never writes, so it does not take the primary's write lock up
+# front (transaction_mode)
+READ_REPLICA_ENABLED = bool(os.environ.get('ROADMATE_READ_REPLICA'))
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.environ.get('ROADMATE_READ_REPLICA') or BASE_DIR / 'db.replica.sqlite3',
+    'OPTIONS': {
+        **{
+            option: value for option, value in DATABASES['default'].get('OPTIONS', {}).items()
+            if option != 'transaction_mode'
+        },
+        'init_command': '; '.join(
+            filter(None, [DATABASES['default'].get('OPTIONS', {}).get('init_command'), 'PRAGMA query_only=ON'])
+        ),
+    },
+    'TEST': {'MIRROR': 'default'},
+}
+DATABASE_ROUTERS = ['app1.routers.PrimaryReplicaRouter']
+
+# Seconds a session keeps reading from the primary after it wrote, long
+# enough for sync_replica to have copied the change
+REPLICA_PIN_SECONDS = 30
+
+# Days after creation when archive_requests moves completed and cancelled
+# service requests and bookings out of the live tables
+ARCHIVE_AFTER_DAYS = 180
+
+# Minutes a service request may stay pending before expire_pending_requests
+# offers it to other providers; ServiceCategory.pending_timeout overrides it
+PENDING_REQUEST_TIMEOUT = 30
+
+# How many times an unanswered request is offered to a new batch of
+# providers before it expires
+REDISPATCH_ROUNDS = 3
+
+# How each notification channel is delivered by send_notifications. A
+# channel left out is not written to the outbox at all.
+NOTIFICATION_TRANSPORTS = {
+    'email': 'app1.notifications.EmailTransport',
+    'sms': 'app1.notifications.SmsTransport',
+    'webhook': 'app1.notifications.WebhookTransport',
+}
+
+# Endpoint sent every notification as JSON; empty leaves the webhook channel out
+NOTIFICATION_WEBHOOK_URL = os.environ.get('ROADMATE_NOTIFICATION_WEBHOOK', '')
+
+# Threads send_notifications sends with, one recipient each at a time
+NOTIFICATION_WORKERS = 4
+
+# Seconds before a failed notification is retried, doubling after every
+# failure, and how many tries it gets before it is marked failed
+NOTIFICATION_RETRY_DELAY = 60
+NOTIFICATION_MAX_ATTEMPTS = 6
@@ -17,10 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
-from app1.views import (home, custom_login, signup, custom_logout, 
-                      fuel_service_providers, towing_service, mechanic_service, 
-                      battery_service, tire_service, lockout_service, provider_register,
-                      admin_dashboard, provider_dashboard, create_service_request, update_service_request,
+from django.views.generic import RedirectView
+from app1.views import (home, custom_login, signup, custom_logout, service_detail, provider_register,
+                      admin_dashboard, export_data, provider_dashboard, provider_feed, create_service_request, update_service_request,
+                      bulk_update_service_requests,
+                      dispatch_service_request, service_request_status,
                       user_profile, my_bookings)
 from app1.admin_site import custom_admin_site
 
@@ -38,23 +39,25 @@ urlpatterns = [
     path('my-bookings/', my_bookings, name='my_bookings'),
     
     # Service URLs
-    path('services/fuel/', fuel_service_providers, name='fuel_service'),
-    path('services/towing/', towing_service, name='towing_service'),
-    path('services/mechanic/', mechanic_service, name='mechanic_service'),
-    path('services/battery/', battery_service, name='battery_service'),
-    path('services/tire/', tire_service, name='tire_service'),
-    path('services/lockout/', lockout_service, name='lockout_service'),
+    # The only old service address whose path differs from its slug
+    path('services/fuel/', RedirectView.as_view(url='/services/fuel-delivery/', permanent=True, query_string=True)),
+    path('services/<slug:service_slug>/', service_detail, name='service_detail'),
     
     # Provider URLs
     path('provider/register/', provider_register, name='provider_register'),
     path('provider/dashboard/', provider_dashboard, name='provider_dashboard'),
+    path('provider/feed/', provider_feed, name='provider_feed'),
     
     # Service Request URLs
     path('service-request/<int:provider_id>/<int:category_id>/', create_service_request, name='create_service_request'),
+    path('service-request/dispatch/<int:category_id>/', dispatch_service_request, name='dispatch_service_request'),
     path('service-request/update/<int:request_id>/', update_service_request, name='update_service_request'),
+    path('service-request/bulk-update/', bulk_update_service_requests, name='bulk_update_service_requests'),
+    path('service-request/<int:request_id>/status/', service_request_status, name='service_request_status'),
     
     # Admin Dashboard
     path('admins/dashboard/', admin_dashboard, name='admin_dashboard'),
+    path('admins/export/<str:kind>/', export_data, name='export_data'),
     
     # Include auth views for password reset
     path('password_reset/', auth_views.PasswordResetView.as_view(), name='password_reset'),